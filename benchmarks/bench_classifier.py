@@ -0,0 +1,66 @@
+"""Classifier throughput over a few thousand announcement titles.
+
+    python -m benchmarks.bench_classifier [--titles 5000] [--number 20]
+
+Titles are the saved listing and feed plus tests/fixtures/pap/titles.txt, renumbered to the
+requested count. Compares the old substring checks (three types only), the rule table as
+one re.search per rule, and the compiled classifier per title and per batch.
+"""
+import argparse
+import random
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.espi_classifier import CLASSIFIER, RULES
+from utils.utils import parse_espi_announcements
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "pap"
+
+
+def load_titles(count: int, seed: int = 1) -> list:
+    base = [row["title"] for name in ("listing.html", "feed.html")
+            for row in parse_espi_announcements((FIXTURES_DIR / name).read_text(encoding="utf-8"))]
+    base += (FIXTURES_DIR / "titles.txt").read_text(encoding="utf-8").splitlines()
+    rng = random.Random(seed)
+    return [f"Raport bieżący nr {rng.randint(1, 300)}/2025 {rng.choice(base)}" for _ in range(count)]
+
+
+def substring_type(title):
+    if "raport okresowy" in title:
+        return 0
+    if "zawiadomienia w trybie art. 19 ust. 1 rozporządzenia mar" in title or "zbycie akcji" in title:
+        return 1
+    return 2
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--titles", type=int, default=5000)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    titles = load_titles(args.titles)
+    per_rule = [(re.compile("|".join(phrases)), labels) for labels, phrases in RULES]
+
+    def rule_by_rule():
+        for title in titles:
+            lowered = title.lower()
+            {label for pattern, labels in per_rule if pattern.search(lowered) for label in labels}
+
+    cases = {
+        "substring checks, 3 types": lambda: [substring_type(title.lower()) for title in titles],
+        f"re.search per rule, {len(RULES)} rules": rule_by_rule,
+        "compiled, per title": lambda: [CLASSIFIER.classify(title) for title in titles],
+        "compiled, batch": lambda: CLASSIFIER.classify_many(titles),
+    }
+    print(f"{len(titles)} titles")
+    for name, case in cases.items():
+        seconds = timeit.timeit(case, number=args.number) / args.number
+        print(f"{name:<32}{seconds * 1000:>9.2f} ms{len(titles) / seconds:>14,.0f} titles/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compares the targeted lxml extraction with the previous full BeautifulSoup parse.
+
+    python -m benchmarks.bench_extract [--number 200]
+
+Runs on the saved PAP pages in tests/fixtures/pap and checks both parsers return the same data.
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.espi_classifier import parse_general_espi, parse_results_espi
+from utils.utils import parse_company_name, parse_espi_announcements
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "pap"
+
+
+# Previous implementations, kept as the reference for correctness and speed
+def bs_parse_espi_announcements(html):
+    soup = BeautifulSoup(html, "html.parser")
+    announcements = []
+    table = soup.find("table")
+    if table:
+        tbody = table.find("tbody")
+        if tbody:
+            for row in tbody.find_all("tr"):
+                cols = row.find_all("td")
+                if len(cols) >= 4:
+                    announcements.append({
+                        "date": cols[0].text.strip(),
+                        "time": cols[1].text.strip(),
+                        "company": cols[2].text.strip(),
+                        "title": cols[3].text.strip(),
+                        "url": cols[3].find('a')["href"],
+                    })
+    return announcements
+
+
+def bs_parse_company_name(html):
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table")
+    if table:
+        tbody = table.find("tbody")
+        if tbody:
+            cols = tbody.find_all("tr")[1].find_all("td")
+            if len(cols) >= 4:
+                return cols[2].find("a").text.strip()
+    return None
+
+
+def bs_parse_results_espi(html):
+    soup = BeautifulSoup(html, "html.parser")
+    rows = soup.find("table").find_all("tr")
+    r = ""
+    for row in rows:
+        r = r + str([td.get_text(strip=True) for td in row.find_all("td")]) + "\n"
+    return r
+
+
+def bs_parse_general_espi(html):
+    soup = BeautifulSoup(html, "html.parser")
+    paragraphs = soup.find("article").find_all("p")[:-3]
+    return "\n\n".join(p.get_text(strip=True) for p in paragraphs)
+
+
+CASES = [
+    ("listing announcements", "listing.html", bs_parse_espi_announcements, parse_espi_announcements),
+    ("listing company name", "listing.html", bs_parse_company_name, parse_company_name),
+    ("results table", "results.html", bs_parse_results_espi, parse_results_espi),
+    ("article text", "article.html", bs_parse_general_espi, parse_general_espi),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'case':<24}{'bs4 [ms]':>12}{'lxml [ms]':>12}{'speedup':>10}")
+    for name, fixture, reference, fast in CASES:
+        html = (FIXTURES_DIR / fixture).read_text(encoding="utf-8")
+        assert reference(html) == fast(html), f"{name}: outputs differ"
+
+        reference_ms = timeit.timeit(lambda: reference(html), number=args.number) / args.number * 1000
+        fast_ms = timeit.timeit(lambda: fast(html), number=args.number) / args.number * 1000
+        print(f"{name:<24}{reference_ms:>12.3f}{fast_ms:>12.3f}{reference_ms / fast_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Measures what recording a metric costs on the hot path.
+
+    python -m benchmarks.bench_metrics [--number 1000000]
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.metrics import Metrics
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    metrics = Metrics()
+
+    def timed_block():
+        with metrics.timer("classify_seconds"):
+            pass
+
+    cases = {
+        "inc": lambda: metrics.inc("company_errors_total", company="42"),
+        "observe": lambda: metrics.observe("fetch_seconds", 0.2, endpoint="listing"),
+        "timer": timed_block,
+    }
+    for name, case in cases.items():
+        seconds = timeit.timeit(case, number=args.number)
+        print(f"{name:8} {seconds / args.number * 1e9:8.0f} ns per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Times the polling path end to end against the local PAP stand-in, without network access.
+
+    python -m benchmarks.bench_offline [--repeat 3] [--save] [--tolerance 1.5]
+
+Cases cover the listing fetch and parse, the full and incremental history diff, article
+handling, company name resolution over every known company and full check_espi ticks at
+10/100/900 tracked companies, each with one new announcement delivered to a fake Discord
+channel.
+
+Every case is compared with benchmarks/baseline.json. --save records the current run as
+the baseline and --tolerance exits with status 1 if a case got slower than that factor.
+Baselines are machine specific, record one on the machine you compare on.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# The emoji client is never called, but the cog reads its key on startup
+os.environ.setdefault("OPENAI_API_KEY", "x")
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from benchmarks.pap_server import PAPServer
+from cogs.espi_tracker import ESPITracker
+from utils.delivery import DeliveryQueue
+from utils.espi_classifier import ESPIType, classify_espi_type
+from utils.fetcher import ESPIFetcher
+from utils.history import build_history_index, compact_history, history_keys
+from utils.http_cache import ResponseCache
+from utils.resolver import CompanyResolver
+from utils.results import ResultsStore
+from utils.search import SearchIndex
+from utils.storage import JSONStorage
+from utils.subscriptions import SubscriptionRegistry
+from utils.utils import decode_to_number, parse_espi_announcements
+
+BASELINE_FILE = ROOT / "benchmarks" / "baseline.json"
+DECODERS_DIR = ROOT / "decoders"
+TICK_SIZES = [10, 100, 900]
+CALLS = 50
+
+
+class FakeMessage:
+    async def reply(self, content):
+        pass
+
+
+class FakeChannel:
+    """Stands in for a Discord text channel, keeps what was sent."""
+
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.guild = None
+        self.sent = []
+
+    async def send(self, content=None, embed=None):
+        self.sent.append(embed if embed is not None else content)
+        return FakeMessage()
+
+
+class FakeBot:
+    def get_channel(self, channel_id):
+        return None
+
+    def get_all_channels(self):
+        return []
+
+
+def uncached_fetcher(base_url: str) -> ESPIFetcher:
+    # Nothing is kept, so every call downloads and parses again
+    return ESPIFetcher(cache=ResponseCache(max_entries=0), base_url=base_url)
+
+
+def listing_url(base_url: str, number: str) -> str:
+    return f"{base_url}/espi/espi/2025?company={number}&selectCompany={number}"
+
+
+async def per_call(call, number: int = CALLS) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        await call()
+    return (time.perf_counter() - start) / number
+
+
+async def bench_listing(server: PAPServer) -> dict:
+    fetcher = uncached_fetcher(server.base_url)
+    url = listing_url(server.base_url, "1")
+    rows = parse_espi_announcements(server.company_listing("1"))
+    # Everything but the newest row is known, as on a steady-state tick
+    history = rows[1:]
+    seen = history_keys(history)
+
+    async def inform():
+        fetcher.invalidate(url)
+        new = await fetcher.inform_new_espies(url, history, seen)
+        assert len(new) == 1
+
+    async def inform_incremental():
+        # Drop only the ETag so the page is read again but diffed from its watermark
+        fetcher._validators.pop(url, None)
+        new = await fetcher.inform_new_espies(url, history, seen)
+        assert len(new) == 1
+
+    results = {
+        "get_espi_announcements": await per_call(lambda: fetcher.get_espi_announcements(url)),
+        "inform_new_espies": await per_call(inform),
+    }
+    await fetcher.inform_new_espies(url, history, seen)
+    results["inform_new_espies[incremental]"] = await per_call(inform_incremental)
+
+    for espi_type in ESPIType:
+        espi = next(row for row in rows if classify_espi_type(row["title"].lower()) == espi_type)
+        results[f"handle_new_espi[{espi_type.name.lower()}]"] = await per_call(lambda: fetcher.handle_new_espi(espi))
+    await fetcher.close()
+    return results
+
+
+def bench_resolution() -> dict:
+    decoders = {name: json.loads((DECODERS_DIR / f"{name}.json").read_text(encoding="utf-8"))
+                for name in ("stock_id", "ticker_to_id", "symbol_to_id")}
+    names = list(decoders["stock_id"].values())
+
+    start = time.perf_counter()
+    for name in names:
+        decode_to_number(name, decoders["ticker_to_id"], decoders["symbol_to_id"], decoders["stock_id"])
+    decode_seconds = time.perf_counter() - start
+
+    resolver = CompanyResolver(decoders["stock_id"], decoders["ticker_to_id"], decoders["symbol_to_id"])
+    start = time.perf_counter()
+    for name in names:
+        resolver.resolve(name)
+    resolve_seconds = time.perf_counter() - start
+    return {f"decode_to_number[{len(names)} names]": decode_seconds,
+            f"CompanyResolver.resolve[{len(names)} names]": resolve_seconds}
+
+
+def make_tracker(server: PAPServer, numbers: list, channel: FakeChannel, data_dir: Path) -> ESPITracker:
+    tracker = ESPITracker(bot=FakeBot())
+    # Companies saved in the working directory stay out of it
+    tracker.storage = JSONStorage(data_dir / "pinned_stocks.json", data_dir / "espi_history.json",
+                                  data_dir / "subscriptions.json")
+    tracker.pinned_stocks, tracker.espi_history = tracker.storage.load()
+    tracker.subscriptions = SubscriptionRegistry(tracker.storage.load_subscriptions())
+    # Measure the bot's own work, not the politeness limit towards PAP
+    tracker.fetcher = ESPIFetcher(cache=ResponseCache(), base_url=server.base_url)
+    tracker.pdf_pipeline.fetcher = tracker.fetcher
+    tracker.delivery = DeliveryQueue(coalesce_delay=0, rate=0)
+    tracker.results_store = ResultsStore(data_dir / "espi_results.parquet")
+    tracker.search_index = SearchIndex(data_dir / "espi_search.jsonl")
+
+    for number in numbers:
+        rows = parse_espi_announcements(server.company_listing(number))
+        tracker.pinned_stocks[number] = {"name": f"Company {number}", "emoji": "📈", "url": listing_url(server.base_url, number),
+                                         "messages": []}
+        tracker.espi_history[number] = list(reversed(rows[1:]))
+        tracker.subscriptions.subscribe(channel, number)
+    compact_history(tracker.espi_history)
+    tracker.espi_index = build_history_index(tracker.espi_history)
+    return tracker
+
+
+async def bench_tick(server: PAPServer, size: int, repeat: int) -> float:
+    numbers = list(json.loads((DECODERS_DIR / "stock_id.json").read_text(encoding="utf-8")))[:size]
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as data_dir:
+            channel = FakeChannel(1)
+            tracker = make_tracker(server, numbers, channel, Path(data_dir))
+            # The bot logs every company, that stays out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                await tracker.check_espi()
+                await tracker.delivery.join()
+                seconds = time.perf_counter() - start
+            assert len(channel.sent) == len(numbers), f"{len(channel.sent)} of {len(numbers)} delivered"
+            await tracker.delivery.close()
+            await tracker.pdf_pipeline.close()
+            await tracker.fetcher.close()
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+async def run(repeat: int) -> dict:
+    server = PAPServer()
+    await server.start()
+    try:
+        results = {}
+        for _ in range(repeat):
+            for case, seconds in (await bench_listing(server)).items():
+                results[case] = min(seconds, results.get(case, seconds))
+        for case, seconds in min((bench_resolution() for _ in range(repeat)), key=lambda r: sum(r.values())).items():
+            results[case] = seconds
+        for size in TICK_SIZES:
+            results[f"check_espi tick[{size} companies]"] = await bench_tick(server, size, repeat)
+        return results
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs")
+    parser.add_argument("--save", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, help="fail if a case is this many times slower than the baseline")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.repeat))
+    baseline = json.loads(BASELINE_FILE.read_text(encoding="utf-8")) if BASELINE_FILE.exists() else {}
+
+    print(f"{'case':<44}{'now [ms]':>12}{'baseline [ms]':>15}{'change':>9}")
+    regressions = []
+    for case, seconds in results.items():
+        before = baseline.get(case)
+        change = f"{(seconds / before - 1) * 100:+.0f}%" if before else "-"
+        before_ms = f"{before * 1000:.2f}" if before else "-"
+        print(f"{case:<44}{seconds * 1000:>12.2f}{before_ms:>15}{change:>9}")
+        if args.tolerance and before and seconds > before * args.tolerance:
+            regressions.append(case)
+
+    if args.save:
+        BASELINE_FILE.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"Saved baseline to {BASELINE_FILE}")
+    if regressions:
+        print(f"FAIL: slower than {args.tolerance}x the baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
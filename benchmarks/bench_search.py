@@ -0,0 +1,69 @@
+"""Measures indexing and query times of the search index over a large synthetic archive.
+
+    python -m benchmarks.bench_search [--documents 50000]
+
+Titles and texts are drawn from the saved article and listing, so the vocabulary is PAP's.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.espi_classifier import parse_general_espi
+from utils.search import SearchIndex
+from utils.utils import parse_espi_announcements
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "pap"
+QUERIES = ["zbycie akcji", "raport okresowy", "zarząd spółki", "umowa", "dywidenda 2024"]
+
+
+def corpus(size: int, seed: int = 1):
+    rng = random.Random(seed)
+    titles = [row["title"] for row in parse_espi_announcements((FIXTURES_DIR / "listing.html").read_text(encoding="utf-8"))]
+    words = parse_general_espi((FIXTURES_DIR / "article.html").read_text(encoding="utf-8")).split()
+    for i in range(size):
+        day = f"20{rng.randint(20, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        text = " ".join(rng.choices(words, k=rng.randint(20, 200)))
+        yield str(rng.randint(1, 900)), {"date": day, "time": "17:00", "title": rng.choice(titles), "url": f"/a/{i}"}, text
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=50_000)
+    args = parser.parse_args()
+
+    documents = list(corpus(args.documents))
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = Path(data_dir) / "index.jsonl"
+        index = SearchIndex(path)
+        start = time.perf_counter()
+        for number, announcement, text in documents:
+            index.add(number, announcement, text)
+        index.flush()
+        seconds = time.perf_counter() - start
+        print(f"indexed {len(index)} announcements in {seconds:.2f}s ({seconds / len(index) * 1e6:.0f} µs each)")
+
+        number, announcement, text = next(corpus(1, seed=2))
+        start = time.perf_counter()
+        index.add(number, {**announcement, "url": "/new"}, text)
+        index.flush()
+        print(f"one more announcement: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+        start = time.perf_counter()
+        reloaded = SearchIndex(path)
+        print(f"loaded {len(reloaded)} announcements in {time.perf_counter() - start:.2f}s")
+
+        for query in QUERIES:
+            start = time.perf_counter()
+            results = index.search(query)
+            print(f"{query!r:24} {(time.perf_counter() - start) * 1000:8.2f} ms  {len(results)} results")
+        start = time.perf_counter()
+        index.search("zbycie akcji", numbers=["1"])
+        print(f"{'one company':24} {(time.perf_counter() - start) * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
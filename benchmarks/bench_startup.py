@@ -0,0 +1,69 @@
+"""Measures the cold import time of the bot with `python -X importtime` and enforces a budget.
+
+    python -m benchmarks.bench_startup [--module cogs.espi_tracker] [--budget 1000] [--runs 5]
+
+Exits with status 1 if the fastest run is over the budget (in ms) or if one of the heavy
+packages that should only be loaded on first use is imported at startup.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_MS = 1000
+# Only needed by the PDF and emoji paths
+LAZY_PACKAGES = ["camelot", "numpy", "pandas", "matplotlib", "openai"]
+
+
+def import_times(module: str) -> tuple[float, dict]:
+    """Total ms of one cold import and package -> (self, cumulative) ms of every package it loaded."""
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "x")}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    total = 0
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module_name = name.strip()
+        package = module_name.split(".")[0]
+        self_ms, cumulative_ms = packages.get(package, (0, 0))
+        if module_name == package:
+            cumulative_ms = int(cumulative_us) / 1000
+        packages[package] = (self_ms + int(self_us) / 1000, cumulative_ms)
+        # Lines are indented by nesting, top-level imports add up to the whole startup
+        if len(name) - len(name.lstrip()) == 1:
+            total += int(cumulative_us) / 1000
+    return total, packages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="cogs.espi_tracker")
+    parser.add_argument("--budget", type=float, default=BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    total, best = min((import_times(args.module) for _ in range(args.runs)), key=lambda run: run[0])
+
+    print(f"{'package':<24}{'self [ms]':>12}{'total [ms]':>12}")
+    for package, (self_ms, cumulative_ms) in sorted(best.items(), key=lambda item: -item[1][1])[:15]:
+        print(f"{package:<24}{self_ms:>12.1f}{cumulative_ms:>12.1f}")
+    print(f"\nimport {args.module}: {total:.1f} ms (budget {args.budget:.0f} ms, best of {args.runs})")
+
+    failed = False
+    eager = [package for package in LAZY_PACKAGES if package in best]
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+        failed = True
+    if total > args.budget:
+        print("FAIL: over the startup budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compares the single-pass keyword matcher with the previous per-row NumPy scans.
+
+    python -m benchmarks.bench_transactions [--number 200]
+
+Runs on the saved camelot tables in tests/fixtures/camelot and checks both parsers return the same data.
+"""
+import argparse
+import json
+import math
+import sys
+import timeit
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.utils import parse_transaction_info2
+
+FIXTURE = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "camelot" / "mar_tables.json"
+
+
+# Previous implementation without its prints, kept as the reference for correctness and speed
+def numpy_parse_transaction_info2(pdf):
+    row_keys = ["Stanowisko/status", "Rodzaj transakcji"]
+    raw_data = pdf._tables[0].data
+    data = {"position": np.nan, "incentive": np.nan, "transaction_mode": np.nan}
+    if len(raw_data)<13:
+        return {"position": "shorter", "incentive": "shorter", "transaction_mode": "shorter"}
+    for key in row_keys:
+        for idx, row in enumerate(raw_data):
+            if key == "Stanowisko/status":
+                if np.any(np.array([key in e for e in row])):
+                    if np.any(np.array(["Członek Zarządu" in e for e in row])):
+                        data["position"] = "Członek Zarządu"
+                    elif np.any(np.array(["Prezes" in e for e in row])):
+                        data["position"] = "Prezes"
+                    elif np.any(np.array(["Wiceprezes" in e for e in row])):
+                        data["position"] = "Wiceprezes"
+                    else:
+                        data["position"] = "Unknown"
+
+            if key == "Rodzaj transakcji":
+                incentive = None
+                if np.any(np.array([key in e for e in row])):
+                    if np.any(np.array(["Nabycie" in e for e in row])) or np.any(np.array(["purchase" in e for e in row])) or np.any(np.array(["Kupno" in e for e in row])) or np.any(np.array(["objęcie" in e for e in row])):
+                        transaction_mode = "purchase"
+                        if np.any(np.array(["motywacyjnego" in e for e in row])):
+                            incentive = True
+                        else:
+                            incentive = False
+                    else:
+                        transaction_mode = "disposal"
+
+                    data["incentive"] = incentive
+                    data["transaction_mode"] = transaction_mode
+    return data
+
+
+def _comparable(data):
+    return {key: None if isinstance(value, float) and math.isnan(value) else value for key, value in data.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    tables = [SimpleNamespace(_tables=[SimpleNamespace(data=table["data"])])
+              for table in json.loads(FIXTURE.read_text(encoding="utf-8"))]
+    for pdf in tables:
+        assert _comparable(numpy_parse_transaction_info2(pdf)) == _comparable(parse_transaction_info2(pdf)), \
+            f"outputs differ for {pdf._tables[0].data}"
+
+    def run(parse):
+        for pdf in tables:
+            parse(pdf)
+
+    reference_ms = timeit.timeit(lambda: run(numpy_parse_transaction_info2), number=args.number) / args.number * 1000
+    fast_ms = timeit.timeit(lambda: run(parse_transaction_info2), number=args.number) / args.number * 1000
+    print(f"{len(tables)} tables")
+    print(f"{'numpy [ms]':>12}{'regex [ms]':>12}{'speedup':>10}")
+    print(f"{reference_ms:>12.3f}{fast_ms:>12.3f}{reference_ms / fast_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Local stand-in for Biznes PAP serving the saved pages in tests/fixtures/pap.
+
+    python -m benchmarks.pap_server [--port 8731]
+
+Start the bot with PAP_BASE_URL=http://127.0.0.1:8731 to run it against the stand-in.
+
+    /espi                         all-companies feed
+    /espi/espi/<year>?company=N   company listing, its links rewritten for company N
+    /wiadomosci/firmy/<slug>      article page (the results page for periodic reports),
+                                  MAR notifications link the PDF attachment
+    /pdf/<name>                   PDF attachment
+
+Pages carry an ETag and conditional requests get a 304, like the real site. Rows added
+with `publish` show up on top of the company listing and make up the feed, which is how
+benchmarks/replay_day.py plays back a day of publications.
+"""
+import argparse
+import asyncio
+import hashlib
+import sys
+from collections import Counter
+from html import escape
+from pathlib import Path
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.espi_classifier import ESPIType, classify_espi_type
+from utils.utils import parse_espi_announcements
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "pap"
+PORT = 8731
+# Company 1 in the saved listing, rewritten per company so every company has its own articles
+LISTING_COMPANY = "company=1&amp;selectCompany=1"
+LISTING_ARTICLE_PREFIX = "/wiadomosci/firmy/11-bit-studios-sa-"
+PDF_NAME = "attachment.pdf"
+
+
+def render_row(number: str, row: dict) -> str:
+    """A listing table row in PAP's markup."""
+    return (f'<tr><td class="date">{row["date"]}</td><td class="time">{row["time"]}</td>'
+            f'<td class="company"><a href="/espi/espi/2025?company={number}&amp;selectCompany={number}">'
+            f'{escape(row["company"])}</a></td>'
+            f'<td class="title"><a href="{escape(row["url"])}">{escape(row["title"])}</a></td></tr>')
+
+
+def replace_rows(page: str, rows_html: str, keep: bool = True) -> str:
+    """Puts rows on top of the first table body of a page, in place of its rows unless `keep`."""
+    start = page.index("<tbody>") + len("<tbody>")
+    end = start if keep else page.index("</tbody>", start)
+    return page[:start] + rows_html + page[end:]
+
+
+def report_suffix(slug: str) -> str:
+    """'company-7-100-2025' -> '100-2025', the part of an article slug shared by every company."""
+    return "-".join(slug.split("-")[-2:])
+
+
+class PAPServer:
+    """aiohttp app serving the fixtures. `hits` counts requests per route."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, fixtures_dir=FIXTURES_DIR):
+        self.host = host
+        self.port = port
+        fixtures_dir = Path(fixtures_dir)
+        self.listing = (fixtures_dir / "listing.html").read_text(encoding="utf-8")
+        self.feed = (fixtures_dir / "feed.html").read_text(encoding="utf-8")
+        self.article = (fixtures_dir / "article.html").read_text(encoding="utf-8")
+        self.results = (fixtures_dir / "results.html").read_text(encoding="utf-8")
+        self.pdf = (fixtures_dir / PDF_NAME).read_bytes()
+        # Report number-year -> type, taken from the titles of the saved listing
+        self.report_types = {report_suffix(row["url"]): classify_espi_type(row["title"].lower())
+                             for row in parse_espi_announcements(self.listing)}
+        self.article_with_pdf = self.article.replace(
+            "</article>", f'<p><a href="/pdf/{PDF_NAME}">Zawiadomienie MAR.pdf</a></p></article>', 1)
+        # Rows added by `publish`, newest first: company id -> rows and (company id, row) for the feed
+        self.published = {}
+        self.published_feed = []
+        # article url -> type of the published rows
+        self.article_types = {}
+        self.feed_size = 100
+        self.hits = Counter()
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def company_listing(self, number: str) -> str:
+        page = (self.listing.replace(LISTING_COMPANY, f"company={number}&amp;selectCompany={number}")
+                .replace(LISTING_ARTICLE_PREFIX, f"/wiadomosci/firmy/company-{number}-"))
+        if number in self.published:
+            page = replace_rows(page, "".join(render_row(number, row) for row in self.published[number]))
+        return page
+
+    def feed_page(self) -> str:
+        """The saved feed, or only the published rows once something was published."""
+        if not self.published_feed:
+            return self.feed
+        rows = self.published_feed[:self.feed_size]
+        return replace_rows(self.feed, "".join(render_row(number, row) for number, row in rows), keep=False)
+
+    def publish(self, number: str, row: dict):
+        """Makes a new announcement of a company visible, like PAP does when a report comes out."""
+        self.published.setdefault(number, []).insert(0, row)
+        self.published_feed.insert(0, (number, row))
+        self.article_types[row["url"]] = classify_espi_type(row["title"].lower())
+
+    def _page(self, request, text: str):
+        etag = f'"{hashlib.sha1(text.encode("utf-8")).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(text=text, content_type="text/html", headers={"ETag": etag})
+
+    async def _feed(self, request):
+        self.hits["feed"] += 1
+        return self._page(request, self.feed_page())
+
+    async def _listing(self, request):
+        self.hits["listing"] += 1
+        return self._page(request, self.company_listing(request.query.get("company", "1")))
+
+    async def _article(self, request):
+        self.hits["article"] += 1
+        report_type = self.article_types.get(request.path) or self.report_types.get(
+            report_suffix(request.match_info["slug"]), ESPIType.GENERAL)
+        if report_type == ESPIType.RESULTS:
+            return self._page(request, self.results)
+        if report_type == ESPIType.SHARES:
+            return self._page(request, self.article_with_pdf)
+        return self._page(request, self.article)
+
+    async def _pdf(self, request):
+        self.hits["pdf"] += 1
+        return web.Response(body=self.pdf, content_type="application/pdf")
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/espi", self._feed)
+        app.router.add_get("/espi/espi/{year}", self._listing)
+        app.router.add_get("/wiadomosci/firmy/{slug}", self._article)
+        app.router.add_get("/pdf/{name}", self._pdf)
+        return app
+
+    async def start(self) -> str:
+        """Starts serving, returns the base URL (a free port is picked if port is 0)."""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.base_url
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def serve(port: int):
+    server = PAPServer(port=port)
+    print(f"Serving PAP fixtures on {await server.start()}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    asyncio.run(serve(args.port))
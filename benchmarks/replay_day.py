@@ -0,0 +1,323 @@
+"""Replays a day of ESPI publications through the real ESPITracker, faster than real time.
+
+    python -m benchmarks.replay_day [--speed 60] [--companies 100] [--day 2025-03-31]
+                                    [--start 06:00] [--end 21:00] [--storage json|sqlite] [--feed]
+    python -m benchmarks.replay_day --from-history espi_history.json --day 2025-03-28 --save-day day.json
+    python -m benchmarks.replay_day --replay day.json
+
+Publications come from a recorded day (a saved day file, or one day of the bot's own
+espi_history.json) or from a synthetic results-season day. The synthetic day has bursts
+before the session and after the 17:00 close. Each publication appears on the local PAP
+stand-in at its time on a simulated clock running `speed` times faster than real time.
+The tracker polls on its adaptive schedule against that clock. The request budget and the
+Discord pacing are scaled by the same factor, and messages go to a fake channel.
+
+Reported:
+- detection latency, from publication to the message being sent, in simulated seconds;
+- missed, duplicated and unexpected announcements;
+- the requests made;
+- the peak RSS of the process, which includes the stand-in server.
+
+CPU time is not accelerated, so latencies at high speeds are pessimistic.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import replace
+from datetime import datetime, timedelta
+from pathlib import Path
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from benchmarks.bench_offline import FakeBot, FakeChannel, listing_url
+from benchmarks.pap_server import PAPServer
+from cogs.espi_tracker import REQUESTS_PER_SECOND, TICK_INTERVAL, ESPITracker
+from utils.delivery import CHANNEL_BURST, CHANNEL_RATE, COALESCE_DELAY, DeliveryQueue
+from utils.fetcher import ESPIFetcher
+from utils.history import announcement_timestamp, build_history_index, compact_history
+from utils.http_cache import ResponseCache
+from utils.pdf_pipeline import PDFPipeline
+from utils.results import ResultsStore
+from utils.scheduler import PollScheduler, RateLimiter
+from utils.search import SearchIndex
+from utils.storage import JSONStorage, SQLiteStorage
+from utils.subscriptions import SubscriptionRegistry
+from utils.utils import parse_espi_announcements
+
+DECODERS_DIR = ROOT / "decoders"
+DEFAULT_DAY = "2025-03-31"
+# Share of a synthetic day's publications in each Warsaw time window
+SYNTHETIC_WINDOWS = [
+    ((7, 0), (8, 30), 0.35),
+    ((8, 30), (17, 0), 0.2),
+    ((17, 0), (18, 30), 0.4),
+    ((18, 30), (21, 0), 0.05),
+]
+SYNTHETIC_TITLES = [
+    "Raport okresowy roczny {n}/2025 R",
+    "Raport okresowy roczny skonsolidowany {n}/2025 RS",
+    "Raport bieżący nr {n}/2025 Zawiadomienia w trybie art. 19 ust. 1 rozporządzenia MAR",
+    "Raport bieżący nr {n}/2025 Zwołanie Zwyczajnego Walnego Zgromadzenia",
+    "Raport bieżący nr {n}/2025 Zawarcie istotnej umowy",
+]
+GRACE = timedelta(minutes=30)
+
+
+class SimClock:
+    """Simulated Warsaw time starting at `start` and running `speed` times faster than real time."""
+
+    def __init__(self, start: datetime, speed: float):
+        self.start = start
+        self.speed = speed
+        self._real_start = time.monotonic()
+
+    def monotonic(self) -> float:
+        return (time.monotonic() - self._real_start) * self.speed
+
+    def now(self) -> datetime:
+        return self.start + timedelta(seconds=self.monotonic())
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(max(seconds, 0) / self.speed)
+
+    async def sleep_until(self, moment: datetime):
+        await self.sleep((moment - self.now()).total_seconds())
+
+
+class RecordingDeliveryQueue(DeliveryQueue):
+    """Delivery queue noting the simulated time every announcement is sent at."""
+
+    def __init__(self, clock: SimClock, **kwargs):
+        super().__init__(**kwargs)
+        self.clock = clock
+        # (channel id, announcement path, simulated time)
+        self.delivered = []
+
+    def enqueue(self, channel, title: str, entries: list):
+        super().enqueue(channel, title, [replace(entry, on_sent=self._recorder(channel.id, entry)) for entry in entries])
+
+    def _recorder(self, channel_id, entry):
+        def on_sent(message):
+            self.delivered.append((channel_id, urlsplit(entry.url).path, self.clock.now()))
+            if entry.on_sent is not None:
+                entry.on_sent(message)
+        return on_sent
+
+
+def synthetic_day(day: str, numbers: list, names: dict, per_company: float, seed: int = 0) -> list:
+    """[{company_id, date, time, company, title, url}] of a results-season day, in publication order."""
+    rng = random.Random(seed)
+    base = datetime.strptime(day, "%Y-%m-%d")
+    windows = [(base.replace(hour=sh, minute=sm), base.replace(hour=eh, minute=em)) for (sh, sm), (eh, em), _ in
+               SYNTHETIC_WINDOWS]
+    weights = [share for _, _, share in SYNTHETIC_WINDOWS]
+    events = []
+    for number in numbers:
+        # Binomial draw with the given mean, at most 10 reports a day
+        count = sum(rng.random() < per_company / 10 for _ in range(10))
+        for n in range(count):
+            start, end = rng.choices(windows, weights)[0]
+            at = start + timedelta(seconds=rng.uniform(0, (end - start).total_seconds()))
+            events.append({
+                "company_id": number,
+                "date": at.strftime("%Y-%m-%d"),
+                "time": at.strftime("%H:%M"),
+                "seconds": at.second,
+                "company": names.get(number, f"Company {number}"),
+                "title": rng.choice(SYNTHETIC_TITLES).format(n=200 + n),
+                "url": f"/wiadomosci/firmy/replay-{number}-{day}-{n}",
+            })
+    return sorted(events, key=publication_time)
+
+
+def day_from_history(history_file, day: str) -> list:
+    """One day of a saved espi_history.json, in the same shape as `synthetic_day`."""
+    history = json.loads(Path(history_file).read_text(encoding="utf-8"))
+    events = [{"company_id": number, **announcement}
+              for number, announcements in history.items()
+              for announcement in announcements if announcement.get("date") == day]
+    return sorted(events, key=publication_time)
+
+
+def publication_time(event: dict) -> datetime:
+    return announcement_timestamp(event) + timedelta(seconds=event.get("seconds", 0))
+
+
+def build_tracker(server: PAPServer, numbers: list, names: dict, clock: SimClock, storage: str,
+                  data_dir: Path, feed_mode: bool) -> ESPITracker:
+    tracker = ESPITracker(bot=FakeBot())
+    if storage == "sqlite":
+        tracker.storage = SQLiteStorage(data_dir / "espi.db")
+    else:
+        tracker.storage = JSONStorage(data_dir / "pinned_stocks.json", data_dir / "espi_history.json",
+                                      data_dir / "subscriptions.json")
+    # The JSON backend saves the dicts the tracker mutates, so they have to be the loaded ones
+    tracker.pinned_stocks, tracker.espi_history = tracker.storage.load()
+    tracker.subscriptions = SubscriptionRegistry(tracker.storage.load_subscriptions())
+
+    # Request budget and Discord pacing run on the simulated clock too
+    tracker.scheduler = PollScheduler(clock=clock.monotonic, wall_clock=clock.now)
+    tracker.fetcher = ESPIFetcher(cache=ResponseCache(), rate_limiter=RateLimiter(REQUESTS_PER_SECOND * clock.speed),
+                                  base_url=server.base_url)
+    tracker.delivery = RecordingDeliveryQueue(clock, coalesce_delay=COALESCE_DELAY / clock.speed,
+                                              rate=CHANNEL_RATE * clock.speed, burst=CHANNEL_BURST)
+    tracker.pdf_pipeline = PDFPipeline(tracker.fetcher, pdf_dir=data_dir / "pdf_cache",
+                                       results_file=data_dir / "pdf_results.json")
+    tracker.results_store = ResultsStore(data_dir / "espi_results.parquet")
+    tracker.search_index = SearchIndex(data_dir / "espi_search.jsonl")
+    tracker.feed_mode = feed_mode
+
+    channel = FakeChannel(1)
+    for number in numbers:
+        history = parse_espi_announcements(server.company_listing(number))
+        company_data = {"name": names.get(number, f"Company {number}"), "emoji": "📈", "url": listing_url(server.base_url, number),
+                        "messages": []}
+        tracker.pinned_stocks[number] = company_data
+        tracker.espi_history[number] = history
+        tracker.storage.add_company(number, company_data, history)
+        tracker.subscriptions.subscribe(channel, number)
+        tracker.storage.add_subscription(channel.id, None, number)
+    tracker.storage.flush()
+    compact_history(tracker.espi_history)
+    tracker.espi_index = build_history_index(tracker.espi_history)
+    return tracker
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+
+
+async def replay(events: list, numbers: list, names: dict, day: str, speed: float, start: str, end: str,
+                 storage: str = "json", feed_mode: bool = False, log=None) -> dict:
+    """Runs the replay with `numbers` tracked and returns the report. The bot's output goes to `log` if given."""
+    window_start = datetime.strptime(f"{day} {start}", "%Y-%m-%d %H:%M")
+    window_end = datetime.strptime(f"{day} {end}", "%Y-%m-%d %H:%M")
+    events = [event for event in events if window_start <= publication_time(event) < window_end]
+
+    server = PAPServer()
+    await server.start()
+    published = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        clock = SimClock(window_start, speed)
+        tracker = build_tracker(server, numbers, names, clock, storage, Path(data_dir), feed_mode)
+        tracker.pdf_pipeline.start(tracker._send_transaction_data)
+
+        async def publish():
+            for event in events:
+                await clock.sleep_until(publication_time(event))
+                row = {key: event[key] for key in ("date", "time", "company", "title", "url")}
+                server.publish(event["company_id"], row)
+                published[row["url"]] = clock.now()
+
+        async def poll(until: datetime):
+            while clock.now() < until:
+                await tracker.check_espi()
+                await clock.sleep(TICK_INTERVAL)
+
+        real_start = time.perf_counter()
+        with contextlib.redirect_stdout(log) if log else contextlib.nullcontext():
+            await asyncio.gather(publish(), poll(window_end + GRACE))
+            await tracker.delivery.join()
+        real_seconds = time.perf_counter() - real_start
+
+        await tracker.pdf_pipeline.close()
+        await tracker.delivery.close()
+        await tracker.fetcher.close()
+        if storage == "sqlite":
+            tracker.storage.close()
+    await server.close()
+
+    deliveries = Counter(url for _, url, _ in tracker.delivery.delivered)
+    first_sent = {}
+    for _, url, sent_at in tracker.delivery.delivered:
+        first_sent.setdefault(url, sent_at)
+    latencies = {url: (first_sent[url] - published_at).total_seconds()
+                 for url, published_at in published.items() if url in first_sent}
+    by_hour = {}
+    for url, latency in latencies.items():
+        by_hour.setdefault(published[url].hour, []).append(latency)
+
+    return {
+        "published": len(published),
+        "delivered": len(latencies),
+        "missed": sorted(set(published) - set(first_sent)),
+        "duplicated": sorted(url for url, count in deliveries.items() if count > 1),
+        "unexpected": sorted(set(first_sent) - set(published)),
+        "latency": {"p50": percentile(list(latencies.values()), 0.5),
+                    "p90": percentile(list(latencies.values()), 0.9),
+                    "p99": percentile(list(latencies.values()), 0.99),
+                    "max": max(latencies.values(), default=0.0)},
+        "latency_by_hour": {hour: (len(values), percentile(values, 0.9)) for hour, values in sorted(by_hour.items())},
+        "requests": dict(server.hits),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "real_seconds": real_seconds,
+    }
+
+
+def print_report(report: dict):
+    latency = report["latency"]
+    print(f"Published {report['published']}, delivered {report['delivered']}, missed {len(report['missed'])}, "
+          f"duplicated {len(report['duplicated'])}, unexpected {len(report['unexpected'])}")
+    print(f"Detection latency [simulated s]: p50 {latency['p50']:.0f}, p90 {latency['p90']:.0f}, "
+          f"p99 {latency['p99']:.0f}, max {latency['max']:.0f}")
+    for hour, (count, p90) in report["latency_by_hour"].items():
+        print(f"  {hour:02d}:00  {count:5d} published  p90 {p90:6.0f} s")
+    print(f"Requests: {report['requests']}")
+    print(f"Peak RSS: {report['peak_rss_mb']:.0f} MB, took {report['real_seconds']:.0f} s real time")
+    for name in ("missed", "duplicated", "unexpected"):
+        for url in report[name][:10]:
+            print(f"  {name}: {url}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--speed", type=float, default=60)
+    parser.add_argument("--day", default=DEFAULT_DAY)
+    parser.add_argument("--start", default="06:00", help="Warsaw time the replay starts at")
+    parser.add_argument("--end", default="21:00", help="last publication time, polling goes on for 30 minutes")
+    parser.add_argument("--companies", type=int, default=100, help="tracked companies of a synthetic day")
+    parser.add_argument("--per-company", type=float, default=2, help="mean reports per company of a synthetic day")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", help="day file saved with --save-day")
+    parser.add_argument("--from-history", help="espi_history.json to take the day from")
+    parser.add_argument("--save-day", help="write the replayed publications to this file")
+    parser.add_argument("--storage", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--feed", action="store_true", help="poll in feed mode")
+    parser.add_argument("--log", help="write the bot's output to this file")
+    args = parser.parse_args()
+
+    stock_id = json.loads((DECODERS_DIR / "stock_id.json").read_text(encoding="utf-8"))
+    if args.replay or args.from_history:
+        events = (json.loads(Path(args.replay).read_text(encoding="utf-8")) if args.replay
+                  else day_from_history(args.from_history, args.day))
+        args.day = events[0]["date"] if events else args.day
+        # A recorded day tracks the companies that published on it
+        numbers = list(dict.fromkeys(event["company_id"] for event in events))
+        names = {**stock_id, **{event["company_id"]: event["company"] for event in events}}
+    else:
+        numbers = list(stock_id)[:args.companies]
+        names = stock_id
+        events = synthetic_day(args.day, numbers, names, args.per_company, args.seed)
+    if args.save_day:
+        Path(args.save_day).write_text(json.dumps(events, ensure_ascii=False, indent=1), encoding="utf-8")
+
+    print(f"Replaying {args.start}-{args.end} of {args.day} ({len(events)} publications that day) at {args.speed:g}x")
+    with open(args.log, "w", encoding="utf-8") if args.log else open(os.devnull, "w") as log:
+        report = asyncio.run(replay(events, numbers, names, args.day, args.speed, args.start, args.end,
+                                    args.storage, args.feed, log))
+    print_report(report)
+    sys.exit(1 if report["missed"] or report["duplicated"] or report["unexpected"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,194 @@
+from discord import app_commands
 from discord.ext import commands, tasks
+import asyncio
 import discord
-import json
+import time
 from pathlib import Path
 
-from utils.espi_classifier import handle_new_espi
-from utils.utils import get_company_name, inform_new_espies, decode_to_number, get_espi_announcements
-from openai import OpenAI
+from utils.delivery import DeliveryEntry, DeliveryQueue
+from utils.emoji_cache import DEFAULT_EMOJI, EmojiCache, OpenAIEmojiClient
+from utils.espi_classifier import ESPIType, espi_type_of, label_announcements
+from utils.fetcher import ESPIFetcher
+from utils.metrics import METRICS, MetricsServer, format_stats
+from utils.history import (ESPIRecord, RetentionPolicy, announcement_key, apply_retention, build_history_index,
+                           compact_history, compact_messages, history_cutoff, history_keys,
+                           newest_announcement)
+from utils.storage import create_storage, load_json
+from utils.subscriptions import SubscriptionRegistry
+from utils.pdf_pipeline import PDFPipeline, format_transaction_data
+from utils.prices import PriceService, create_price_source, ticker_map
+from utils.resolver import CompanyResolver
+from utils.results import METRIC_NAMES, ResultsStore, format_compare, format_results, resolve_metric
+from utils.scheduler import PollScheduler, RateLimiter
+from utils.search import SearchIndex, format_search_results, parse_since
+from utils.workers import Coordinator, spawn_workers
+from utils.utils import filter_new_espies
 from colorama import Fore
 from decouple import config
 from datetime import datetime
-
-CHECK_INTERVAL = 60
+from functools import cached_property
+
+# The loop only wakes up to poll the companies that are due, see utils.scheduler
+TICK_INTERVAL = 5
+REQUESTS_PER_SECOND = config("ESPI_REQUESTS_PER_SECOND", default=2, cast=float)
+FEED_KEY = "feed"
+MAX_CONCURRENCY = config("ESPI_MAX_CONCURRENCY", default=10, cast=int)
+FEED_MODE = config("ESPI_FEED_MODE", default=False, cast=bool)
+PDF_WORKERS = config("ESPI_PDF_WORKERS", default=2, cast=int)
+# Companies tracked before channel subscriptions existed are delivered here
 PL_STOCKS_CHANNEL = "⌊🌍⌉-czat-polska"
-ESPI_HISTORY_FILE = "espi_history.json"
-PINNED_STOCKS_FILE = "pinned_stocks.json"
+# Seconds before the channels are scanned for it again when it's missing
+LEGACY_CHANNEL_RETRY = 10 * 60
+STORAGE_BACKEND = config("ESPI_STORAGE", default="json")
+HISTORY_MAX_ENTRIES = config("ESPI_HISTORY_MAX_ENTRIES", default=500, cast=int)
+HISTORY_MAX_DAYS = config("ESPI_HISTORY_MAX_DAYS", default=0, cast=int)
+# With ESPI_WORKERS > 0 polling runs in that many worker processes, see utils.workers
+WORKER_PROCESSES = config("ESPI_WORKERS", default=0, cast=int)
+WORKERS_DB = config("ESPI_WORKERS_DB", default="espi_workers.db")
+# With ESPI_METRICS_PORT set the metrics are served on http://127.0.0.1:<port>/metrics
+METRICS_PORT = config("ESPI_METRICS_PORT", default=0, cast=int)
+# Discord messages are capped at 2000 characters
+MESSAGE_LIMIT = 1900
 
 STOCK_ID_FILE = Path("decoders") / "stock_id.json"
 SYMBOL_TO_ID_FILE = Path("decoders") / "symbol_to_id.json"
 TICKER_TO_ID_FILE = Path("decoders") / "ticker_to_id.json"
+TICKER_TO_SYMBOL_FILE = Path("decoders") / "ticker_to_symbol.json"
+SETS_FILE = Path("decoders") / "sets.json"
+
+class SearchFlags(commands.FlagConverter):
+    """`!search zbycie akcji company: CDR since: 30d`, the options of the slash command."""
+    terms: str = commands.flag(positional=True, description="Words to look for")
+    company: str = commands.flag(default=None, description="Only announcements of this company")
+    since: str = commands.flag(default=None, description="Published since YYYY-MM-DD or e.g. 30d")
+
 
 class ESPITracker(commands.Cog):
     """Handles ESPI tracking for Polish stocks and generates company emojis using GPT."""
 
     def __init__(self, bot):
         self.bot = bot
-        self.client = OpenAI(api_key=config("OPENAI_API_KEY"))
-        self.pinned_stocks = self.load_json(PINNED_STOCKS_FILE)
-        self.espi_history = self.load_json(ESPI_HISTORY_FILE)
+        self.emoji_cache = EmojiCache(OpenAIEmojiClient(config("OPENAI_API_KEY")))
+        self.storage = create_storage(STORAGE_BACKEND)
+        self.pinned_stocks, self.espi_history = self.storage.load()
+        compact_messages(self.pinned_stocks)
+        compact_history(self.espi_history)
+        self.subscriptions = SubscriptionRegistry(self.storage.load_subscriptions())
+        self.retention = RetentionPolicy(max_entries=HISTORY_MAX_ENTRIES, max_days=HISTORY_MAX_DAYS)
+        self.espi_index = {}
+        self.espi_cutoff = {}
+        for number in self.espi_history:
+            self._apply_retention(number)
+        self.espi_index = build_history_index(self.espi_history)
 
-        self.stock_id = self.load_json(STOCK_ID_FILE)
-        self.symbol_to_id = self.load_json(SYMBOL_TO_ID_FILE)
-        self.ticker_to_id = self.load_json(TICKER_TO_ID_FILE)
         self.last_message_url = None
+        self.feed_mode = FEED_MODE
+        self.last_feed_urls = None
+        self.scheduler = PollScheduler()
+        self.fetcher = ESPIFetcher(max_concurrency=MAX_CONCURRENCY, rate_limiter=RateLimiter(REQUESTS_PER_SECOND))
+        self.pdf_pipeline = PDFPipeline(self.fetcher, workers=PDF_WORKERS)
+        self.delivery = DeliveryQueue()
+        self.results_store = ResultsStore()
+        self.search_index = SearchIndex()
+        self.prices = PriceService(create_price_source())
+        self.coordinator = Coordinator(WORKERS_DB) if WORKER_PROCESSES else None
+        self.worker_processes = []
+        self.published_companies = None
+        self.metrics = METRICS
+        self.metrics_server = MetricsServer(self.metrics, port=METRICS_PORT) if METRICS_PORT else None
+        # The event loop only keeps weak references to tasks, these are kept until they finish
+        self.background_tasks = set()
+        # Monotonic time of the next PL_STOCKS_CHANNEL lookup, None until it was first missing
+        self.legacy_retry_at = None
+        self._register_gauges()
+
+    # Decoder files are read the first time a command or the feed needs them
+
+    @cached_property
+    def stock_id(self) -> dict:
+        return self.load_json(STOCK_ID_FILE)
+
+    @cached_property
+    def symbol_to_id(self) -> dict:
+        return self.load_json(SYMBOL_TO_ID_FILE)
+
+    @cached_property
+    def ticker_to_id(self) -> dict:
+        return self.load_json(TICKER_TO_ID_FILE)
+
+    @cached_property
+    def resolver(self) -> CompanyResolver:
+        return CompanyResolver(self.stock_id, self.ticker_to_id, self.symbol_to_id,
+                               self.load_json(TICKER_TO_SYMBOL_FILE), self.load_json(SETS_FILE))
+
+    @property
+    def name_to_id(self) -> dict:
+        return self.resolver.name_to_id
+
+    def _register_gauges(self):
+        cache = self.fetcher.cache
+        self.metrics.gauge("tracked_companies", lambda: len(self.pinned_stocks))
+        self.metrics.gauge("scheduled_polls", lambda: len(self.scheduler))
+        self.metrics.gauge("delivery_queue_depth", lambda: self.delivery.depth)
+        self.metrics.gauge("pdf_queue_depth", lambda: self.pdf_pipeline.queue.qsize())
+        self.metrics.gauge("cache_hit_ratio",
+                           lambda: round(cache.hits / (cache.hits + cache.misses), 3) if cache.hits + cache.misses else 0)
+
+    async def cog_load(self):
+        self.pdf_pipeline.start(self._send_transaction_data)
+        # Announcements from before the index existed are searchable by title
+        if self.search_index.add_history(self.espi_history):
+            await asyncio.to_thread(self.search_index.flush)
+        self.prices.tickers = ticker_map(self.ticker_to_id)
+        self.prices.start(lambda: self.pinned_stocks)
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+        if self.coordinator is not None:
+            self.worker_processes = spawn_workers(WORKER_PROCESSES, WORKERS_DB, REQUESTS_PER_SECOND)
+
+    async def cog_unload(self):
+        self.check_espi.cancel()
+        for task in self.background_tasks:
+            task.cancel()
+        await self.pdf_pipeline.close()
+        await self.delivery.close()
+        await self.prices.close()
+        await self.fetcher.close()
+        await asyncio.to_thread(self.results_store.save)
+        self.search_index.flush()
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+        for process in self.worker_processes:
+            process.terminate()
+        if self.coordinator is not None:
+            self.coordinator.close()
+
+    async def _send_transaction_data(self, message, results: list):
+        """Replies to a MAR notification with the transaction data parsed from its PDFs."""
+        for data in results:
+            summary = format_transaction_data(data)
+            if summary:
+                await message.reply(summary)
+
+    def _seen_keys(self, number: str) -> set:
+        """Dedupe index of a company, built on first use if it's missing."""
+        keys = self.espi_index.get(number)
+        if keys is None:
+            keys = self.espi_index[number] = history_keys(self.espi_history.get(number, []))
+        return keys
+
+    def _apply_retention(self, number: str):
+        """Drops history entries outside the retention policy and refreshes the dedupe index."""
+        if not self.retention.enabled:
+            return
+        history = self.espi_history[number]
+        retained = apply_retention(history, self.retention)
+        if retained is not history:
+            self.espi_history[number] = retained
+            self.espi_index[number] = history_keys(retained)
+            # Dropped rows are deleted from the store too, so it and the startup load stay bounded
+            self.storage.prune_history(number, retained)
+        self.espi_cutoff[number] = history_cutoff(retained)
 
     @commands.Cog.listener()
     async def on_ready(self):
@@ -39,50 +196,131 @@ class ESPITracker(commands.Cog):
         if not self.check_espi.is_running():
             self.check_espi.start()
 
-    def load_json(self, file):
-        """Load JSON data from a file."""
-        if Path(file).exists():
-            with open(file, "r") as f:
-                try:
-                    return json.load(f)
-                except json.JSONDecodeError:
-                    print(f"Warning: {file} is corrupted or empty. Resetting data.")
-                    return {}  # Return an empty dictionary if JSON is invalid
-        return {}
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        if after.id in self.subscriptions.channels:
+            self.subscriptions.cache_channel(after)
 
-    def save_json(self, file, data):
-        """Save JSON data to a file."""
-        with open(file, "w") as f:
-            json.dump(data, f, indent=4)
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        if self._drop_channel(channel.id):
+            self.storage.flush()
 
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        dropped = [self._drop_channel(channel_id) for channel_id in self.subscriptions.guild_channels(guild.id)]
+        if any(dropped):
+            self.storage.flush()
+
+    def _drop_channel(self, channel_id) -> bool:
+        """Removes the subscriptions of a deleted channel and stops tracking companies nobody watches anymore."""
+        numbers = self.subscriptions.remove_channel(channel_id)
+        for number in numbers:
+            self.storage.remove_subscription(channel_id, number)
+            if not self.subscriptions.subscribers(number) and number in self.pinned_stocks:
+                self._untrack(number)
+        return bool(numbers)
+
+    def _adopt_legacy_companies(self):
+        """Subscribes PL_STOCKS_CHANNEL to tracked companies that have no subscribers yet.
+
+        That's only the case for companies added before subscriptions existed, so the channel
+        scan by name runs once after an upgrade, or every LEGACY_CHANNEL_RETRY while the channel
+        is missing.
+        """
+        if len(self.subscriptions.companies()) == len(self.pinned_stocks):
+            return
+        orphans = [number for number in self.pinned_stocks if not self.subscriptions.subscribers(number)]
+        if not orphans:
+            return
+        if self.legacy_retry_at is not None and time.monotonic() < self.legacy_retry_at:
+            return
+        channel = discord.utils.get(self.bot.get_all_channels(), name=PL_STOCKS_CHANNEL)
+        if not channel:
+            if self.legacy_retry_at is None:
+                print(f"Channel {PL_STOCKS_CHANNEL} not found, {len(orphans)} companies have no subscribers.")
+            self.legacy_retry_at = time.monotonic() + LEGACY_CHANNEL_RETRY
+            return
+        self.legacy_retry_at = None
+        for number in orphans:
+            self.subscriptions.subscribe(channel, number)
+            self.storage.add_subscription(channel.id, self.subscriptions.channels[channel.id]["guild"], number)
+        # Saved with the next flush, until then it's simply redone after a restart
+
+    def _subscriber_channels(self, number: str) -> list:
+        channels = []
+        for channel_id in self.subscriptions.subscribers(number):
+            channel = self.subscriptions.channel(self.bot, channel_id)
+            if channel is not None:
+                channels.append(channel)
+        return channels
 
-    def get_company_emoji(self, company_name):
-        """Generates a single emoji based on the company name using GPT."""
-        try:
-            completion = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                store=True,
-                messages=[
-                    {"role": "user", "content": f"Give me a single emoji that represents the company {company_name}. If you don't know return random emoji"}
-                ]
-            )
-            return completion.choices[0].message.content or "🏢"
-        except Exception as e:
-            return "🏢"  # Default emoji if API fails
+    def load_json(self, file):
+        """Load JSON data from a file."""
+        return load_json(file)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """Runs a coroutine in the background, keeping its task referenced until it's done."""
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    def get_company_emoji(self, number: str, company_name: str) -> str:
+        """Returns the cached emoji of a company without waiting for GPT.
+
+        On a cache miss the default emoji is used and the real one is generated in the background.
+        """
+        emoji = self.emoji_cache.get(number)
+        if emoji is not None:
+            return emoji
+        self._spawn(self._update_company_emoji(number, company_name))
+        return DEFAULT_EMOJI
+
+    async def _update_company_emoji(self, number: str, company_name: str):
+        emoji = await self.emoji_cache.fetch(number, company_name)
+        company_data = self.pinned_stocks.get(number)
+        if company_data is not None and company_data["emoji"] != emoji:
+            company_data["emoji"] = emoji
+            self.storage.update_company(number, company_data)
+            self.storage.flush()
+
+    @commands.command()
+    @commands.is_owner()
+    async def pregenerate_emojis(self, ctx, per_minute: int = 30):
+        """Fills the emoji cache for every known company in the background."""
+        await ctx.send(f"Generating emojis for {len(self.stock_id)} companies, {per_minute} per minute.")
+        self._spawn(self.emoji_cache.pregenerate(self.stock_id, per_minute))
 
     async def _remove_stock(self, ctx, number: str):
-        """Stops tracking a company for ESPI updates and unpins any pinned messages."""
+        """Stops tracking a company in this channel and unpins its messages here.
+
+        The company is dropped altogether once no channel watches it anymore.
+        """
         if number not in self.pinned_stocks:
             await ctx.send("This company is not being tracked.")
             return
 
+        subscribers = self.subscriptions.subscribers(number)
+        if subscribers and ctx.channel.id not in subscribers:
+            await ctx.send("This company is not being tracked in this channel.")
+            return
+
         company_data = self.pinned_stocks[number]
         company_name = company_data["name"]
-        channel = discord.utils.get(ctx.guild.channels, name=PL_STOCKS_CHANNEL)
+        last_subscriber = len(subscribers) <= 1
 
-        # Unpin any pinned messages
+        # Unpin the messages pinned in this channel, and the ones from before subscriptions existed
         for msg in company_data.get("messages", []):
-            if msg.get("pinned") and "id" in msg:
+            if "channel" in msg:
+                if msg["channel"] != ctx.channel.id:
+                    continue
+                channel = ctx.channel
+            elif last_subscriber:
+                channel = discord.utils.get(ctx.guild.channels, name=PL_STOCKS_CHANNEL)
+            else:
+                continue
+            if channel and msg.get("pinned") and "id" in msg:
                 try:
                     message = await channel.fetch_message(msg["id"])
                     await message.unpin()
@@ -93,116 +331,370 @@ class ESPITracker(commands.Cog):
                 except discord.HTTPException as e:
                     print(f"Error unpinning message: {e}")
 
-        # Remove company from memory and persist
-        del self.pinned_stocks[number]
-        self.espi_history.pop(number, None)
-
-        self.save_json(PINNED_STOCKS_FILE, self.pinned_stocks)
-        self.save_json(ESPI_HISTORY_FILE, self.espi_history)
+        if self.subscriptions.unsubscribe(ctx.channel.id, number):
+            self.storage.remove_subscription(ctx.channel.id, number)
+        if not self.subscriptions.subscribers(number):
+            self._untrack(number)
+        self.storage.flush()
 
         await ctx.send(f"Stopped tracking ESPI announcements for **{company_name}**.")
 
+    def _untrack(self, number: str):
+        """Removes a company from memory and storage."""
+        del self.pinned_stocks[number]
+        self.espi_history.pop(number, None)
+        self.espi_index.pop(number, None)
+        self.espi_cutoff.pop(number, None)
+        self.scheduler.remove(number)
+        self.storage.remove_company(number)
+
     async def _add_company_to_dict(self, ctx, number: str) -> None:
-        """Adds a company to track ESPI announcements and generates an emoji."""
+        """Subscribes this channel to a company's ESPI announcements.
+
+        A company nobody tracked yet is fetched first and gets an emoji.
+        """
         print(f"add {number}")
-        if ctx.channel.name != PL_STOCKS_CHANNEL:
-            await ctx.send(f"This command can only be used in {PL_STOCKS_CHANNEL}.")
+        if self.subscriptions.is_subscribed(ctx.channel.id, number):
+            await ctx.send("This company is already tracked in this channel.")
             return
 
-        url = f"https://biznes.pap.pl/espi/espi/{datetime.now().year}?company={number}&selectCompany={number}"  # build the actual URL
+        if number in self.pinned_stocks:
+            await self._subscribe(ctx, number)
+            self.storage.flush()
+            return
+
+        url = f"{self.fetcher.base_url}/espi/espi/{datetime.now().year}?company={number}&selectCompany={number}"  # build the actual URL
 
-        company_name = get_company_name(url)
+        company_name = await self.fetcher.get_company_name(url)
         if not company_name:
             await ctx.send("Invalid URL or failed to fetch company name.")
             return
 
-        emoji = self.get_company_emoji(company_name)
+        emoji = self.get_company_emoji(number, company_name)
 
+        announcements = await self.fetcher.get_espi_announcements(url)
+        # Both are set without an await in between, a tick never sees a company without its history
+        self.espi_history[number] = [ESPIRecord.from_dict(announcement) for announcement in announcements]
         self.pinned_stocks[number] = {"name": company_name, "emoji": emoji, "url": url, "messages": []}
-        self.espi_history[number] = get_espi_announcements(url)
+        self.espi_index[number] = history_keys(self.espi_history[number])
+        self._apply_retention(number)
 
-        await ctx.send(f"Now tracking ESPI announcements for **{company_name}** {emoji}.")
-        message = await ctx.send(f"{company_name} {emoji}")
-        await message.pin()
+        self.storage.add_company(number, self.pinned_stocks[number], self.espi_history[number])
+        await self._subscribe(ctx, number)
+        self.storage.flush()
+
+    async def _subscribe(self, ctx, number: str):
+        company_data = self.pinned_stocks[number]
+        self.subscriptions.subscribe(ctx.channel, number)
+        self.storage.add_subscription(ctx.channel.id, self.subscriptions.channels[ctx.channel.id]["guild"], number)
 
-        self.pinned_stocks[number]["messages"].append({"content": message.content, "id": message.id, "pinned": True})
+        await ctx.send(f"Now tracking ESPI announcements for **{company_data['name']}** {company_data['emoji']}.")
+        message = await ctx.send(f"{company_data['name']} {company_data['emoji']}")
+        await message.pin()
 
-        self.save_json(PINNED_STOCKS_FILE, self.pinned_stocks)
-        self.save_json(ESPI_HISTORY_FILE, self.espi_history)
+        record = {"id": message.id, "channel": ctx.channel.id, "pinned": True}
+        company_data["messages"].append(record)
+        self.storage.append_message(number, record)
 
     @commands.command()
     async def link(self, ctx):
         if self.last_message_url is not None:
             await ctx.send(f"url {self.last_message_url}")
 
-    @commands.command()
-    async def add(self, ctx, input_str):
+    @commands.hybrid_command()
+    async def add(self, ctx, input_str: str):
+        # Fetching a new company can take longer than the 3 s a slash command gets to answer
+        await ctx.defer()
         try:
-            number = decode_to_number(input_str, self.ticker_to_id, self.symbol_to_id, self.stock_id)
+            number = self.resolver.resolve(input_str)
             await self._add_company_to_dict(ctx, number)
         except ValueError as e:
             await ctx.send(str(e))
 
-    @commands.command()
-    async def remove(self, ctx, input_str):
+    @add.autocomplete("input_str")
+    async def add_autocomplete(self, interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=label[:100], value=number) for number, label in self.resolver.suggest(current, 25)]
+
+    @commands.hybrid_command()
+    async def remove(self, ctx, input_str: str):
+        await ctx.defer()
         try:
-            number = decode_to_number(
-                input_str,
-                self.ticker_to_id,
-                self.symbol_to_id,
-                self.stock_id
-            )
+            number = self.resolver.resolve(input_str)
             await self._remove_stock(ctx, number)
         except ValueError as e:
             await ctx.send(str(e))
 
-    @tasks.loop(seconds=CHECK_INTERVAL)
-    async def check_espi(self):
-        """Checks for new ESPI announcements and sends updates to Discord."""
-        print(f"{Fore.LIGHTBLUE_EX}Checking ESPI updates... {datetime.now().strftime('%c')}{Fore.RESET}")
-
-        if not self.pinned_stocks:
-            print("No tracked companies")
+    @remove.autocomplete("input_str")
+    async def remove_autocomplete(self, interaction: discord.Interaction, current: str):
+        tracked = self.subscriptions.channel_companies(interaction.channel_id)
+        if current:
+            suggestions = [(number, label) for number, label in self.resolver.suggest(current, 100) if number in tracked]
+        else:
+            suggestions = [(number, self.resolver.label(number)) for number in tracked]
+        return [app_commands.Choice(name=label[:100], value=number) for number, label in suggestions[:25]]
+
+    @commands.hybrid_command()
+    async def stats(self, ctx):
+        """Shows polling, parsing and delivery metrics."""
+        names = {number: company_data["name"] for number, company_data in self.pinned_stocks.items()}
+        await ctx.send(f"```\n{format_stats(self.metrics, names)[:MESSAGE_LIMIT]}\n```")
+
+    @commands.hybrid_command()
+    async def results(self, ctx, input_str: str):
+        """Shows the latest financial results of a company from the stored periodic reports."""
+        await ctx.defer()
+        try:
+            number = self.resolver.resolve(input_str)
+        except ValueError as e:
+            await ctx.send(str(e))
             return
-
-        channel = discord.utils.get(self.bot.get_all_channels(), name=PL_STOCKS_CHANNEL)
-        if not channel:
-            print(f"Channel {PL_STOCKS_CHANNEL} not found.")
+        # The first query reads the store and imports pandas, off the event loop
+        await asyncio.to_thread(self.results_store.load)
+        rows = self.results_store.company(number)
+        if rows is None or rows.empty:
+            await ctx.send("No financial results stored for this company yet.")
             return
+        name = self.pinned_stocks.get(number, {}).get("name") or self.resolver.label(number)
+        await ctx.send(f"```\n{format_results(name, rows)}\n```")
 
-        for number, company_data in list(self.pinned_stocks.items()):
-            try:
-                url = company_data["url"]
-                new_espies = inform_new_espies(url, company_espi_history=self.espi_history[number])
-
-                if not new_espies:
-                    print(f"No new ESPI reports for {company_data['name']}")
-                    continue
-
-
+    @results.autocomplete("input_str")
+    async def results_autocomplete(self, interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=label[:100], value=number) for number, label in self.resolver.suggest(current, 25)]
 
+    @commands.hybrid_command()
+    async def search(self, ctx, *, flags: SearchFlags):
+        """Searches announcement titles and texts, optionally of one company and since a date (YYYY-MM-DD or e.g. 30d)."""
+        await ctx.defer()
+        try:
+            numbers = [self.resolver.resolve(flags.company)] if flags.company else None
+            since = parse_since(flags.since) if flags.since else None
+        except ValueError as e:
+            await ctx.send(str(e))
+            return
+        results = self.search_index.search(flags.terms, numbers, since)
+        if not results:
+            await ctx.send("No announcements found.")
+            return
+        names = {number: self.pinned_stocks.get(number, {}).get("name") or self.resolver.label(number)
+                 for _, number, *_ in results}
+        await ctx.send(format_search_results(results, names, self.fetcher.base_url)[:MESSAGE_LIMIT])
+
+    @search.autocomplete("company")
+    async def search_autocomplete(self, interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=label[:100], value=number) for number, label in self.resolver.suggest(current, 25)]
+
+    @commands.hybrid_command()
+    async def compare(self, ctx, metric: str = "net_profit"):
+        """Ranks the companies tracked in this channel (or all stored ones) by a metric of their latest report."""
+        await ctx.defer()
+        metric = resolve_metric(metric)
+        tracked = self.subscriptions.channel_companies(ctx.channel.id)
+        await asyncio.to_thread(self.results_store.load)
+        rows = self.results_store.compare(metric, tracked or None)
+        if rows is None or rows.empty:
+            await ctx.send(f"No stored results include {METRIC_NAMES.get(metric, metric)}.")
+            return
+        names = {number: company_data["name"] for number, company_data in self.pinned_stocks.items()}
+        await ctx.send(f"```\n{format_compare(metric, rows, names)}\n```")
 
-                for espi in new_espies:
-                    self.espi_history[number].append(espi)
-                    self.last_message_url = f"https://biznes.pap.pl{espi['url']}"
-
-                    text = handle_new_espi(espi)
-
-                    intro = f"📢 **{company_data['name']} {company_data['emoji']}**\n\n"
+    @compare.autocomplete("metric")
+    async def compare_autocomplete(self, interaction: discord.Interaction, current: str):
+        current = current.lower()
+        return [app_commands.Choice(name=name, value=metric) for metric, name in METRIC_NAMES.items()
+                if current in metric or current in name.lower()][:25]
 
-                    full_message = intro + text
+    @tasks.loop(seconds=TICK_INTERVAL)
+    async def check_espi(self):
+        """Checks the companies (or the feed) that are due for new ESPI announcements and sends updates to Discord."""
+        if not self.pinned_stocks:
+            return
 
-                    if len(full_message) > 2000:
-                        full_message = full_message[:1997] + "..."
+        self._adopt_legacy_companies()
+        if self.coordinator is not None:
+            with self.metrics.timer("tick_seconds"):
+                if await self._check_workers():
+                    await self._flush()
+            return
 
-                    message = await channel.send(full_message)
+        # Companies added or removed since the last tick are picked up here
+        self.scheduler.add_missing([FEED_KEY] if self.feed_mode else self.pinned_stocks)
+        due = [key for key in self.scheduler.pop_due() if key in self.pinned_stocks or key == FEED_KEY]
+        if not due:
+            return
 
-                    self.pinned_stocks[number]["messages"].append({"content": message.content, "id": message.id, "pinned": False})
-                print(f"{Fore.GREEN}New ESPIs sent for {company_data['name']}{Fore.RESET}")
-                self.save_json(PINNED_STOCKS_FILE, self.pinned_stocks)
-                self.save_json(ESPI_HISTORY_FILE, self.espi_history)
-            except Exception as e:
-                print(f"Error while checking {company_data['name']}: {e}")
+        print(f"{Fore.LIGHTBLUE_EX}Checking ESPI updates for {len(due)} of {len(self.pinned_stocks)} companies... "
+              f"{datetime.now().strftime('%c')}{Fore.RESET}")
+
+        # Ticks with nothing due return above, so they don't water down the histogram
+        with self.metrics.timer("tick_seconds"):
+            if self.feed_mode:
+                updated = await self._check_feed()
+                self.scheduler.reschedule(FEED_KEY)
+            else:
+                updated = await self._check_companies(due)
+
+            if updated:
+                await self._flush()
+
+        stats = self.fetcher.stats
+        print(f"Listing fetches: {stats['conditional_requests']}, skipped as 304: {stats['not_modified']}, "
+              f"skipped as unchanged: {stats['unchanged']}, waiting for delivery: {self.delivery.depth}")
+
+    async def _check_companies(self, numbers=None) -> bool:
+        """Polls the listing pages of the given companies, or of every tracked company.
+
+        Companies passed in by the scheduler are scheduled again after their poll.
+        """
+        async def check(number):
+            updated = await self._check_company(number, self.pinned_stocks[number])
+            if numbers is not None and number in self.pinned_stocks:
+                self.scheduler.reschedule(number, self.espi_history.get(number, []))
+            return updated
+
+        # Companies are checked concurrently, the fetcher's rate limit spreads out the requests
+        updated = await asyncio.gather(*(check(number) for number in list(self.pinned_stocks if numbers is None else numbers)))
+        return any(updated)
+
+    async def _check_workers(self) -> bool:
+        """Publishes the tracked companies to the worker processes and sends the rows they found.
+
+        Rows of a company that failed stay in the outbox and are handled again on the next tick.
+        """
+        tracked = {number: company_data["url"] for number, company_data in self.pinned_stocks.items()}
+        # A worker taking over a company only reports the rows above the newest one in its history
+        watermarks = {number: announcement_key(newest_announcement(self.espi_history[number]))
+                      for number in tracked if self.espi_history.get(number)}
+        if (tracked, watermarks) != self.published_companies:
+            await asyncio.to_thread(self.coordinator.publish, tracked, watermarks)
+            self.published_companies = (tracked, watermarks)
+
+        entries = await asyncio.to_thread(self.coordinator.pop_outbox)
+        if not entries:
+            return False
+
+        # Workers report every row they haven't seen, the history decides what is new
+        routed = {}
+        for _, number, announcement in entries:
+            if number in self.pinned_stocks:
+                routed.setdefault(number, []).append(announcement)
+
+        updated = await asyncio.gather(*(
+            self._check_company(number, self.pinned_stocks[number], announcements)
+            for number, announcements in routed.items()
+        ))
+        failed = {number for number, result in zip(routed, updated) if result is None}
+        await asyncio.to_thread(self.coordinator.ack, [entry_id for entry_id, number, _ in entries if number not in failed])
+        return any(updated)
+
+    async def _check_feed(self) -> bool:
+        """Polls the all-companies listing once and routes its rows to the tracked companies.
+
+        Per-company pages are only polled to catch up, i.e. on the first tick after startup
+        and when the feed moved on so far that it no longer overlaps with the previous one.
+        """
+        feed = await self.fetcher.get_espi_feed(self.fetcher.feed_url, self.name_to_id)
+        if feed is None:
+            print("ESPI feed unavailable, falling back to company pages")
+            return await self._check_companies()
+        if not feed:
+            return False
+
+        feed_urls = {announcement["url"] for _, announcement in feed}
+        needs_catch_up = self.last_feed_urls is None or not (feed_urls & self.last_feed_urls)
+        self.last_feed_urls = feed_urls
+        if needs_catch_up:
+            print("Catching up on company pages")
+            return await self._check_companies()
+
+        # pinned_stocks is keyed by company id, so routing is a dict lookup per row
+        routed = {}
+        for number, announcement in feed:
+            if number in self.pinned_stocks:
+                routed.setdefault(number, []).append(announcement)
+
+        updated = await asyncio.gather(*(
+            self._check_company(number, self.pinned_stocks[number], announcements)
+            for number, announcements in routed.items()
+        ))
+        return any(updated)
+
+    async def _check_company(self, number: str, company_data: dict, announcements=None) -> bool:
+        """Sends new ESPI announcements of a single company to every subscribed channel, returns True if any were found.
+
+        The company page is fetched unless the announcements were already taken from the feed or
+        the workers. Returns None if the check failed.
+        """
+        try:
+            if announcements is None:
+                url = company_data["url"]
+                new_espies = await self.fetcher.inform_new_espies(
+                    url, self.espi_history[number], self._seen_keys(number), self.espi_cutoff.get(number))
+            else:
+                new_espies = filter_new_espies(
+                    announcements, self.espi_history[number], self._seen_keys(number), self.espi_cutoff.get(number))
+
+            if not new_espies:
+                print(f"No new ESPI reports for {company_data['name']}")
+                return False
+
+            # Labels are stored with the announcements, nothing classifies them again
+            with self.metrics.timer("classify_seconds"):
+                label_announcements(new_espies)
+            texts = await asyncio.gather(*(self.fetcher.handle_new_espi(espi) for espi in new_espies))
+
+            entries = []
+            for espi, text in zip(new_espies, texts):
+                self.espi_history[number].append(ESPIRecord.from_dict(espi))
+                self._seen_keys(number).add(announcement_key(espi))
+                self.storage.append_announcement(number, espi)
+                self.search_index.add(number, espi, text)
+                self.last_message_url = f"{self.fetcher.base_url}{espi['url']}"
+
+                on_sent = None
+                # Insider transaction details come from the attached PDFs, parsed off the message path
+                if espi_type_of(espi) == ESPIType.SHARES:
+                    on_sent = lambda message, url=self.last_message_url: self.pdf_pipeline.submit(url, message)
+                entries.append(DeliveryEntry(text or espi.get("title", ""), self.last_message_url, on_sent))
+
+            # The price comes from the last snapshot, announcements never wait on a quote
+            title = f"📢 {company_data['name']} {company_data['emoji']}"
+            price = self.prices.price_line(number)
+            if price:
+                title = f"{title} · {price}"
+            # Sending happens in the background, so a burst of reports doesn't hold up polling
+            for channel in self._subscriber_channels(number):
+                self.delivery.enqueue(channel, title, entries)
+            for espi in new_espies:
+                if espi_type_of(espi) == ESPIType.RESULTS:
+                    await self._store_results(number, espi)
+            self._apply_retention(number)
+            print(f"{Fore.GREEN}New ESPIs sent for {company_data['name']}{Fore.RESET}")
+            return True
+        except Exception as e:
+            print(f"Error while checking {company_data['name']}: {e}")
+            self.metrics.inc("company_errors_total", company=number)
+            # Make sure the rows that failed are diffed again on the next tick, workers keep them in the outbox
+            if self.coordinator is None:
+                self.fetcher.invalidate(company_data["url"])
+                if announcements is not None:
+                    self.fetcher.invalidate(self.fetcher.feed_url)
+            return None
+
+    async def _store_results(self, number: str, espi: dict):
+        """Adds the financial data of a periodic report to the results store, the page is already cached."""
+        try:
+            rows = await self.fetcher.get_results(f"{self.fetcher.base_url}{espi['url']}")
+            if rows:
+                await asyncio.to_thread(self.results_store.add, number, espi, rows)
+        except Exception as e:
+            print(f"Error while storing the results of {espi['url']}: {e}")
+
+    async def _flush(self):
+        """Saves what a tick added: the history, the search index and the results store."""
+        self.storage.flush()
+        self.search_index.flush()
+        if self.results_store.dirty:
+            await asyncio.to_thread(self.results_store.save)
 
     @check_espi.before_loop
     async def before_check_espi(self):
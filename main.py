@@ -13,19 +13,28 @@ intents.message_content = True
 intents.guilds = True
 intents.members = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+
+class ESPIBot(commands.Bot):
+    async def setup_hook(self):
+        # Runs once before connecting, on_ready runs again after every reconnect
+        synced = await self.tree.sync()
+        print(f"Synced {len(synced)} slash commands")
+
+
+bot = ESPIBot(command_prefix="!", intents=intents)
 
 @bot.event
 async def on_ready():
     print(f"✅ Bot is ready and logged in as: {bot.user}")
 
-async def setup():
-    # Load the ESPITracker cog
-    print("setup")
-    await bot.add_cog(ESPITracker(bot))
+async def main(token: str):
+    # The cog starts its background tasks in cog_load, so it's added on the loop the bot runs on
+    async with bot:
+        print("setup")
+        await bot.add_cog(ESPITracker(bot))
+        await bot.start(token)
 
 if __name__ == "__main__":
     TOKEN = config("DISCORD_TOKEN")
 
-    asyncio.run(setup())
-    bot.run(TOKEN)
+    asyncio.run(main(TOKEN))
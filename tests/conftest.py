@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+import pytest_asyncio
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from unittest.mock import MagicMock
+from cogs.espi_tracker import ESPITracker
+from utils.delivery import DeliveryQueue
+from utils.prices import PriceService
+
+
+@pytest_asyncio.fixture
+async def tracker(monkeypatch, tmp_path):
+    """An ESPITracker with storage mocked, every state file under tmp_path and no price source.
+
+    The tracker is built inside tmp_path, so the history, emoji, PDF, search and results files it
+    opens by their default relative paths never touch the repository.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("cogs.espi_tracker.ESPITracker.load_json", lambda self, file: {})
+    tracker = ESPITracker(bot=MagicMock())
+    tracker.storage = MagicMock()
+    tracker.delivery = DeliveryQueue(coalesce_delay=0)
+    tracker.prices = PriceService(None)
+    yield tracker
+    tracker.check_espi.cancel()
+    await tracker.delivery.close()
+    await tracker.pdf_pipeline.close()
+    await tracker.prices.close()
+    await tracker.fetcher.close()
+    if tracker.metrics_server is not None:
+        await tracker.metrics_server.close()
+    if tracker.coordinator is not None:
+        tracker.coordinator.close()
@@ -5,7 +5,7 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 from cogs.espi_tracker import ESPITracker
-from cogs.espi_tracker import decode_to_number  # Optional, for debug
+from utils.utils import decode_to_number  # Optional, for debug
 
 @pytest.mark.asyncio
 async def test_add_command_fuzzy_match_real_data():
@@ -0,0 +1,76 @@
+import sys
+from pathlib import Path
+
+import io
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from unittest.mock import AsyncMock, MagicMock
+from benchmarks.replay_day import replay, synthetic_day
+from benchmarks.pap_server import PAPServer
+from utils.delivery import DeliveryQueue
+from utils.fetcher import ESPIFetcher
+from utils.http_cache import ResponseCache
+from utils.history import build_history_index, compact_history
+from utils.utils import parse_espi_announcements
+
+COMPANIES = ["1", "2", "3"]
+
+
+@pytest.mark.asyncio
+async def test_check_espi_against_local_pap(tracker):
+    server = PAPServer()
+    base_url = await server.start()
+
+    tracker.fetcher = ESPIFetcher(cache=ResponseCache(), base_url=base_url)
+    tracker.delivery = DeliveryQueue(coalesce_delay=0, rate=0)
+    tracker.pdf_pipeline.submit = MagicMock()
+    channel = MagicMock(id=10, guild=None)
+    channel.send = AsyncMock()
+    for number in COMPANIES:
+        rows = parse_espi_announcements(server.company_listing(number))
+        tracker.pinned_stocks[number] = {"name": f"Company {number}", "emoji": "📈", "messages": [],
+                                         "url": f"{base_url}/espi/espi/2025?company={number}&selectCompany={number}"}
+        # The newest row hasn't been seen yet, the rest is stored newest first like _add_company_to_dict does
+        tracker.espi_history[number] = rows[1:]
+        tracker.subscriptions.subscribe(channel, number)
+    compact_history(tracker.espi_history)
+    tracker.espi_index = build_history_index(tracker.espi_history)
+
+    try:
+        await tracker.check_espi()
+        await tracker.delivery.join()
+
+        embeds = [call.kwargs["embed"] for call in channel.send.await_args_list]
+        assert sorted(embed.title for embed in embeds) == [f"📢 Company {number} 📈" for number in COMPANIES]
+        assert all(embed.url.startswith(f"{base_url}/wiadomosci/firmy/company-") for embed in embeds)
+        assert server.hits == {"listing": 3, "article": 3}
+        # The newest row is a MAR notification, its PDFs are handed to the pipeline
+        assert tracker.pdf_pipeline.submit.call_count == 3
+        assert len(tracker.search_index.search("zawiadomienie MAR")) == 3
+
+        # Nothing changed since, the listings come back as 304
+        assert not await tracker._check_companies()
+        assert tracker.fetcher.stats["not_modified"] == 3
+        assert channel.send.await_count == 3
+    finally:
+        await tracker.delivery.close()
+        await tracker.fetcher.close()
+        await server.close()
+        tracker.check_espi.cancel()
+
+
+@pytest.mark.asyncio
+async def test_replayed_burst_is_delivered_once():
+    numbers = ["1", "2", "3", "4", "5"]
+    names = {number: f"Company {number}" for number in numbers}
+    events = synthetic_day("2025-03-31", numbers, names, per_company=3, seed=1)
+
+    report = await replay(events, numbers, names, "2025-03-31", speed=1800, start="17:00", end="17:30",
+                          log=io.StringIO())
+
+    assert report["published"] > 0
+    assert report["delivered"] == report["published"]
+    assert report["missed"] == report["duplicated"] == report["unexpected"] == []
+    assert 0 < report["latency"]["max"] < 30 * 60
@@ -0,0 +1,76 @@
+import sys
+from pathlib import Path
+
+import asyncio
+
+import pytest
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from unittest.mock import AsyncMock, MagicMock
+from utils.delivery import DeliveryEntry, DeliveryQueue, pack_entries, split_text
+
+
+def test_split_text_prefers_line_breaks_and_keeps_everything():
+    text = "\n".join(f"line {i} " + "x" * 50 for i in range(100))
+
+    pieces = split_text(text, 500)
+
+    assert all(len(piece) <= 500 for piece in pieces)
+    assert "\n".join(pieces) == text
+
+
+def test_pack_entries_coalesces_short_entries_and_tracks_where_they_start():
+    entries = [DeliveryEntry("a" * 100), DeliveryEntry("b" * 100), DeliveryEntry("c" * 250)]
+
+    chunks, starts = pack_entries(entries, limit=300)
+
+    assert starts == [0, 0, 1]
+    assert len(chunks) == 2
+    assert chunks[1] == "c" * 250
+
+
+@pytest.mark.asyncio
+async def test_delivery_queue_sends_one_embed_per_company_and_splits_long_text():
+    channel = MagicMock(id=1)
+    channel.send = AsyncMock(side_effect=lambda embed: MagicMock(embed=embed))
+    queue = DeliveryQueue(coalesce_delay=0.01, rate=0)
+    on_sent = MagicMock()
+
+    queue.enqueue(channel, "Corp A", [DeliveryEntry("first"), DeliveryEntry("second", on_sent=on_sent)])
+    queue.enqueue(channel, "Corp A", [DeliveryEntry("third")])
+    queue.enqueue(channel, "Corp B", [DeliveryEntry("word " * 2000)])
+    assert queue.depth == 4
+
+    await queue.join()
+
+    embeds = [call.kwargs["embed"] for call in channel.send.await_args_list]
+    assert embeds[0].title == "Corp A"
+    assert "first" in embeds[0].description and "third" in embeds[0].description
+    assert [embed.title for embed in embeds[1:]] == ["Corp B", "Corp B (2/3)", "Corp B (3/3)"]
+    assert "".join(embed.description for embed in embeds[1:]).replace(" ", "") == "word" * 2000
+    on_sent.assert_called_once()
+    assert queue.depth == 0
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_polling_is_not_blocked_by_a_slow_channel():
+    release = asyncio.Event()
+
+    async def wait_for_release(embed):
+        await release.wait()
+
+    slow = MagicMock(id=1)
+    slow.send = AsyncMock(side_effect=wait_for_release)
+    fast = MagicMock(id=2)
+    fast.send = AsyncMock()
+    queue = DeliveryQueue(coalesce_delay=0, rate=0)
+
+    queue.enqueue(slow, "Corp A", [DeliveryEntry("a")])
+    queue.enqueue(fast, "Corp B", [DeliveryEntry("b")])
+    await asyncio.sleep(0.05)
+
+    fast.send.assert_awaited_once()
+    assert queue.channel_depth(slow) == 1
+    release.set()
+    await queue.join()
+    await queue.close()
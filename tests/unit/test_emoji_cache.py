@@ -0,0 +1,54 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from utils.emoji_cache import DEFAULT_EMOJI, EmojiCache
+
+
+class StandInClient:
+    def __init__(self, emoji="🎮", delay=0.0):
+        self.emoji = emoji
+        self.delay = delay
+        self.calls = []
+
+    async def generate(self, company_name):
+        self.calls.append(company_name)
+        await asyncio.sleep(self.delay)
+        return self.emoji
+
+
+@pytest.mark.asyncio
+async def test_fetch_generates_once_and_persists(tmp_path):
+    client = StandInClient()
+    cache = EmojiCache(client, file=tmp_path / "emojis.json")
+
+    results = await asyncio.gather(cache.fetch("1", "11 bit studios SA"), cache.fetch("1", "11 bit studios SA"))
+
+    assert results == ["🎮", "🎮"]
+    assert client.calls == ["11 bit studios SA"]
+    assert json.loads((tmp_path / "emojis.json").read_text()) == {"1": "🎮"}
+    assert EmojiCache(client, file=tmp_path / "emojis.json").get("1") == "🎮"
+
+
+@pytest.mark.asyncio
+async def test_fetch_times_out_to_default_without_caching(tmp_path):
+    cache = EmojiCache(StandInClient(delay=1), file=tmp_path / "emojis.json", timeout=0.01)
+
+    assert await cache.fetch("1", "11 bit studios SA") == DEFAULT_EMOJI
+    assert cache.get("1") is None
+
+
+@pytest.mark.asyncio
+async def test_pregenerate_skips_cached_companies(tmp_path):
+    client = StandInClient()
+    cache = EmojiCache(client, file=tmp_path / "emojis.json")
+    cache.emojis["1"] = "🚀"
+
+    generated = await cache.pregenerate({"1": "11 bit studios SA", "2": "Digital Network SA"}, per_minute=60000)
+
+    assert generated == 1
+    assert client.calls == ["Digital Network SA"]
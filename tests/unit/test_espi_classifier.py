@@ -0,0 +1,66 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from utils.enums import ESPILabel, ESPIType
+from utils.espi_classifier import CLASSIFIER, classify_espi_type, espi_type_of, label_announcements
+from utils.history import ESPIRecord
+from utils.utils import parse_espi_announcements
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "fixtures" / "pap"
+
+
+def fixture_titles():
+    return [row["title"] for name in ("listing.html", "feed.html")
+            for row in parse_espi_announcements((FIXTURES_DIR / name).read_text(encoding="utf-8"))]
+
+
+def substring_type(title):
+    # The substring checks the rule table replaced
+    if "raport okresowy" in title:
+        return ESPIType.RESULTS
+    if "zawiadomienia w trybie art. 19 ust. 1 rozporządzenia mar" in title or "zbycie akcji" in title:
+        return ESPIType.SHARES
+    return ESPIType.GENERAL
+
+
+def test_types_match_the_substring_checks_on_saved_titles():
+    titles = fixture_titles()
+    assert [classify_espi_type(title.lower()) for title in titles] == [substring_type(title.lower()) for title in titles]
+
+
+@pytest.mark.parametrize("title,labels", [
+    ("Raport okresowy roczny skonsolidowany SRR", {ESPILabel.PERIODIC_REPORT, ESPILabel.ANNUAL_REPORT, ESPILabel.CONSOLIDATED}),
+    ("Raport okresowy półroczny za 2024 PSr", {ESPILabel.PERIODIC_REPORT, ESPILabel.HALF_YEAR_REPORT, ESPILabel.CONSOLIDATED}),
+    ("Raport bieżący nr 7/2025 Nabycie akcji własnych", {ESPILabel.BUYBACK}),
+    ("Nabycie akcji przez członka Rady Nadzorczej", {ESPILabel.SHARE_ACQUISITION}),
+    ("Zwołanie Nadzwyczajnego Walnego Zgromadzenia i projekt zmian Statutu",
+     {ESPILabel.GENERAL_MEETING, ESPILabel.ARTICLES_OF_ASSOCIATION}),
+    ("Rekomendacja Zarządu w sprawie wypłaty dywidendy", {ESPILabel.DIVIDEND}),
+    ("Zmiana stanu posiadania akcji", {ESPILabel.SHAREHOLDING_CHANGE}),
+    ("Informacja", set()),
+])
+def test_classify_labels(title, labels):
+    assert set(CLASSIFIER.classify(title)) == labels
+
+
+def test_batch_matches_single_titles():
+    titles = fixture_titles() + ["", "Korekta raportu okresowego", "Emisja obligacji serii B"]
+    assert CLASSIFIER.classify_many(titles) == [CLASSIFIER.classify(title) for title in titles]
+
+
+def test_labels_are_stored_once_and_read_back():
+    announcements = [{"title": "Raport okresowy kwartalny 1/2025 QSr", "url": "/a"},
+                     {"title": "Zbycie akcji", "url": "/b", "labels": ["contract"]}]
+
+    label_announcements(announcements)
+
+    assert announcements[0]["labels"] == ["periodic_report", "quarterly_report", "consolidated"]
+    # Labels stored earlier are kept, not classified again
+    assert espi_type_of(announcements[1]) == ESPIType.GENERAL
+    record = ESPIRecord.from_dict(announcements[0])
+    assert espi_type_of(record) == ESPIType.RESULTS
+    assert record.labels is ESPIRecord.from_dict(dict(announcements[0])).labels
+    assert espi_type_of({"title": "Zawiadomienia w trybie art. 19 ust. 1 rozporządzenia MAR"}) == ESPIType.SHARES
@@ -1,23 +1,26 @@
 import sys
 from pathlib import Path
 
+import asyncio
+import subprocess
+
 import pytest
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 from unittest.mock import AsyncMock, MagicMock, patch
-from cogs.espi_tracker import ESPITracker
+from cogs.espi_tracker import ESPITracker, SearchFlags
+from utils.history import RetentionPolicy
+from utils.metrics import Metrics
+from utils.prices import PriceService, StaticPriceSource
 
 
 @pytest.mark.asyncio
-async def test_add_company_success(monkeypatch):
-    monkeypatch.setattr("cogs.espi_tracker.ESPITracker.load_json", lambda self, file: {})
-    tracker = ESPITracker(bot=MagicMock())
+async def test_add_company_success(tracker):
     ctx = AsyncMock()
     ctx.channel.name = "⌊🌍⌉-czat-polska"
     ctx.send = AsyncMock()
-    monkeypatch.setattr("cogs.espi_tracker.get_company_name", lambda url: "Test Corp")
-    monkeypatch.setattr("cogs.espi_tracker.get_espi_announcements", lambda url: [])
+    tracker.fetcher.get_company_name = AsyncMock(return_value="Test Corp")
+    tracker.fetcher.get_espi_announcements = AsyncMock(return_value=[])
     tracker.get_company_emoji = MagicMock(return_value="🚀")
-    tracker.save_json = MagicMock()
 
     msg = AsyncMock()
     msg.content = "Test Corp 🚀"
@@ -30,12 +33,40 @@ async def test_add_company_success(monkeypatch):
     assert "42" in tracker.pinned_stocks
     assert tracker.pinned_stocks["42"]["name"] == "Test Corp"
     assert tracker.pinned_stocks["42"]["emoji"] == "🚀"
+    assert tracker.pinned_stocks["42"]["messages"] == [{"id": 123, "channel": ctx.channel.id, "pinned": True}]
+    assert tracker.subscriptions.subscribers("42") == {ctx.channel.id}
     msg.pin.assert_called_once()
-    tracker.check_espi.cancel()
 
 @pytest.mark.asyncio
-async def test_remove_company_success(monkeypatch):
-    tracker = ESPITracker(bot=MagicMock())
+async def test_tick_during_add_does_not_see_a_company_without_history(tracker):
+    ctx = AsyncMock()
+    ctx.send.return_value = AsyncMock(id=1)
+    fetched = asyncio.Event()
+    release = asyncio.Event()
+
+    async def get_espi_announcements(url):
+        fetched.set()
+        await release.wait()
+        return [{"title": "Old", "url": "/old"}]
+
+    tracker.fetcher.get_company_name = AsyncMock(return_value="Test Corp")
+    tracker.fetcher.get_espi_announcements = get_espi_announcements
+    tracker.fetcher.inform_new_espies = AsyncMock(return_value=[])
+    tracker.get_company_emoji = MagicMock(return_value="🚀")
+    tracker.metrics = Metrics()
+
+    adding = asyncio.create_task(tracker._add_company_to_dict(ctx, "42"))
+    await fetched.wait()
+    await tracker.check_espi()
+    release.set()
+    await adding
+
+    assert tracker.metrics.counter("company_errors_total", company="42") == 0
+    assert [a.url for a in tracker.espi_history["42"]] == ["/old"]
+
+
+@pytest.mark.asyncio
+async def test_remove_company_success(tracker):
     ctx = AsyncMock()
     ctx.channel.name = "⌊🌍⌉-czat-polska"
     ctx.guild = MagicMock()
@@ -51,7 +82,6 @@ async def test_remove_company_success(monkeypatch):
         "messages": [{"id": 123, "content": "msg", "pinned": True}]
     }
     tracker.espi_history["42"] = [{"title": "Example"}]
-    tracker.save_json = MagicMock()
 
     # Mock message fetch/unpin
     msg = AsyncMock()
@@ -64,4 +94,307 @@ async def test_remove_company_success(monkeypatch):
     assert "42" not in tracker.espi_history
     msg.unpin.assert_called_once()
     ctx.send.assert_called_with("Stopped tracking ESPI announcements for **Test Corp**.")
-    tracker.check_espi.cancel()
+
+
+@pytest.mark.asyncio
+async def test_check_espi_checks_companies_concurrently(tracker):
+    channel = MagicMock()
+    channel.name = "⌊🌍⌉-czat-polska"
+    channel.send = AsyncMock(return_value=MagicMock(content="msg", id=1))
+    tracker.bot.get_all_channels.return_value = [channel]
+
+    for number in ("1", "2", "3"):
+        tracker.pinned_stocks[number] = {"name": f"Corp {number}", "emoji": "🚀", "url": number, "messages": []}
+        tracker.espi_history[number] = []
+
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_inform(url, company_espi_history, seen=None, cutoff=None):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return [{"title": f"Report {url}", "url": f"/{url}"}]
+
+    tracker.fetcher.inform_new_espies = fake_inform
+    tracker.fetcher.handle_new_espi = AsyncMock(return_value="text")
+
+    await tracker.check_espi()
+    await tracker.delivery.join()
+
+    assert max_in_flight == 3
+    assert channel.send.await_count == 3
+    assert [(a.title, a.url) for a in tracker.espi_history["2"]] == [("Report 2", "/2")]
+    tracker.storage.flush.assert_called_once()
+    assert tracker.storage.append_announcement.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_feed_mode_routes_rows_to_tracked_companies(tracker):
+    tracker.feed_mode = True
+    channel = MagicMock()
+    channel.name = "⌊🌍⌉-czat-polska"
+    channel.send = AsyncMock(return_value=MagicMock(content="msg", id=1))
+    tracker.bot.get_all_channels.return_value = [channel]
+
+    old = {"title": "Old", "url": "/old"}
+    tracker.pinned_stocks["1"] = {"name": "Corp 1", "emoji": "🚀", "url": "1", "messages": []}
+    tracker.espi_history["1"] = [old]
+    tracker.last_feed_urls = {"/old"}
+
+    new = {"title": "New", "url": "/new"}
+    tracker.fetcher.get_espi_feed = AsyncMock(return_value=[("1", new), ("1", old), ("2", {"title": "Other", "url": "/other"})])
+    tracker.fetcher.inform_new_espies = AsyncMock()
+    tracker.fetcher.handle_new_espi = AsyncMock(return_value="text")
+
+    await tracker.check_espi()
+    await tracker.delivery.join()
+
+    tracker.fetcher.get_espi_feed.assert_awaited_once()
+    tracker.fetcher.inform_new_espies.assert_not_awaited()
+    assert [a.get("url") for a in tracker.espi_history["1"]] == ["/old", "/new"]
+    assert channel.send.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_feed_mode_catches_up_on_company_pages_after_gap(tracker):
+    tracker.feed_mode = True
+    channel = MagicMock()
+    channel.name = "⌊🌍⌉-czat-polska"
+    tracker.bot.get_all_channels.return_value = [channel]
+
+    tracker.pinned_stocks["1"] = {"name": "Corp 1", "emoji": "🚀", "url": "1", "messages": []}
+    tracker.espi_history["1"] = []
+    tracker.fetcher.get_espi_feed = AsyncMock(return_value=[("1", {"title": "New", "url": "/new"})])
+    tracker.fetcher.inform_new_espies = AsyncMock(return_value=[])
+
+    await tracker.check_espi()
+
+    tracker.fetcher.inform_new_espies.assert_awaited_once()
+    assert tracker.last_feed_urls == {"/new"}
+
+
+@pytest.mark.asyncio
+async def test_get_company_emoji_does_not_wait_for_llm(tracker):
+    tracker.emoji_cache = MagicMock()
+    tracker.emoji_cache.get.return_value = None
+    tracker.emoji_cache.fetch = AsyncMock(return_value="🎮")
+    tracker.pinned_stocks["42"] = {"name": "Test Corp", "emoji": "🏢", "url": "u", "messages": []}
+
+    assert tracker.get_company_emoji("42", "Test Corp") == "🏢"
+    assert len(tracker.background_tasks) == 1
+    await asyncio.sleep(0)
+
+    assert tracker.pinned_stocks["42"]["emoji"] == "🎮"
+    tracker.storage.update_company.assert_called_once()
+    await asyncio.sleep(0)
+    assert not tracker.background_tasks
+
+
+def test_importing_the_cog_does_not_load_pdf_or_llm_packages():
+    # A fresh interpreter, the test session itself may already have imported them
+    code = ("import sys, cogs.espi_tracker; "
+            "print([m for m in ('camelot', 'numpy', 'pandas', 'matplotlib', 'openai', 'yfinance') if m in sys.modules])")
+    root = Path(__file__).resolve().parent.parent.parent
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == "[]"
+
+
+def test_decoders_are_loaded_on_first_use(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    loaded = []
+    monkeypatch.setattr("cogs.espi_tracker.ESPITracker.load_json", lambda self, file: loaded.append(file) or {})
+    monkeypatch.setattr("cogs.espi_tracker.create_storage", lambda backend: MagicMock(load=lambda: ({}, {})))
+    tracker = ESPITracker(bot=MagicMock())
+    assert loaded == []
+
+    assert tracker.name_to_id == {}
+    assert len(loaded) == 5
+
+
+@pytest.mark.asyncio
+async def test_check_espi_only_polls_companies_that_are_due(tracker):
+    channel = MagicMock()
+    channel.name = "⌊🌍⌉-czat-polska"
+    tracker.bot.get_all_channels.return_value = [channel]
+    for number in ("1", "2"):
+        tracker.pinned_stocks[number] = {"name": f"Corp {number}", "emoji": "🚀", "url": number, "messages": []}
+        tracker.espi_history[number] = []
+    tracker.fetcher.inform_new_espies = AsyncMock(return_value=[])
+
+    await tracker.check_espi()
+    await tracker.check_espi()
+    assert tracker.fetcher.inform_new_espies.await_count == 2
+
+    tracker.scheduler.schedule("2", 0)
+    await tracker.check_espi()
+    assert tracker.fetcher.inform_new_espies.await_args.args[0] == "2"
+    assert tracker.fetcher.inform_new_espies.await_count == 3
+
+
+def make_channel(channel_id):
+    channel = MagicMock(id=channel_id)
+    channel.guild.id = 1
+    channel.send = AsyncMock(return_value=MagicMock(id=channel_id * 10))
+    return channel
+
+
+@pytest.mark.asyncio
+async def test_company_watched_by_many_channels_is_fetched_once(tracker):
+    tracker.pinned_stocks["42"] = {"name": "Test Corp", "emoji": "🚀", "url": "42", "messages": []}
+    tracker.espi_history["42"] = []
+    channels = [make_channel(10), make_channel(20)]
+    for channel in channels:
+        tracker.subscriptions.subscribe(channel, "42")
+    tracker.fetcher.inform_new_espies = AsyncMock(return_value=[{"title": "Raport", "url": "/a"}])
+    tracker.fetcher.handle_new_espi = AsyncMock(return_value="text")
+
+    await tracker.check_espi()
+    await tracker.delivery.join()
+
+    tracker.fetcher.inform_new_espies.assert_awaited_once()
+    tracker.fetcher.handle_new_espi.assert_awaited_once()
+    for channel in channels:
+        channel.send.assert_awaited_once()
+    tracker.bot.get_all_channels.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_pdf_jobs_are_parsed_after_startup(tracker):
+    tracker.pdf_pipeline.process_article = AsyncMock(return_value=[{"position": "Prezes", "transaction_mode": "purchase"}])
+    message = MagicMock()
+    message.reply = AsyncMock()
+
+    await tracker.cog_load()
+    assert tracker.pdf_pipeline.submit("/mar", message)
+    await asyncio.wait_for(tracker.pdf_pipeline.queue.join(), 5)
+
+    message.reply.assert_awaited_once_with("🧾 Prezes · 🟢 nabycie")
+
+
+@pytest.mark.asyncio
+async def test_prices_refresh_after_startup(tracker):
+    tracker.prices = PriceService(StaticPriceSource({"TST": (50.5, 50.0)}), interval=60)
+    tracker.ticker_to_id = {"TST": "42"}
+    tracker.pinned_stocks["42"] = {"name": "Test Corp", "emoji": "🚀", "url": "42", "messages": []}
+
+    await tracker.cog_load()
+    await asyncio.wait_for(wait_until(lambda: tracker.prices.quote("42") is not None), 5)
+
+    assert tracker.prices.price_line("42") == "50.50 zł ▲ 1.00%"
+
+
+async def wait_until(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_messages_show_the_cached_price_without_fetching_it(tracker):
+    source = StaticPriceSource({"TST": (50.5, 50.0)})
+    tracker.prices = PriceService(source, {"TST": "42"})
+    await tracker.prices.refresh(["42"])
+    tracker.pinned_stocks["42"] = {"name": "Test Corp", "emoji": "🚀", "url": "42", "messages": []}
+    tracker.espi_history["42"] = []
+    channel = make_channel(10)
+    tracker.subscriptions.subscribe(channel, "42")
+    tracker.fetcher.inform_new_espies = AsyncMock(return_value=[{"title": "Raport", "url": "/a"}, {"title": "Raport 2", "url": "/b"}])
+    tracker.fetcher.handle_new_espi = AsyncMock(return_value="text")
+
+    await tracker.check_espi()
+    await tracker.delivery.join()
+
+    assert channel.send.await_args.kwargs["embed"].title == "📢 Test Corp 🚀 · 50.50 zł ▲ 1.00%"
+    assert source.requests == 1
+
+
+def test_retention_deletes_dropped_rows_from_the_store(tracker):
+    tracker.retention = RetentionPolicy(max_entries=2)
+    tracker.espi_history["42"] = [{"date": f"2025-01-{day:02d}", "time": "09:00", "title": "Raport", "url": f"/{day}"}
+                                  for day in (3, 2, 1)]
+
+    tracker._apply_retention("42")
+
+    tracker.storage.prune_history.assert_called_once_with("42", tracker.espi_history["42"])
+    assert [a["url"] for a in tracker.espi_history["42"]] == ["/3", "/2"]
+
+
+def test_missing_legacy_channel_is_looked_up_again_only_after_the_retry_interval(tracker, capsys):
+    tracker.pinned_stocks["42"] = {"name": "Test Corp", "emoji": "🚀", "url": "42", "messages": []}
+    tracker.bot.get_all_channels.return_value = []
+
+    with patch("cogs.espi_tracker.time.monotonic", return_value=1000.0):
+        tracker._adopt_legacy_companies()
+        tracker._adopt_legacy_companies()
+    assert tracker.bot.get_all_channels.call_count == 1
+    assert capsys.readouterr().out.count("not found") == 1
+
+    channel = make_channel(10)
+    channel.name = "⌊🌍⌉-czat-polska"
+    tracker.bot.get_all_channels.return_value = [channel]
+    with patch("cogs.espi_tracker.time.monotonic", return_value=1000.0 + 10 * 60):
+        tracker._adopt_legacy_companies()
+    assert tracker.subscriptions.subscribers("42") == {10}
+    assert "not found" not in capsys.readouterr().out
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("command,args", [("add", ["11 bit"]), ("remove", ["11 bit"]), ("results", ["11 bit"]),
+                                          ("search", ["akcji"]), ("compare", ["revenue"])])
+async def test_commands_defer_before_doing_io(tracker, command, args):
+    order = []
+    ctx = AsyncMock()
+    ctx.defer = AsyncMock(side_effect=lambda: order.append("defer"))
+    ctx.send = AsyncMock(side_effect=lambda *a, **k: order.append("send"))
+    tracker._add_company_to_dict = AsyncMock(side_effect=lambda *a: order.append("add"))
+    tracker._remove_stock = AsyncMock(side_effect=lambda *a: order.append("remove"))
+
+    if command == "search":
+        await tracker.search.callback(tracker, ctx, flags=await SearchFlags.convert(ctx, *args))
+    else:
+        await getattr(tracker, command).callback(tracker, ctx, *args)
+
+    assert order[0] == "defer" and len(order) > 1
+
+
+@pytest.mark.asyncio
+async def test_search_takes_a_multi_word_prefix_query(tracker):
+    tracker.resolver = MagicMock(resolve=lambda text: {"CDR": "1"}[text], label=lambda number: f"Corp {number}")
+    tracker.search_index.add("1", {"title": "Zbycie akcji przez członka zarządu", "url": "/a", "date": "2025-03-28"})
+    tracker.search_index.add("2", {"title": "Zbycie akcji przez prezesa", "url": "/b", "date": "2025-03-28"})
+    ctx = AsyncMock()
+
+    flags = await SearchFlags.convert(ctx, "zbycie akcji company: CDR since: 2025-01-01")
+    await tracker.search.callback(tracker, ctx, flags=flags)
+
+    assert flags.terms == "zbycie akcji"
+    text = ctx.send.await_args.args[0]
+    assert "**Corp 1**" in text and "Corp 2" not in text
+
+
+@pytest.mark.asyncio
+async def test_remove_keeps_company_tracked_for_other_channels(tracker):
+    channels = [make_channel(10), make_channel(20)]
+    tracker.pinned_stocks["42"] = {"name": "Test Corp", "emoji": "🚀", "url": "42", "messages": [
+        {"id": 100, "channel": 10, "pinned": True}, {"id": 200, "channel": 20, "pinned": True}]}
+    tracker.espi_history["42"] = []
+    for channel in channels:
+        tracker.subscriptions.subscribe(channel, "42")
+    ctx = MagicMock(channel=channels[0])
+    ctx.send = AsyncMock()
+    channels[0].fetch_message = AsyncMock(return_value=AsyncMock())
+
+    await tracker._remove_stock(ctx, "42")
+
+    channels[0].fetch_message.assert_awaited_once_with(100)
+    assert tracker.subscriptions.subscribers("42") == {20}
+    assert "42" in tracker.pinned_stocks
+    tracker.storage.remove_subscription.assert_called_once_with(10, "42")
+
+    # Deleting the last subscribed channel stops tracking the company
+    await tracker.on_guild_channel_delete(channels[1])
+    assert "42" not in tracker.pinned_stocks
+    tracker.storage.remove_company.assert_called_once_with("42")
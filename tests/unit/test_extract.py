@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from utils.extract import (extract_announcement_rows, extract_article_paragraphs, extract_company_name, extract_table_rows,
+                           iter_announcement_rows)
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "fixtures" / "pap"
+
+
+def read_fixture(name):
+    return (FIXTURES_DIR / name).read_text(encoding="utf-8")
+
+
+def test_extract_announcement_rows_from_listing():
+    rows = extract_announcement_rows(read_fixture("listing.html"))
+
+    assert len(rows) == 100
+    announcement, company_link, company_name = rows[0]
+    assert announcement == {
+        "date": "2025-03-28",
+        "time": "17:00",
+        "company": "11 bit studios SA",
+        "title": "Raport bieżący nr 100/2025 Zawiadomienia w trybie art. 19 ust. 1 rozporządzenia MAR",
+        "url": "/wiadomosci/firmy/11-bit-studios-sa-100-2025",
+    }
+    assert company_link == "/espi/espi/2025?company=1&selectCompany=1"
+    assert company_name == "11 bit studios SA"
+
+
+def test_iter_announcement_rows_matches_full_parse():
+    for name in ("listing.html", "feed.html"):
+        html = read_fixture(name)
+        assert list(iter_announcement_rows(html)) == extract_announcement_rows(html)
+
+
+def test_extract_company_name_from_listing():
+    assert extract_company_name(read_fixture("listing.html")) == "11 bit studios SA"
+    assert extract_company_name("<html><body>No table</body></html>") is None
+
+
+def test_extract_table_rows_from_results():
+    rows = extract_table_rows(read_fixture("results.html"))
+
+    assert rows[0] == ["", "w tys. zł", "", "w tys. EUR", ""]
+    assert rows[2][0] == "Przychody netto ze sprzedaży"
+
+
+def test_extract_article_paragraphs_skips_page_chrome():
+    paragraphs = extract_article_paragraphs(read_fixture("article.html"))
+
+    assert paragraphs[0] == "Raport bieżący z plikiem 12/2025"
+    assert paragraphs[-1] == "Copyright PAP"
+    assert len(paragraphs) == 12
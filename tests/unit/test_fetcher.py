@@ -0,0 +1,160 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from utils.fetcher import ESPIFetcher
+from utils.http_cache import ResponseCache
+from utils.metrics import Metrics
+
+LISTING_HTML = """
+<table><tbody>
+<tr><td>2025-01-02</td><td>10:00</td><td><a href="/c">Test Corp SA</a></td><td><a href="/espi/1">Raport bieżący</a></td></tr>
+<tr><td>2025-01-01</td><td>09:00</td><td><a href="/c">Test Corp SA</a></td><td><a href="/espi/2">Zbycie akcji</a></td></tr>
+</tbody></table>
+"""
+
+
+async def start_server(handler):
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+@pytest.mark.asyncio
+async def test_fetcher_respects_concurrency_limit():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def handler(request):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        return web.Response(text=LISTING_HTML, content_type="text/html")
+
+    runner, base = await start_server(handler)
+    fetcher = ESPIFetcher(max_concurrency=2, cache=ResponseCache())
+    try:
+        results = await asyncio.gather(*(fetcher.get_espi_announcements(f"{base}/{i}") for i in range(6)))
+    finally:
+        await fetcher.close()
+        await runner.cleanup()
+
+    assert max_in_flight == 2
+    assert all(len(announcements) == 2 for announcements in results)
+    assert results[0][0]["url"] == "/espi/1"
+
+
+@pytest.mark.asyncio
+async def test_fetcher_returns_none_on_http_error():
+    async def handler(request):
+        return web.Response(status=500)
+
+    runner, base = await start_server(handler)
+    fetcher = ESPIFetcher(cache=ResponseCache())
+    try:
+        assert await fetcher.get_company_name(f"{base}/x") is None
+        assert await fetcher.get_espi_announcements(f"{base}/x") == []
+    finally:
+        await fetcher.close()
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_fetch_if_changed_short_circuits_unchanged_pages():
+    seen_etags = []
+
+    async def handler(request):
+        seen_etags.append(request.headers.get("If-None-Match"))
+        if request.path == "/etag":
+            if request.headers.get("If-None-Match") == '"v1"':
+                return web.Response(status=304)
+            return web.Response(text=LISTING_HTML, content_type="text/html", headers={"ETag": '"v1"'})
+        # No validators, only the table is stable between responses
+        return web.Response(text=f"<p>{len(seen_etags)}</p>{LISTING_HTML}", content_type="text/html")
+
+    runner, base = await start_server(handler)
+    fetcher = ESPIFetcher(cache=ResponseCache())
+    try:
+        first = await fetcher.inform_new_espies(f"{base}/etag", [])
+        second = await fetcher.inform_new_espies(f"{base}/etag", [])
+        await fetcher.inform_new_espies(f"{base}/plain", [])
+        fourth = await fetcher.inform_new_espies(f"{base}/plain", [])
+        fetcher.invalidate(f"{base}/plain")
+        fifth = await fetcher.inform_new_espies(f"{base}/plain", [])
+    finally:
+        await fetcher.close()
+        await runner.cleanup()
+
+    assert len(first) == 2
+    assert second == [] and fourth == []
+    assert len(fifth) == 2
+    assert seen_etags[1] == '"v1"'
+    assert fetcher.stats == {"conditional_requests": 5, "not_modified": 1, "unchanged": 1, "changed": 3}
+
+
+@pytest.mark.asyncio
+async def test_fetcher_downloads_and_parses_each_page_once():
+    requests_seen = []
+
+    async def handler(request):
+        requests_seen.append(request.path)
+        await asyncio.sleep(0.01)
+        return web.Response(text=LISTING_HTML, content_type="text/html")
+
+    runner, base = await start_server(handler)
+    fetcher = ESPIFetcher(cache=ResponseCache())
+    try:
+        name, first, second = await asyncio.gather(
+            fetcher.get_company_name(f"{base}/listing"),
+            fetcher.get_espi_announcements(f"{base}/listing"),
+            fetcher.get_espi_announcements(f"{base}/listing"),
+        )
+        third = await fetcher.get_espi_announcements(f"{base}/listing")
+    finally:
+        await fetcher.close()
+        await runner.cleanup()
+
+    assert requests_seen == ["/listing"]
+    assert name == "Test Corp SA"
+    assert first is second is third
+
+
+@pytest.mark.asyncio
+async def test_inform_new_espies_diffs_incrementally_between_full_scans():
+    newer = '<tr><td>2025-01-03</td><td>08:00</td><td><a href="/c">Test Corp SA</a></td><td><a href="/espi/3">Raport</a></td></tr>'
+    pages = [LISTING_HTML, LISTING_HTML.replace("<tbody>", "<tbody>" + newer)]
+
+    async def handler(request):
+        return web.Response(text=pages[0], content_type="text/html")
+
+    runner, base = await start_server(handler)
+    metrics = Metrics()
+    fetcher = ESPIFetcher(cache=ResponseCache(max_entries=0), metrics=metrics, full_scan_interval=3600)
+    url = f"{base}/listing"
+    history = [{"date": "2025-01-01", "time": "09:00", "title": "Zbycie akcji", "url": "/espi/2"}]
+    try:
+        first = await fetcher.inform_new_espies(url, history)
+        history.append(first[0])
+        pages.pop(0)
+        second = await fetcher.inform_new_espies(url, history)
+        fetcher.invalidate(url)
+        third = await fetcher.inform_new_espies(url, history)
+    finally:
+        await fetcher.close()
+        await runner.cleanup()
+
+    assert [a["url"] for a in first] == ["/espi/1"]
+    assert [a["url"] for a in second] == ["/espi/3"]
+    assert [a["url"] for a in third] == ["/espi/3"]
+    assert metrics.series("listing_scans_total", "mode") == {"full": 2, "incremental": 1}
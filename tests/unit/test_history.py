@@ -0,0 +1,65 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from utils.history import ESPIRecord, RetentionPolicy, apply_retention, compact_messages, history_cutoff
+from utils.utils import filter_new_espies
+
+
+def make_history(days):
+    return [ESPIRecord(f"2025-01-{day:02d}", "09:00", "Test Corp", f"Raport {day}", f"/{day}") for day in days]
+
+
+def test_espi_record_is_slotted_and_interned():
+    a = ESPIRecord.from_dict({"date": "2025-01-01", "time": "09:00", "company": "Test " + "Corp", "title": "x", "url": "/x"})
+    b = ESPIRecord.from_dict({"date": "2025-01-01", "time": "09:00", "company": "".join(["Test", " Corp"]), "title": "y", "url": "/y"})
+
+    assert not hasattr(a, "__dict__")
+    assert a.company is b.company
+    assert a.to_dict()["url"] == "/x"
+
+
+def test_apply_retention_keeps_newest_entries_in_order():
+    history = make_history([3, 1, 4, 2])
+
+    retained = apply_retention(history, RetentionPolicy(max_entries=2))
+
+    assert [r.url for r in retained] == ["/3", "/4"]
+    assert apply_retention(history, RetentionPolicy()) is history
+
+
+def test_apply_retention_by_age_keeps_at_least_newest_entry():
+    history = make_history([1, 2])
+
+    retained = apply_retention(history, RetentionPolicy(max_days=5), now=datetime(2025, 3, 1))
+
+    assert [r.url for r in retained] == ["/2"]
+
+
+def test_cutoff_hides_rows_dropped_by_retention():
+    retained = make_history([3, 4])
+    listing = [r.to_dict() for r in make_history([5, 4, 3, 2, 1])]
+
+    new_espies = filter_new_espies(listing, retained, cutoff=history_cutoff(retained))
+
+    assert [a["url"] for a in new_espies] == ["/5"]
+
+
+def test_retention_keeps_rows_tied_with_the_oldest_kept_one():
+    history = [ESPIRecord("2025-01-02", "17:00", "Test Corp", f"Raport {url}", url) for url in ("/a", "/b")]
+    history.insert(0, ESPIRecord("2025-01-03", "09:00", "Test Corp", "Raport /c", "/c"))
+
+    retained = apply_retention(history, RetentionPolicy(max_entries=2))
+    listing = [r.to_dict() for r in history]
+
+    assert [r.url for r in retained] == ["/c", "/a", "/b"]
+    assert filter_new_espies(listing, retained, cutoff=history_cutoff(retained)) == []
+
+
+def test_compact_messages_keeps_only_pinned_ids():
+    pinned_stocks = {"1": {"messages": [{"content": "a", "id": 1, "pinned": True}, {"content": "b", "id": 2, "pinned": False}]}}
+
+    compact_messages(pinned_stocks)
+
+    assert pinned_stocks["1"]["messages"] == [{"id": 1, "pinned": True}]
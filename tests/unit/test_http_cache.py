@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from utils.http_cache import MISSING, ResponseCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    cache.get("a")
+    cache.set("c", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+
+
+def test_size_bound_and_ttl():
+    cache = ResponseCache(max_bytes=5)
+    cache.set("a", "AAA")
+    cache.set("b", "BBB")
+    assert len(cache) == 1
+
+    assert cache.get("b", ttl=0) is None
+    assert cache.get("b", ttl=60) == "BBB"
+
+
+def test_parsed_results_are_dropped_with_new_body():
+    cache = ResponseCache()
+    cache.set("a", "A")
+    cache.set_parsed("a", "parser", [1])
+    assert cache.get_parsed("a", "parser") == [1]
+
+    cache.set("a", "A2")
+    assert cache.get_parsed("a", "parser") is MISSING
+
+
+def test_disk_layer_survives_restart(tmp_path):
+    ResponseCache(cache_dir=tmp_path).set("https://example.com/a", "A")
+
+    cache = ResponseCache(cache_dir=tmp_path, ttl=60)
+    assert cache.get("https://example.com/a") == "A"
+
+    path = next(tmp_path.iterdir())
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert ResponseCache(cache_dir=tmp_path, ttl=60).get("https://example.com/a") is None
+
+
+def test_disk_body_larger_than_the_memory_bound_is_returned(tmp_path):
+    ResponseCache(cache_dir=tmp_path).set("https://example.com/a", "A" * 100)
+
+    cache = ResponseCache(max_bytes=10, cache_dir=tmp_path, ttl=60)
+    assert cache.get("https://example.com/a") == "A" * 100
+    assert len(cache) == 0
+
+
+def test_parsed_lookups_count_hits_and_misses():
+    cache = ResponseCache()
+    assert cache.get_parsed("a", "parser") is MISSING
+    cache.set("a", "A")
+    cache.set_parsed("a", "parser", [1])
+    cache.get_parsed("a", "parser")
+
+    assert (cache.hits, cache.misses) == (1, 1)
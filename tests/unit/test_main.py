@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+import asyncio
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from unittest.mock import AsyncMock, MagicMock
+import main
+
+
+def test_cog_is_added_on_the_loop_the_bot_runs_on(monkeypatch):
+    loops = {}
+
+    async def add_cog(cog):
+        loops["cog"] = asyncio.get_running_loop()
+
+    async def start(token):
+        loops["bot"] = asyncio.get_running_loop()
+
+    monkeypatch.setattr(main, "ESPITracker", MagicMock())
+    monkeypatch.setattr(main.bot, "add_cog", add_cog)
+    monkeypatch.setattr(main.bot, "start", start)
+
+    asyncio.run(main.main("token"))
+
+    assert loops["cog"] is loops["bot"]
+
+
+def test_slash_commands_are_synced_once_in_setup_hook(monkeypatch):
+    sync = AsyncMock(return_value=[])
+    monkeypatch.setattr(main.bot.tree, "sync", sync)
+
+    asyncio.run(main.bot.setup_hook())
+
+    sync.assert_awaited_once()
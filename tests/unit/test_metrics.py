@@ -0,0 +1,90 @@
+import sys
+from pathlib import Path
+
+import aiohttp
+import pytest
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from unittest.mock import AsyncMock, MagicMock
+from utils.metrics import Histogram, Metrics, MetricsServer, format_stats
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram(buckets=(0.1, 1, 10))
+    for value in (0.05, 0.05, 0.5, 5, 50):
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.quantile(0.4) == 0.1
+    assert histogram.quantile(0.6) == 1
+    assert histogram.quantile(1) == 10
+    assert histogram.mean == pytest.approx(11.12)
+
+
+def test_render_uses_prometheus_text_format():
+    metrics = Metrics()
+    metrics.inc("company_errors_total", company="42")
+    metrics.inc("company_errors_total", company="42")
+    metrics.observe("fetch_seconds", 0.2, endpoint="listing")
+    metrics.gauge("delivery_queue_depth", lambda: 3)
+
+    text = metrics.render()
+
+    assert '# TYPE espi_company_errors_total counter\nespi_company_errors_total{company="42"} 2' in text
+    assert 'espi_fetch_seconds_bucket{endpoint="listing",le="0.1"} 0' in text
+    assert 'espi_fetch_seconds_bucket{endpoint="listing",le="0.25"} 1' in text
+    assert 'espi_fetch_seconds_count{endpoint="listing"} 1' in text
+    assert "# TYPE espi_delivery_queue_depth gauge\nespi_delivery_queue_depth 3" in text
+
+
+@pytest.mark.asyncio
+async def test_metrics_server_serves_the_registry():
+    metrics = Metrics()
+    metrics.inc("messages_sent_total")
+    server = MetricsServer(metrics, port=0)
+    await server.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{server.port}/metrics") as response:
+                assert response.status == 200
+                assert "espi_messages_sent_total 1" in await response.text()
+    finally:
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_metrics_are_served_after_startup(tracker):
+    tracker.metrics_server = MetricsServer(tracker.metrics, port=0)
+
+    await tracker.cog_load()
+    await tracker.cog_load()
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://127.0.0.1:{tracker.metrics_server.port}/metrics") as response:
+            assert response.status == 200
+            assert "espi_tracked_companies" in await response.text()
+
+
+@pytest.mark.asyncio
+async def test_stats_command_reports_errors_per_company(tracker):
+    tracker.metrics = Metrics()
+    tracker._register_gauges()
+    tracker.pinned_stocks["42"] = {"name": "Test Corp", "emoji": "🚀", "url": "/espi?company=42", "messages": []}
+    tracker.espi_history["42"] = []
+    tracker.subscriptions.subscribe(MagicMock(id=10), "42")
+    tracker.fetcher.inform_new_espies = AsyncMock(side_effect=RuntimeError("boom"))
+
+    await tracker.check_espi()
+    ctx = MagicMock()
+    ctx.send = AsyncMock()
+    await tracker.stats.callback(tracker, ctx)
+
+    assert tracker.metrics.counter("company_errors_total", company="42") == 1
+    assert tracker.metrics.histogram("tick_seconds").count == 1
+    text = ctx.send.await_args.args[0]
+    assert "Tick: n=1" in text
+    assert "Errors (1): Test Corp 1" in text
+    assert "tracked_companies: 1" in text
+
+
+def test_format_stats_without_data():
+    assert format_stats(Metrics()) == "No metrics recorded yet."
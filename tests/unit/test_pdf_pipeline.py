@@ -0,0 +1,117 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from utils.fetcher import ESPIFetcher
+from utils.http_cache import ResponseCache
+from utils.pdf_pipeline import PDFPipeline, format_transaction_data
+
+ARTICLE_HTML = """
+<article><p>Zawiadomienie</p>
+<a href="/files/notification.pdf">Zawiadomienie MAR</a>
+<a href="/files/copy.pdf">Kopia</a>
+</article>
+"""
+
+
+def fake_parse(pdf_file):
+    content = Path(pdf_file).read_bytes()
+    if content == b"slow":
+        time.sleep(5)
+    return {"position": "Prezes", "incentive": False, "transaction_mode": "purchase", "size": len(content)}
+
+
+async def handler(request):
+    if request.path == "/article":
+        return web.Response(text=ARTICLE_HTML, content_type="text/html")
+    if request.path == "/files/slow.pdf":
+        return web.Response(body=b"slow")
+    return web.Response(body=b"%PDF-1")
+
+
+async def start_server():
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_parses_attachments_once_per_content(tmp_path):
+    runner, base = await start_server()
+    fetcher = ESPIFetcher(cache=ResponseCache())
+    pipeline = PDFPipeline(fetcher, pdf_dir=tmp_path / "pdf", results_file=tmp_path / "results.json", parse=fake_parse)
+    received = asyncio.Queue()
+
+    async def on_result(context, results):
+        await received.put((context, results))
+
+    pipeline.start(on_result)
+    try:
+        assert pipeline.submit(f"{base}/article", "message")
+        context, results = await asyncio.wait_for(received.get(), 10)
+    finally:
+        await pipeline.close()
+        await fetcher.close()
+        await runner.cleanup()
+
+    assert context == "message"
+    # Both links point to the same content, which is parsed and cached once
+    assert results[0] == results[1]
+    assert len(pipeline.results) == 1
+    assert not list((tmp_path / "pdf").iterdir())
+
+
+@pytest.mark.asyncio
+async def test_pipeline_times_out_slow_documents(tmp_path):
+    runner, base = await start_server()
+    fetcher = ESPIFetcher(cache=ResponseCache())
+    pipeline = PDFPipeline(fetcher, timeout=0.5, pdf_dir=tmp_path, results_file=tmp_path / "results.json", parse=fake_parse)
+    try:
+        assert await pipeline.process_pdf(f"{base}/files/slow.pdf") is None
+        assert (await pipeline.process_pdf(f"{base}/files/notification.pdf"))["size"] == 6
+    finally:
+        await pipeline.close()
+        await fetcher.close()
+        await runner.cleanup()
+
+
+def test_submit_rejects_jobs_when_queue_is_full():
+    pipeline = PDFPipeline(fetcher=None, queue_size=1, results_file="missing.json")
+
+    assert pipeline.submit("a", None)
+    assert not pipeline.submit("b", None)
+
+
+@pytest.mark.asyncio
+async def test_article_submitted_for_many_channels_is_processed_once():
+    pipeline = PDFPipeline(fetcher=None, results_file="missing.json")
+    pipeline.process_article = AsyncMock(return_value=[{"position": "Prezes"}])
+    received = []
+
+    async def on_result(context, results):
+        received.append(context)
+
+    assert pipeline.submit("a", "channel 1")
+    assert pipeline.submit("a", "channel 2")
+    pipeline.start(on_result)
+    await pipeline.queue.join()
+    await pipeline.close()
+
+    pipeline.process_article.assert_awaited_once_with("a")
+    assert received == ["channel 1", "channel 2"]
+
+
+def test_format_transaction_data():
+    assert format_transaction_data({"position": "Prezes", "incentive": True, "transaction_mode": "purchase"}) == \
+        "🧾 Prezes · 🟢 nabycie (program motywacyjny)"
+    assert format_transaction_data({"position": float("nan"), "incentive": None, "transaction_mode": float("nan")}) == ""
@@ -0,0 +1,130 @@
+import sys
+from pathlib import Path
+
+import asyncio
+import json
+
+import pytest
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from utils.metrics import Metrics
+from utils.prices import (PriceService, Quote, StaticPriceSource, YFinanceSource, create_price_source,
+                          format_price, ticker_map)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_format_price_shows_the_intraday_change():
+    assert format_price(Quote(45.2, 44.6)) == "45.20 zł ▲ 1.35%"
+    assert format_price(Quote(1234.5, 1300.0)) == "1 234.50 zł ▼ 5.04%"
+    assert format_price(Quote(10.0, 10.0)) == "10.00 zł ■ 0.00%"
+    assert format_price(Quote(10.0)) == "10.00 zł"
+    assert format_price(None) == ""
+
+
+def test_ticker_map_inverts_the_decoder():
+    assert ticker_map({"CDR": "1", "PKN": "2"}) == {"1": "CDR", "2": "PKN"}
+
+
+@pytest.mark.asyncio
+async def test_refresh_fetches_all_tickers_in_one_request():
+    source = StaticPriceSource({"CDR": (120.0, 100.0), "PKN": (60.0, 60.0)})
+    metrics = Metrics()
+    prices = PriceService(source, {"CDR": "1", "PKN": "2", "XYZ": "3"}, metrics=metrics)
+
+    assert await prices.refresh(["1", "2", "3", "99"]) == 2
+
+    assert source.requests == 1
+    assert prices.quote("1").change == pytest.approx(20.0)
+    assert prices.quote("3") is None
+    assert metrics.counter("price_requests_total") == 1
+
+
+@pytest.mark.asyncio
+async def test_quotes_expire_after_the_ttl():
+    clock = Clock()
+    prices = PriceService(StaticPriceSource({"CDR": (120.0, 100.0)}), {"CDR": "1"}, ttl=60, clock=clock)
+    await prices.refresh(["1"])
+
+    clock.now += 60
+    assert prices.price_line("1") == "120.00 zł ▲ 20.00%"
+    clock.now += 1
+    assert prices.quote("1") is None
+    assert prices.price_line("1") == ""
+
+
+@pytest.mark.asyncio
+async def test_refresh_skips_the_request_without_known_tickers():
+    source = StaticPriceSource({"CDR": (120.0, 100.0)})
+    prices = PriceService(source, {"CDR": "1"})
+
+    assert await prices.refresh(["2"]) == 0
+    assert await PriceService(None, {"CDR": "1"}).refresh(["1"]) == 0
+    assert source.requests == 0
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_survives_source_errors():
+    class FlakySource:
+        def __init__(self):
+            self.calls = 0
+
+        def fetch(self, tickers):
+            self.calls += 1
+            if self.calls == 1:
+                raise ConnectionError("down")
+            return {"CDR": (120.0, 100.0)}
+
+    source = FlakySource()
+    metrics = Metrics()
+    prices = PriceService(source, {"CDR": "1"}, interval=0.01, metrics=metrics)
+
+    prices.start(lambda: {"1": {}})
+    while prices.quote("1") is None:
+        await asyncio.sleep(0.01)
+    await prices.close()
+
+    assert metrics.counter("price_errors_total") == 1
+    assert source.calls >= 2
+
+
+def test_static_source_reads_its_file_on_every_fetch(tmp_path):
+    path = tmp_path / "prices.json"
+    path.write_text(json.dumps({"CDR": [120.0, 100.0]}))
+    source = create_price_source(str(path))
+    assert source.fetch(["CDR", "PKN"]) == {"CDR": (120.0, 100.0)}
+
+    path.write_text(json.dumps({"CDR": [130.0, 100.0]}))
+    assert source.fetch(["CDR"]) == {"CDR": (130.0, 100.0)}
+
+
+def test_create_price_source_by_name():
+    assert isinstance(create_price_source("yfinance"), YFinanceSource)
+    assert create_price_source("off") is None
+    assert create_price_source("") is None
+
+
+def test_refresh_restarts_after_its_loop_was_closed():
+    source = StaticPriceSource({"CDR": (120.0, 100.0)})
+    prices = PriceService(source, {"CDR": "1"}, interval=60)
+
+    async def start():
+        prices.start(lambda: ["1"])
+        await asyncio.sleep(0)
+
+    # Like a setup loop that closes before the bot's own loop runs
+    asyncio.run(start())
+    prices.quotes.clear()
+
+    async def run():
+        prices.start(lambda: ["1"])
+        while prices.quote("1") is None:
+            await asyncio.sleep(0.01)
+        await prices.close()
+
+    asyncio.run(run())
@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from utils.resolver import CompanyResolver, normalize_name
+
+DECODERS_DIR = Path(__file__).resolve().parent.parent.parent / "decoders"
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    return CompanyResolver.from_files(DECODERS_DIR)
+
+
+def test_normalize_name_folds_diacritics_and_legal_form():
+    assert normalize_name("Grupa Kęty SA") == "grupa kety"
+    assert normalize_name("Serinus Energy plc") == "serinus energy"
+    assert normalize_name("AB SA") == "ab"
+
+
+@pytest.mark.parametrize("input_str,expected_id", [
+    ("1", "1"),
+    ("11b", "1"),
+    ("11BIT", "1"),
+    ("11 bit studios SA", "1"),
+    ("11 bit studios", "1"),
+    ("11 bit studio", "1"),
+    ("grupa kety", "274"),
+])
+def test_resolve(resolver, input_str, expected_id):
+    assert resolver.resolve(input_str) == expected_id
+
+
+def test_resolve_unknown_raises(resolver):
+    with pytest.raises(ValueError, match="Unrecognized company identifier"):
+        resolver.resolve("Nonexistent company")
+
+
+def test_resolve_ticker_known_only_through_symbol():
+    resolver = CompanyResolver({"7": "Atal SA"}, {}, {"ATAL": "7"}, ticker_to_symbol={"1AT": "ATAL"})
+
+    assert resolver.resolve("1at") == "7"
+
+
+def test_suggest_matches_word_prefixes_and_tickers(resolver):
+    suggestions = dict(resolver.suggest("bit stu", 5))
+    assert "1" in suggestions
+    assert suggestions["1"] == "11 bit studios SA (11B)"
+
+    assert resolver.suggest("11B", 3)[0][0] == "1"
+    assert len(resolver.suggest("a", 25)) == 25
+    assert resolver.suggest("", 25) == []
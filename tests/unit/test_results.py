@@ -0,0 +1,110 @@
+import sys
+from pathlib import Path
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from utils.results import (ResultsStore, format_compare, format_results, normalize_period, parse_number,
+                           parse_results_page, parse_results_table, resolve_metric)
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "fixtures" / "pap"
+REPORT = {"date": "2024-09-30", "time": "18:00", "title": "Raport okresowy półroczny za 2024 PSr", "url": "/a"}
+
+
+def results_rows():
+    return parse_results_page((FIXTURES_DIR / "results.html").read_text(encoding="utf-8"))
+
+
+def test_parse_results_page_normalizes_saved_table():
+    rows = results_rows()
+
+    assert rows[0] == {"metric": "revenue", "label": "Przychody netto ze sprzedaży", "period": "2024H1",
+                       "period_end": 202406, "value": 340_563_000.0, "currency": "PLN"}
+    assert {row["currency"] for row in rows if row["metric"] == "net_profit"} == {"PLN", "EUR"}
+    # Share counts are not in thousands of złoty
+    assert [row["value"] for row in rows if row["metric"] == "shares"][:2] == [455_710.0, 439_485.0]
+    assert {row["currency"] for row in rows if row["metric"] == "shares"} == {None}
+
+
+def test_parse_results_table_reads_bare_year_headers():
+    rows = parse_results_table([["", "w mln zł", ""], ["", "2024", "2023"], ["Zysk (strata) netto", "(1,5)", "2 024"]])
+
+    assert [(row["period"], row["value"]) for row in rows] == [("2024", -1_500_000.0), ("2023", 2_024_000_000.0)]
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("półrocze / 2024", ("2024H1", 202406)),
+    ("3 kwartały / 2023", ("2023Q1-3", 202309)),
+    ("I kwartał / 2025", ("2025Q1", 202503)),
+    ("rok / 2024", ("2024", 202412)),
+    ("WYBRANE DANE FINANSOWE", (None, None)),
+])
+def test_normalize_period(text, expected):
+    assert normalize_period(text) == expected
+
+
+def test_parse_number_and_metric_names():
+    assert parse_number("1\xa0234,5") == 1234.5
+    assert parse_number("-") is None
+    assert resolve_metric("Zysk netto") == resolve_metric("net_profit") == "net_profit"
+
+
+def test_store_replaces_report_and_compares_latest(tmp_path):
+    store = ResultsStore(tmp_path / "results.parquet")
+    rows = results_rows()
+
+    store.add("1", REPORT, rows)
+    store.add("1", REPORT, rows)
+    other = [dict(row, value=row["value"] * 2) for row in rows]
+    store.add("2", {**REPORT, "url": "/b"}, other)
+
+    assert len(store) == 2 * len(rows)
+    latest = store.company("1").set_index("metric")
+    assert latest.loc["revenue", "value"] == 340_563_000.0
+    assert latest.loc["revenue", "previous"] == 159_176_000.0
+    assert round(latest.loc["revenue", "change"], 2) == 1.14
+    ranking = store.compare("revenue")
+    assert list(ranking["company"]) == ["2", "1"]
+    assert list(store.compare("revenue", ["1"])["company"]) == ["1"]
+    assert "Company 2" in format_compare("revenue", ranking, {"2": "Company 2"})
+
+    store.save()
+    reloaded = ResultsStore(tmp_path / "results.parquet")
+    assert len(reloaded) == len(store)
+    assert list(reloaded.compare("revenue")["company"]) == ["2", "1"]
+
+
+def test_quarter_and_year_to_date_are_compared_with_their_own_year_ago_period(tmp_path):
+    store = ResultsStore(tmp_path / "results.parquet")
+    rows = parse_results_table([
+        ["", "w tys. zł", "w tys. zł", "w tys. zł", "w tys. zł"],
+        ["", "III kwartał / 2025", "3 kwartały / 2025", "III kwartał / 2024", "3 kwartały / 2024"],
+        ["Zysk (strata) netto", "150", "450", "100", "360"],
+    ])
+    store.add("1", {**REPORT, "date": "2025-11-20"}, rows)
+
+    latest = store.company("1")
+    assert list(zip(latest["period"], latest["change"].round(2))) == [("2025Q3", 0.5), ("2025Q1-3", 0.25)]
+    ranking = store.compare("net_profit")
+    assert list(zip(ranking["company"], ranking["period"])) == [("1", "2025Q3")]
+    assert "2025Q1-3" in format_results("Test Corp", latest)
+
+
+@pytest.mark.asyncio
+async def test_results_reports_are_stored_and_queried(tracker):
+    tracker.fetcher.inform_new_espies = AsyncMock(return_value=[REPORT])
+    tracker.fetcher.handle_new_espi = AsyncMock(return_value="table")
+    tracker.fetcher.get_results = AsyncMock(return_value=results_rows())
+    tracker.pinned_stocks["1"] = {"name": "Test Corp", "emoji": "📈", "url": "https://example.com", "messages": []}
+    tracker.espi_history["1"] = []
+    ctx = MagicMock()
+    ctx.defer = AsyncMock()
+    ctx.send = AsyncMock()
+    tracker.subscriptions.subscribe(MagicMock(id=ctx.channel.id, guild=None), "1")
+
+    assert await tracker._check_company("1", tracker.pinned_stocks["1"])
+    assert tracker.results_store.dirty
+
+    await tracker.compare.callback(tracker, ctx, "przychody")
+    assert "Test Corp" in ctx.send.await_args.args[0]
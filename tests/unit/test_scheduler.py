@@ -0,0 +1,113 @@
+import sys
+from pathlib import Path
+
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from utils.scheduler import (DORMANT_FACTOR, PollScheduler, RateLimiter, activity_factor, easter_sunday, is_trading_day,
+                             market_interval, poll_interval)
+
+
+def test_gpw_calendar_knows_moving_holidays():
+    assert easter_sunday(2025) == date(2025, 4, 20)
+    assert not is_trading_day(date(2025, 4, 18))  # Good Friday
+    assert not is_trading_day(date(2025, 4, 21))  # Easter Monday
+    assert not is_trading_day(date(2025, 6, 19))  # Corpus Christi
+    assert not is_trading_day(date(2025, 7, 5))  # Saturday
+    assert is_trading_day(date(2025, 7, 7))
+
+
+def test_market_interval_is_dense_around_close_and_sparse_at_night():
+    close = market_interval(datetime(2025, 7, 7, 17, 30))
+    session = market_interval(datetime(2025, 7, 7, 12, 0))
+    night = market_interval(datetime(2025, 7, 7, 2, 0))
+    weekend = market_interval(datetime(2025, 7, 5, 12, 0))
+
+    assert close < session < weekend
+    assert session < night
+    # Reporting season tightens the daytime intervals
+    assert market_interval(datetime(2025, 11, 3, 17, 30)) < close
+
+
+def test_activity_factor_follows_recent_publications():
+    now = datetime(2025, 7, 7, 18, 0)
+    busy = [{"date": (now - timedelta(days=i)).strftime("%Y-%m-%d"), "time": "08:00"} for i in range(10, 0, -1)]
+    quiet = [{"date": "2024-01-02", "time": "08:00"}]
+
+    assert activity_factor(busy, now) < activity_factor(busy[-2:], now) < activity_factor(quiet, now)
+
+
+def test_activity_factor_counts_a_history_stored_newest_first():
+    now = datetime(2025, 7, 7, 18, 0)
+    listing = [{"date": (now - timedelta(days=i)).strftime("%Y-%m-%d"), "time": "08:00"} for i in range(1, 61)]
+    # _add_company_to_dict stores the first page as listed, _check_company appends each new batch the same way
+    added = listing[2:]
+    updated = added + listing[:2]
+
+    assert activity_factor(added, now) == 0.5
+    assert activity_factor(updated, now) == 0.5
+    assert activity_factor(listing[30:], now) == DORMANT_FACTOR
+
+
+@pytest.mark.parametrize("month", [7, 11])
+def test_session_polls_are_never_slower_than_the_old_fixed_loop(month):
+    now = datetime(2025, month, 7 if month == 7 else 3, 12, 0)
+    recent = [{"date": (now - timedelta(days=3)).strftime("%Y-%m-%d"), "time": "08:00"}]
+    quiet = [{"date": "2024-01-02", "time": "08:00"}]
+
+    assert market_interval(now) * activity_factor(recent, now) <= 60
+    assert market_interval(now) * activity_factor(quiet, now) <= 60
+    # Dormant companies are still polled less at night
+    assert activity_factor(quiet, now.replace(hour=2)) > 1
+
+
+def test_poll_interval_adds_jitter_within_bounds():
+    now = datetime(2025, 7, 7, 12, 0)
+    intervals = {poll_interval([], now) for _ in range(20)}
+
+    assert len(intervals) > 1
+    base = market_interval(now) * activity_factor([], now)
+    assert all(base * 0.9 <= interval <= base * 1.1 for interval in intervals)
+
+
+def test_poll_scheduler_pops_due_keys_in_order():
+    scheduler = PollScheduler()
+    scheduler.schedule("a", 30, now=0)
+    scheduler.schedule("b", 10, now=0)
+    scheduler.schedule("c", 20, now=0)
+    scheduler.schedule("c", 50, now=0)  # rescheduled, the old entry is skipped
+    scheduler.remove("b")
+    scheduler.add_missing(["a", "d"], now=0)
+
+    assert scheduler.pop_due(now=40) == ["d", "a"]
+    assert scheduler.next_due() == 50
+    assert scheduler.pop_due(now=40) == []
+    assert scheduler.pop_due(now=50) == ["c"]
+    assert len(scheduler) == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_spaces_out_requests():
+    limiter = RateLimiter(rate=50)
+    start = time.monotonic()
+
+    await asyncio.gather(*(limiter.acquire() for _ in range(6)))
+
+    # The first token is available right away, the other five take 1/50 s each
+    assert time.monotonic() - start >= 5 / 50 * 0.9
+
+
+def test_poll_scheduler_runs_on_replaceable_clocks():
+    now = [1000.0]
+    scheduler = PollScheduler(clock=lambda: now[0], wall_clock=lambda: datetime(2025, 7, 5, 12, 0))
+    scheduler.reschedule("feed")
+
+    due = scheduler.next_due()
+    # Saturday noon polls the feed every half hour, give or take the jitter
+    assert 1000 + 1800 * 0.9 <= due <= 1000 + 1800 * 1.1
+    assert scheduler.pop_due() == []
+    now[0] = due
+    assert scheduler.pop_due() == ["feed"]
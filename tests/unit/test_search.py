@@ -0,0 +1,52 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from utils.search import SearchIndex, parse_since, tokenize
+
+
+def announcement(url, title, date="2025-03-28", time="17:00"):
+    return {"date": date, "time": time, "title": title, "url": url}
+
+
+def test_tokenize_folds_diacritics_and_inflection():
+    assert tokenize("Zbycie AKCJI przez Członka Zarządu") == ["zbyc", "akcj", "czlonk", "zarzad"]
+    assert tokenize("akcja") == tokenize("akcje") == tokenize("akcjami")
+    assert tokenize("spółka") == tokenize("spolka") == []
+
+
+def test_search_ranks_filters_and_survives_restart(tmp_path):
+    index = SearchIndex(tmp_path / "index.jsonl")
+    index.add("1", announcement("/a", "Zbycie akcji przez osobę zarządzającą"), "Prezes zarządu sprzedał akcje.")
+    index.add("1", announcement("/b", "Raport okresowy półroczny", date="2024-09-30"), "Przychody wzrosły, zbycie aktywów.")
+    index.add("2", announcement("/c", "Nabycie akcji własnych"))
+    assert not index.add("2", announcement("/c", "Nabycie akcji własnych"))
+
+    # Title matches outrank body matches
+    assert [url for _, _, url, _, _ in index.search("zbycie")] == ["/a", "/b"]
+    assert [url for _, _, url, _, _ in index.search("akcji", numbers=["2"])] == ["/c"]
+    assert [url for _, _, url, _, _ in index.search("zbycie", since=datetime(2025, 1, 1))] == ["/a"]
+    assert index.search("dywidenda") == []
+
+    index.flush()
+    reloaded = SearchIndex(tmp_path / "index.jsonl")
+    assert len(reloaded) == 3
+    assert reloaded.search("ZARZĄD") == index.search("zarzad")
+
+
+def test_history_is_indexed_once(tmp_path):
+    index = SearchIndex(tmp_path / "index.jsonl")
+    history = {"1": [announcement("/a", "Raport bieżący"), announcement("/b", "Zbycie akcji")]}
+
+    assert index.add_history(history) == 2
+    assert index.add_history(history) == 0
+
+
+def test_parse_since():
+    assert parse_since("2025-01-31") == datetime(2025, 1, 31)
+    assert round((datetime.now() - parse_since("30d")).total_seconds() / 86400) == 30
+    with pytest.raises(ValueError):
+        parse_since("yesterday")
@@ -0,0 +1,115 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from utils.storage import JSONStorage, SQLiteStorage, migrate_json_to_sqlite
+
+COMPANY = {"name": "Test Corp", "emoji": "🚀", "url": "https://example.com", "messages": [{"content": "Test Corp 🚀", "id": 123, "pinned": True}]}
+ANNOUNCEMENT = {"date": "2025-01-01", "time": "09:00", "company": "Test Corp", "title": "Raport", "url": "/a"}
+
+
+def test_json_storage_flushes_only_when_dirty(tmp_path):
+    storage = JSONStorage(tmp_path / "pinned.json", tmp_path / "history.json")
+    pinned_stocks, espi_history = storage.load()
+    storage.flush()
+    assert not (tmp_path / "pinned.json").exists()
+
+    pinned_stocks["42"] = COMPANY
+    espi_history["42"] = [ANNOUNCEMENT]
+    storage.add_company("42", COMPANY, [ANNOUNCEMENT])
+    storage.flush()
+
+    assert json.loads((tmp_path / "history.json").read_text()) == {"42": [ANNOUNCEMENT]}
+    assert not (tmp_path / "history.json.tmp").exists()
+
+
+def test_sqlite_storage_appends_incrementally(tmp_path):
+    storage = SQLiteStorage(tmp_path / "espi.db")
+    storage.add_company("42", COMPANY, [ANNOUNCEMENT])
+    storage.append_announcement("42", {**ANNOUNCEMENT, "url": "/b"})
+    storage.append_announcement("42", ANNOUNCEMENT)  # duplicate is ignored
+    storage.append_message("42", {"content": "msg", "id": 456, "pinned": False})
+    storage.close()
+
+    pinned_stocks, espi_history = SQLiteStorage(tmp_path / "espi.db").load()
+
+    assert [a["url"] for a in espi_history["42"]] == ["/a", "/b"]
+    assert [m["id"] for m in pinned_stocks["42"]["messages"]] == [123, 456]
+    assert pinned_stocks["42"]["name"] == "Test Corp"
+
+
+def test_sqlite_storage_remove_company(tmp_path):
+    storage = SQLiteStorage(tmp_path / "espi.db")
+    storage.add_company("42", COMPANY, [ANNOUNCEMENT])
+    storage.remove_company("42")
+
+    assert storage.load() == ({}, {})
+
+
+def test_sqlite_storage_prunes_rows_dropped_by_retention(tmp_path):
+    storage = SQLiteStorage(tmp_path / "espi.db")
+    history = [{**ANNOUNCEMENT, "url": f"/{i}"} for i in range(600)]
+    storage.add_company("42", COMPANY, history)
+    storage.add_company("43", COMPANY, [ANNOUNCEMENT])
+
+    storage.prune_history("42", history[-2:])
+    storage.close()
+
+    _, espi_history = SQLiteStorage(tmp_path / "espi.db").load()
+    assert [a["url"] for a in espi_history["42"]] == ["/598", "/599"]
+    assert espi_history["43"] == [ANNOUNCEMENT]
+
+
+def test_migrate_json_to_sqlite(tmp_path):
+    (tmp_path / "pinned.json").write_text(json.dumps({"42": COMPANY}))
+    (tmp_path / "history.json").write_text(json.dumps({"42": [ANNOUNCEMENT]}))
+
+    storage = migrate_json_to_sqlite(tmp_path / "pinned.json", tmp_path / "history.json", tmp_path / "espi.db")
+
+    assert storage.load() == ({"42": COMPANY}, {"42": [ANNOUNCEMENT]})
+
+
+def test_storage_backends_keep_subscriptions(tmp_path):
+    json_storage = JSONStorage(tmp_path / "pinned.json", tmp_path / "history.json", tmp_path / "subscriptions.json")
+    json_storage.load()
+    subscriptions = json_storage.load_subscriptions()
+    subscriptions[555] = {"guild": 1, "companies": ["42"]}
+    json_storage.add_subscription(555, 1, "42")
+    json_storage.flush()
+    assert JSONStorage(subscriptions_file=tmp_path / "subscriptions.json").load_subscriptions() == subscriptions
+
+    sqlite_storage = SQLiteStorage(tmp_path / "espi.db")
+    sqlite_storage.add_subscription(555, 1, "42")
+    sqlite_storage.add_subscription(555, 1, "42")
+    sqlite_storage.add_subscription(666, None, "42")
+    sqlite_storage.remove_subscription(666, "42")
+    sqlite_storage.append_message("42", {"id": 1, "channel": 555, "pinned": True})
+    assert sqlite_storage.load_subscriptions() == subscriptions
+
+
+def test_sqlite_storage_adds_message_channel_to_old_databases(tmp_path):
+    import sqlite3
+    db = sqlite3.connect(tmp_path / "espi.db")
+    db.execute("CREATE TABLE message (id INTEGER PRIMARY KEY, company VARCHAR(255), message_id INTEGER, "
+               "content TEXT, pinned INTEGER)")
+    db.execute("INSERT INTO message (company, message_id, pinned) VALUES ('42', 1, 1)")
+    db.commit()
+    db.close()
+
+    storage = SQLiteStorage(tmp_path / "espi.db")
+    storage.add_company("42", {**COMPANY, "messages": [{"id": 2, "channel": 555, "pinned": True}]}, [])
+
+    assert storage.load()[0]["42"]["messages"] == [
+        {"content": None, "id": 1, "pinned": True}, {"content": None, "id": 2, "channel": 555, "pinned": True}]
+
+
+def test_storage_backends_keep_announcement_labels(tmp_path):
+    labeled = {**ANNOUNCEMENT, "url": "/b", "labels": ["periodic_report", "quarterly_report"]}
+    sqlite = SQLiteStorage(tmp_path / "espi.db")
+    sqlite.add_company("42", COMPANY, [ANNOUNCEMENT, labeled, {**ANNOUNCEMENT, "url": "/c", "labels": []}])
+    history = SQLiteStorage(tmp_path / "espi.db").load()[1]["42"]
+
+    assert "labels" not in history[0]
+    assert history[1]["labels"] == ["periodic_report", "quarterly_report"]
+    assert history[2]["labels"] == []
@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from unittest.mock import MagicMock
+from utils.subscriptions import SubscriptionRegistry
+
+
+def make_channel(channel_id, guild_id=1):
+    channel = MagicMock(id=channel_id)
+    channel.guild.id = guild_id
+    return channel
+
+
+def test_registry_indexes_subscribers_per_company():
+    registry = SubscriptionRegistry({10: {"guild": 1, "companies": ["42"]}})
+    a, b = make_channel(10), make_channel(20, guild_id=2)
+
+    assert registry.subscribe(b, "42")
+    assert not registry.subscribe(b, "42")
+    registry.subscribe(b, "7")
+
+    assert registry.subscribers("42") == {10, 20}
+    assert registry.companies() == {"42", "7"}
+    assert registry.channels[20] == {"guild": 2, "companies": ["42", "7"]}
+    assert registry.guild_channels(2) == [20]
+
+    assert registry.unsubscribe(10, "42")
+    assert not registry.unsubscribe(10, "42")
+    assert 10 not in registry.channels
+    assert registry.remove_channel(20) == ["42", "7"]
+    assert registry.companies() == set()
+
+
+def test_registry_caches_channel_handles():
+    registry = SubscriptionRegistry({10: {"guild": 1, "companies": ["42"]}})
+    bot = MagicMock()
+    channel = make_channel(10)
+    bot.get_channel.return_value = channel
+
+    assert registry.channel(bot, 10) is channel
+    assert registry.channel(bot, 10) is channel
+    bot.get_channel.assert_called_once_with(10)
+
+    registry.invalidate(10)
+    registry.channel(bot, 10)
+    assert bot.get_channel.call_count == 2
@@ -1,8 +1,15 @@
+import json
+import math
 import sys
 from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
-from utils.utils import decode_to_number
+import utils.utils
+from utils.history import Watermark, announcement_key, history_keys
+from utils.utils import decode_to_number, diff_listing, filter_new_espies, parse_espi_feed, parse_transaction_info2
+
+CAMELOT_TABLES = Path(__file__).resolve().parent.parent / "fixtures" / "camelot" / "mar_tables.json"
 
 @pytest.mark.parametrize("input_str,expected_id", [
     ("11 bit studios", "1"),
@@ -69,4 +76,104 @@ def test_decode_to_number_with_unknown_input_raises_error():
             ticker_to_number={},
             symbol_to_number={},
             stock_id={}
-        )
\ No newline at end of file
+        )
+
+def test_parse_espi_feed_maps_rows_to_company_ids():
+    html = """
+    <table><tbody>
+    <tr><td>2025-01-02</td><td>10:00</td><td><a href="/espi?company=62">Apator SA</a></td><td><a href="/a">Raport</a></td></tr>
+    <tr><td>2025-01-02</td><td>09:00</td><td>11 bit studios SA</td><td><a href="/b">Raport</a></td></tr>
+    <tr><td>2025-01-02</td><td>08:00</td><td>Unknown SA</td><td><a href="/c">Raport</a></td></tr>
+    </tbody></table>
+    """
+
+    feed = parse_espi_feed(html, {"11 bit studios sa": "1"})
+
+    assert [(number, announcement["url"]) for number, announcement in feed] == [("62", "/a"), ("1", "/b")]
+
+
+def test_filter_new_espies_uses_announcement_identity():
+    history = [{"date": "2025-01-01", "time": "09:00", "title": "Old", "url": "/old"}]
+    listing = [
+        {"date": "2025-01-02", "time": "10:00", "title": "New", "url": "/new"},
+        # Same article with a re-rendered title is not announced twice
+        {"date": "2025-01-01", "time": "09:00", "title": "Old (edited)", "url": "/old"},
+    ]
+
+    assert filter_new_espies(listing, history) == [listing[0]]
+    assert filter_new_espies(listing, [], seen=history_keys(history)) == [listing[0]]
+
+
+def listing_html(rows):
+    return "<table><tbody>" + "".join(
+        f'<tr><td>{date}</td><td>{time}</td><td><a href="/c">Test Corp SA</a></td><td><a href="{url}">Raport</a></td></tr>'
+        for date, time, url in rows) + "</tbody></table>"
+
+
+def test_diff_listing_stops_at_first_seen_row(monkeypatch):
+    read = []
+    iter_rows = utils.utils.iter_announcement_rows
+
+    def counting(html):
+        for row in iter_rows(html):
+            read.append(row[0]["url"])
+            yield row
+
+    monkeypatch.setattr(utils.utils, "iter_announcement_rows", counting)
+    rows = [("2025-01-03", "10:00", "/new"), ("2025-01-02", "10:00", "/old")] + \
+           [("2025-01-01", "09:00", f"/older-{i}") for i in range(50)]
+
+    new, newest = diff_listing(listing_html(rows), {"/old"})
+
+    assert [a["url"] for a in new] == ["/new"]
+    assert newest.key == "/new"
+    assert read == ["/new", "/old", "/older-0"]
+
+
+def test_diff_listing_reads_the_rest_of_the_boundary_minute():
+    # PAP doesn't order rows published in the same minute
+    rows = [("2025-01-02", "10:00", "/a"), ("2025-01-02", "10:00", "/b"), ("2025-01-02", "10:00", "/c"),
+            ("2025-01-01", "09:00", "/d")]
+
+    new, _ = diff_listing(listing_html(rows), {"/a", "/d"})
+
+    assert [a["url"] for a in new] == ["/b", "/c"]
+
+
+def test_diff_listing_stops_at_watermark_when_its_row_was_removed():
+    rows = [("2025-01-03", "10:00", "/new"), ("2025-01-01", "09:00", "/unseen-but-old")]
+    # The watermark row (/gone, 2025-01-02 12:00) was taken down
+    watermark = Watermark.of({"date": "2025-01-02", "time": "12:00", "url": "/gone"})
+
+    new, newest = diff_listing(listing_html(rows), set(), watermark)
+
+    assert [a["url"] for a in new] == ["/new"]
+    assert newest == Watermark.of({"date": "2025-01-03", "time": "10:00", "url": "/new"})
+    assert diff_listing("<table><tbody></tbody></table>", set()) == ([], None)
+
+
+def test_announcement_key_falls_back_to_hash_without_url():
+    a = {"date": "2025-01-01", "time": "09:00", "title": "Raport"}
+
+    assert announcement_key(a) == announcement_key(dict(a))
+    assert announcement_key(a) != announcement_key({**a, "time": "09:01"})
+
+
+def test_parse_transaction_info2_matches_saved_tables():
+    corpus = json.loads(CAMELOT_TABLES.read_text(encoding="utf-8"))
+
+    for table in corpus:
+        result = parse_transaction_info2(SimpleNamespace(_tables=[SimpleNamespace(data=table["data"])]))
+        # NaN ("not found") is saved as null
+        result = {key: None if isinstance(value, float) and math.isnan(value) else value for key, value in result.items()}
+        assert result == table["expected"]
+
+
+def test_parse_transaction_info2_keywords_do_not_span_cells():
+    rows = [[""]] * 12 + [["b)", "Rodzaj transakcji", "Zbycie"], ["a)", "Stanowisko/", "status Prezes"]]
+
+    result = parse_transaction_info2(SimpleNamespace(_tables=[SimpleNamespace(data=rows)]))
+
+    assert result["transaction_mode"] == "disposal"
+    assert result["incentive"] is None
+    assert math.isnan(result["position"])
@@ -0,0 +1,183 @@
+import sys
+from pathlib import Path
+
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from unittest.mock import AsyncMock, MagicMock
+from utils.history import announcement_key
+from utils.utils import parse_espi_announcements
+from utils.workers import Coordinator, PollingWorker, spawn_workers
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+LISTING = (ROOT / "tests" / "fixtures" / "pap" / "listing.html").read_text(encoding="utf-8")
+COMPANIES = ["1", "2", "3", "4"]
+
+
+def test_claims_are_rebalanced_when_workers_join_and_die(tmp_path):
+    coordinator = Coordinator(tmp_path / "workers.db", lease_ttl=10)
+    coordinator.publish({number: f"/espi?company={number}" for number in COMPANIES})
+
+    assert len(coordinator.claim("a", now=100)) == 4
+    # b joins, but a still holds every lease until its next claim gives half back
+    assert coordinator.claim("b", now=101) == {}
+    assert len(coordinator.claim("a", now=102)) == 2
+    assert len(coordinator.claim("b", now=103)) == 2
+    assert set(coordinator.claim("a", now=104)).isdisjoint(coordinator.claim("b", now=104))
+
+    # a stops heartbeating, its leases expire and b takes over
+    assert len(coordinator.claim("b", now=120)) == 4
+
+    coordinator.publish({"1": "/espi?company=1"})
+    assert list(coordinator.claim("b", now=121)) == ["1"]
+    coordinator.close()
+
+
+def test_outbox_round_trip(tmp_path):
+    coordinator = Coordinator(tmp_path / "workers.db")
+    coordinator.push("1", [{"title": "A", "url": "/a"}, {"title": "B", "url": "/b"}])
+
+    entries = coordinator.pop_outbox()
+    assert [(number, announcement["url"]) for _, number, announcement in entries] == [("1", "/a"), ("1", "/b")]
+
+    coordinator.ack([entries[0][0]])
+    assert [announcement["url"] for _, _, announcement in coordinator.pop_outbox()] == ["/b"]
+    coordinator.close()
+
+
+@pytest.mark.asyncio
+async def test_worker_mode_sends_announcements_found_by_workers(tracker, tmp_path):
+    tracker.coordinator = Coordinator(tmp_path / "workers.db")
+    channel = MagicMock(id=10)
+    channel.send = AsyncMock()
+    tracker.pinned_stocks["1"] = {"name": "Corp 1", "emoji": "🚀", "url": "/espi?company=1", "messages": []}
+    tracker.espi_history["1"] = [{"title": "Old", "url": "/old"}]
+    tracker.subscriptions.subscribe(channel, "1")
+    tracker.fetcher.handle_new_espi = AsyncMock(return_value="text")
+
+    await tracker.check_espi()
+    assert tracker.coordinator.leases() == {"1": None}
+    assert tracker.coordinator.watermarks(["1"]) == {"1": "/old"}
+
+    tracker.coordinator.push("1", [{"title": "New", "url": "/new"}, {"title": "Old", "url": "/old"}])
+    await tracker.check_espi()
+    await tracker.delivery.join()
+
+    assert [a.get("url") for a in tracker.espi_history["1"]] == ["/old", "/new"]
+    channel.send.assert_awaited_once()
+    assert tracker.coordinator.pop_outbox() == []
+
+
+@pytest.mark.asyncio
+async def test_rows_of_a_failed_company_stay_in_the_outbox(tracker, tmp_path):
+    tracker.coordinator = Coordinator(tmp_path / "workers.db")
+    for number in ("1", "2"):
+        tracker.pinned_stocks[number] = {"name": f"Corp {number}", "emoji": "🚀", "url": f"/espi?company={number}",
+                                         "messages": []}
+        tracker.espi_history[number] = []
+        tracker.subscriptions.subscribe(MagicMock(id=10, guild=None), number)
+    tracker.fetcher.handle_new_espi = AsyncMock(side_effect=[RuntimeError("boom"), "text", "text"])
+
+    tracker.coordinator.push("1", [{"title": "A", "url": "/a"}])
+    tracker.coordinator.push("2", [{"title": "B", "url": "/b"}])
+    await tracker.check_espi()
+
+    assert [number for _, number, _ in tracker.coordinator.pop_outbox()] == ["1"]
+    await tracker.check_espi()
+    assert tracker.coordinator.pop_outbox() == []
+    assert [a.get("url") for a in tracker.espi_history["1"]] == ["/a"]
+
+
+@pytest.mark.asyncio
+async def test_worker_taking_a_lease_reports_only_rows_above_the_watermark(tmp_path):
+    coordinator = Coordinator(tmp_path / "workers.db")
+    listing = parse_espi_announcements(LISTING)
+    coordinator.publish({"1": "/espi?company=1", "2": "/espi?company=2"},
+                        {"1": announcement_key(listing[2]), "2": "/gone"})
+    fetcher = MagicMock()
+    fetcher.fetch_if_changed = AsyncMock(return_value=(True, LISTING))
+    worker = PollingWorker(coordinator, "worker-1", fetcher)
+
+    await worker.run_once()
+
+    pushed = {}
+    for _, number, announcement in coordinator.pop_outbox(limit=1000):
+        pushed.setdefault(number, []).append(announcement["url"])
+    assert pushed["1"] == [announcement["url"] for announcement in listing[:2]]
+    # A watermark that's no longer on the page falls back to the whole page
+    assert len(pushed["2"]) == len(listing)
+    coordinator.close()
+
+
+@pytest.mark.asyncio
+async def test_takeover_of_a_company_added_by_command_pushes_only_new_rows(tracker, tmp_path):
+    tracker.coordinator = Coordinator(tmp_path / "workers.db")
+    listing = parse_espi_announcements(LISTING)
+    ctx = AsyncMock()
+    tracker.fetcher.get_company_name = AsyncMock(return_value="Corp 1")
+    # The newest row was published after the company was added
+    tracker.fetcher.get_espi_announcements = AsyncMock(return_value=listing[1:])
+    tracker.get_company_emoji = MagicMock(return_value="🚀")
+    await tracker._add_company_to_dict(ctx, "1")
+    await tracker.check_espi()
+
+    fetcher = MagicMock()
+    fetcher.fetch_if_changed = AsyncMock(return_value=(True, LISTING))
+    await PollingWorker(tracker.coordinator, "worker-1", fetcher).run_once()
+
+    assert [announcement["url"] for _, _, announcement in tracker.coordinator.pop_outbox()] == [listing[0]["url"]]
+
+
+async def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.2)
+
+
+@pytest.mark.asyncio
+async def test_worker_processes_share_companies_and_take_over_from_a_dead_one(monkeypatch, tmp_path):
+    async def listing(request):
+        return web.Response(text=LISTING.replace("company=1", f"company={request.query['company']}"),
+                            content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/espi", listing)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    coordinator = Coordinator(tmp_path / "workers.db", lease_ttl=3)
+    # Every company has all but the two newest rows of the page
+    watermark = announcement_key(parse_espi_announcements(LISTING)[2])
+    coordinator.publish({number: f"{base}/espi?company={number}" for number in COMPANIES},
+                        {number: watermark for number in COMPANIES})
+    monkeypatch.chdir(ROOT)
+    processes = spawn_workers(2, tmp_path / "workers.db", lease_ttl=3)
+    try:
+        def owners():
+            return set(coordinator.leases().values())
+
+        await wait_for(lambda: owners() == {"worker-1", "worker-2"})
+        await wait_for(lambda: {number for _, number, _ in coordinator.pop_outbox()} == set(COMPANIES))
+        reported = len(coordinator.pop_outbox(limit=10000))
+
+        processes[0].kill()
+        processes[0].wait()
+        await wait_for(lambda: owners() == {"worker-2"})
+        # The companies taken over report their two rows above the watermark again, the tracker dedupes them
+        await wait_for(lambda: len(coordinator.pop_outbox(limit=10000)) >= reported + 4)
+        newest = {announcement["url"] for announcement in parse_espi_announcements(LISTING)[:2]}
+        assert {announcement["url"] for _, _, announcement in coordinator.pop_outbox(limit=10000)} == newest
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+        await runner.cleanup()
+        coordinator.close()
@@ -0,0 +1,171 @@
+"""Outbound queue for ESPI messages, so polling never waits on Discord and vice versa."""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+import discord
+
+from utils.metrics import METRICS, Metrics
+from utils.scheduler import RateLimiter
+
+# Discord allows 4096 characters in an embed description
+EMBED_LIMIT = 4096
+ENTRY_SEPARATOR = "\n\n───\n\n"
+# Discord's per-channel bucket is 5 messages per 5 seconds
+CHANNEL_RATE = 1
+CHANNEL_BURST = 5
+# Announcements queued within this window are sent together
+COALESCE_DELAY = 1.0
+SEND_RETRIES = 3
+
+
+@dataclass
+class DeliveryEntry:
+    """One announcement to deliver. `on_sent(message)` is called with the message it starts in."""
+    text: str
+    url: str | None = None
+    on_sent: Callable | None = None
+
+
+def split_text(text: str, limit: int) -> list:
+    """Splits text into pieces of at most `limit` characters, preferring line and word breaks."""
+    pieces = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit + 1)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        pieces.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text or not pieces:
+        pieces.append(text)
+    return pieces
+
+
+def pack_entries(entries: list, limit: int = EMBED_LIMIT) -> tuple[list, list]:
+    """Packs entries into as few chunks of at most `limit` characters as possible.
+
+    Returns the chunks and, for every entry, the index of the chunk it starts in.
+    """
+    chunks = []
+    starts = []
+    current = ""
+    for entry in entries:
+        for i, piece in enumerate(split_text(entry.text, limit)):
+            separator = ENTRY_SEPARATOR if current and i == 0 else "\n" if current else ""
+            if current and len(current) + len(separator) + len(piece) > limit:
+                chunks.append(current)
+                current = ""
+                separator = ""
+            if i == 0:
+                starts.append(len(chunks))
+            current += separator + piece
+    if current or not chunks:
+        chunks.append(current)
+    return chunks, starts
+
+
+class DeliveryQueue:
+    """Per-channel queues of announcements, each drained by its own consumer task.
+
+    Consecutive announcements of a company are coalesced into embeds, long ones are split
+    over several messages, and every channel is paced by its own token bucket.
+    """
+
+    def __init__(self, coalesce_delay: float = COALESCE_DELAY, rate: float = CHANNEL_RATE,
+                 burst: int = CHANNEL_BURST, retries: int = SEND_RETRIES, metrics: Metrics = METRICS):
+        self.coalesce_delay = coalesce_delay
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.metrics = metrics
+        # channel id -> (asyncio.Queue, consumer task)
+        self._channels = {}
+        self._depth = {}
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def depth(self) -> int:
+        """Announcements waiting to be delivered, over all channels."""
+        return sum(self._depth.values())
+
+    def channel_depth(self, channel) -> int:
+        return self._depth.get(channel.id, 0)
+
+    def enqueue(self, channel, title: str, entries: list):
+        """Queues the announcements of one company, returns immediately."""
+        if not entries:
+            return
+        if channel.id not in self._channels:
+            queue = asyncio.Queue()
+            task = asyncio.create_task(self._consume(channel.id, queue, RateLimiter(self.rate, self.burst)))
+            self._channels[channel.id] = (queue, task)
+        self._channels[channel.id][0].put_nowait((channel, title, entries))
+        self._depth[channel.id] = self._depth.get(channel.id, 0) + len(entries)
+
+    async def join(self):
+        """Waits until everything queued so far has been delivered."""
+        for queue, _ in list(self._channels.values()):
+            await queue.join()
+
+    async def close(self):
+        for _, task in self._channels.values():
+            task.cancel()
+        await asyncio.gather(*(task for _, task in self._channels.values()), return_exceptions=True)
+        self._channels.clear()
+
+    async def _consume(self, channel_id, queue: asyncio.Queue, limiter: RateLimiter):
+        while True:
+            batch = [await queue.get()]
+            await asyncio.sleep(self.coalesce_delay)
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+
+            # One group per company, in the order they were queued
+            groups = {}
+            for channel, title, entries in batch:
+                groups.setdefault(title, (channel, []))[1].extend(entries)
+
+            for title, (channel, entries) in groups.items():
+                try:
+                    await self._send_group(channel, title, entries, limiter)
+                except Exception as e:
+                    print(f"Error delivering {title}: {e!r}")
+                    self.failed += len(entries)
+                    self.metrics.inc("delivery_failed_total", len(entries))
+                self._depth[channel_id] -= len(entries)
+
+            for _ in batch:
+                queue.task_done()
+
+    async def _send_group(self, channel, title: str, entries: list, limiter: RateLimiter):
+        chunks, starts = pack_entries(entries)
+        for index, chunk in enumerate(chunks):
+            embed = discord.Embed(title=title if index == 0 else f"{title} ({index + 1}/{len(chunks)})",
+                                  description=chunk)
+            if len(entries) == 1 and entries[0].url:
+                embed.url = entries[0].url
+            message = await self._send(channel, embed, limiter)
+            self.sent += 1
+            self.metrics.inc("messages_sent_total")
+            for entry, start in zip(entries, starts):
+                if start == index and entry.on_sent is not None:
+                    entry.on_sent(message)
+
+    async def _send(self, channel, embed, limiter: RateLimiter):
+        for attempt in range(self.retries):
+            await limiter.acquire()
+            start = time.perf_counter()
+            try:
+                return await channel.send(embed=embed)
+            except discord.HTTPException as e:
+                self.metrics.inc("send_errors_total")
+                if attempt == self.retries - 1:
+                    raise
+                print(f"Discord send failed ({e.status}), retrying")
+            finally:
+                self.metrics.observe("send_seconds", time.perf_counter() - start)
+            await asyncio.sleep(2 ** attempt)
@@ -0,0 +1,105 @@
+import asyncio
+import sys
+from functools import cached_property
+from pathlib import Path
+
+from utils.storage import load_json, save_json
+
+EMOJI_CACHE_FILE = "company_emojis.json"
+DEFAULT_EMOJI = "🏢"
+EMOJI_TIMEOUT = 10
+PREGENERATE_PER_MINUTE = 30
+
+
+class OpenAIEmojiClient:
+    """Generates a company emoji with an async OpenAI chat completion."""
+
+    def __init__(self, api_key: str, model: str = "gpt-4o-mini"):
+        self.api_key = api_key
+        self.model = model
+
+    @cached_property
+    def client(self):
+        # The openai package is slow to import, so it's loaded with the first request
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(api_key=self.api_key)
+
+    async def generate(self, company_name: str) -> str | None:
+        completion = await self.client.chat.completions.create(
+            model=self.model,
+            store=True,
+            messages=[
+                {"role": "user", "content": f"Give me a single emoji that represents the company {company_name}. If you don't know return random emoji"}
+            ]
+        )
+        return completion.choices[0].message.content
+
+
+class EmojiCache:
+    """Company emojis keyed by company id, persisted so each one is generated only once.
+
+    `client` is anything with an async `generate(company_name)` method.
+    """
+
+    def __init__(self, client, file=EMOJI_CACHE_FILE, timeout: float = EMOJI_TIMEOUT):
+        self.client = client
+        self.file = file
+        self.timeout = timeout
+        self.emojis = load_json(file)
+        self._pending = {}
+
+    def get(self, number: str) -> str | None:
+        return self.emojis.get(number)
+
+    async def fetch(self, number: str, company_name: str) -> str:
+        """Returns the cached emoji or generates it; falls back to DEFAULT_EMOJI without caching it."""
+        if number in self.emojis:
+            return self.emojis[number]
+        # Concurrent callers for the same company share one LLM request
+        task = self._pending.get(number)
+        if task is None:
+            task = self._pending[number] = asyncio.ensure_future(self._generate(number, company_name))
+            task.add_done_callback(lambda _: self._pending.pop(number, None))
+        return await asyncio.shield(task)
+
+    async def _generate(self, number: str, company_name: str) -> str:
+        try:
+            emoji = await asyncio.wait_for(self.client.generate(company_name), self.timeout)
+        except Exception as e:
+            print(f"Emoji generation failed for {company_name}: {e!r}")
+            return DEFAULT_EMOJI
+        if not emoji:
+            return DEFAULT_EMOJI
+        emoji = emoji.strip()
+        self.emojis[number] = emoji
+        save_json(self.file, self.emojis)
+        return emoji
+
+    async def pregenerate(self, stock_id: dict, per_minute: int = PREGENERATE_PER_MINUTE) -> int:
+        """Fills the cache for every company in stock_id, at most `per_minute` LLM requests a minute.
+
+        Returns the number of newly generated emojis.
+        """
+        interval = 60 / per_minute
+        generated = 0
+        for number, company_name in stock_id.items():
+            if number in self.emojis:
+                continue
+            await self.fetch(number, company_name)
+            if number in self.emojis:
+                generated += 1
+            await asyncio.sleep(interval)
+        return generated
+
+
+if __name__ == "__main__":
+    # python -m utils.emoji_cache [requests per minute]
+    from decouple import config
+
+    from utils.resolver import DECODERS_DIR
+
+    per_minute = int(sys.argv[1]) if len(sys.argv) > 1 else PREGENERATE_PER_MINUTE
+    cache = EmojiCache(OpenAIEmojiClient(config("OPENAI_API_KEY")))
+    count = asyncio.run(cache.pregenerate(load_json(Path(DECODERS_DIR) / "stock_id.json"), per_minute))
+    print(f"Generated {count} emojis")
@@ -1,6 +1,32 @@
 from enum import Enum
 
 class ESPIType(Enum):
+    """How an announcement is handled: which page is fetched and what the message shows."""
     RESULTS = "📊 Wyniki finansowe"
     SHARES = "📈 Operacja na akcjach"
     GENERAL = "ℹ️ Informacja"
+
+
+class ESPILabel(Enum):
+    """What an announcement is about, read from its title. An announcement can have several."""
+    PERIODIC_REPORT = "periodic_report"
+    QUARTERLY_REPORT = "quarterly_report"
+    HALF_YEAR_REPORT = "half_year_report"
+    ANNUAL_REPORT = "annual_report"
+    CONSOLIDATED = "consolidated"
+    PRELIMINARY_RESULTS = "preliminary_results"
+    REPORT_SCHEDULE = "report_schedule"
+    MAR_NOTIFICATION = "mar_notification"
+    SHARE_DISPOSAL = "share_disposal"
+    SHARE_ACQUISITION = "share_acquisition"
+    BUYBACK = "buyback"
+    SHAREHOLDING_CHANGE = "shareholding_change"
+    DIVIDEND = "dividend"
+    GENERAL_MEETING = "general_meeting"
+    SHARE_ISSUE = "share_issue"
+    BONDS = "bonds"
+    CONTRACT = "contract"
+    MANAGEMENT_CHANGE = "management_change"
+    ARTICLES_OF_ASSOCIATION = "articles_of_association"
+    INSOLVENCY = "insolvency"
+    CORRECTION = "correction"
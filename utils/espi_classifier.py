@@ -1,54 +1,151 @@
-from enum import Enum
+import re
+from bisect import bisect_right
+
+from utils.enums import ESPILabel, ESPIType
+from utils.extract import extract_article_paragraphs, extract_table_rows
+from utils.utils import ARTICLE_TTL, PAP_BASE_URL, fetch_page
+
+# Labels -> phrases that give them. A phrase is a lowercase regex matched at the start of a
+# word and beginning with a plain letter. Where two phrases match at the same place the
+# first one wins, so longer phrases go first. Phrases never match across a line, batches
+# are classified as one newline separated text.
+RULES = [
+    ([ESPILabel.PERIODIC_REPORT], ["raport okresowy"]),
+    ([ESPILabel.QUARTERLY_REPORT, ESPILabel.CONSOLIDATED], [r"qsr\b"]),
+    ([ESPILabel.HALF_YEAR_REPORT, ESPILabel.CONSOLIDATED], [r"psr\b"]),
+    ([ESPILabel.ANNUAL_REPORT, ESPILabel.CONSOLIDATED], [r"srr\b"]),
+    ([ESPILabel.ANNUAL_REPORT], [r"rr\b", "roczn"]),
+    ([ESPILabel.QUARTERLY_REPORT], ["kwartaln"]),
+    ([ESPILabel.HALF_YEAR_REPORT], ["półroczn"]),
+    ([ESPILabel.CONSOLIDATED], ["skonsolidowan"]),
+    ([ESPILabel.PRELIMINARY_RESULTS], [r"wstępn\w* (?:dan|wynik)", "szacunkow"]),
+    ([ESPILabel.REPORT_SCHEDULE], [r"termin\w* (?:przekazywania|publikacji) raport"]),
+    ([ESPILabel.MAR_NOTIFICATION], [r"art\. 19 ust\. 1 rozporządzenia mar", r"transakcj\w* na akcjach"]),
+    ([ESPILabel.SHARE_DISPOSAL], [r"zbyci\w* akcji"]),
+    ([ESPILabel.BUYBACK], [r"nabyci\w* akcji własnych", "akcji własnych", r"skup\w* własn"]),
+    ([ESPILabel.SHARE_ACQUISITION], [r"nabyci\w* akcji"]),
+    ([ESPILabel.SHAREHOLDING_CHANGE], ["stanu posiadania", r"znaczn\w* pakiet", r"art\. 69\b", r"przekroczeni\w* progu"]),
+    ([ESPILabel.DIVIDEND], ["dywidend"]),
+    ([ESPILabel.GENERAL_MEETING], [r"walne\w* zgromadzeni", r"wz\b", r"nwz\b", r"zwz\b"]),
+    ([ESPILabel.SHARE_ISSUE], [r"emisj\w* akcji", r"ofert\w* publiczn", "prospekt", "subskrypcj"]),
+    ([ESPILabel.BONDS], ["obligacj"]),
+    ([ESPILabel.CONTRACT], ["umow", "aneks"]),
+    ([ESPILabel.MANAGEMENT_CHANGE], ["powołani", "odwołani", "rezygnacj", r"zmian\w* w składzie"]),
+    ([ESPILabel.ARTICLES_OF_ASSOCIATION], ["statut"]),
+    ([ESPILabel.INSOLVENCY], ["upadłoś", "restrukturyzac", r"układ\w* z wierzyciel"]),
+    ([ESPILabel.CORRECTION], ["korekt"]),
+]
+LABEL_ORDER = {label: position for position, label in enumerate(ESPILabel)}
+
+
+class ESPIClassifier:
+    """Labels announcement titles with a rule table compiled into a single regex.
+
+    Every phrase is a named group of one alternation anchored at word starts and grouped by
+    first letter, so a title is scanned once and most positions are rejected after one or two
+    checks, whatever the number of rules. Batches are joined and scanned in one go as well.
+    """
+
+    def __init__(self, rules=RULES):
+        self.group_labels = {}
+        by_first_letter = {}
+        for labels, phrases in rules:
+            for phrase in phrases:
+                if not phrase[0].isalnum():
+                    raise ValueError(f"Phrase must start with a letter or digit: {phrase!r}")
+                name = f"r{len(self.group_labels)}"
+                self.group_labels[name] = labels
+                by_first_letter.setdefault(phrase[0], []).append(f"(?P<{name}>{phrase[1:]})")
+        branches = (f"{re.escape(letter)}(?:{'|'.join(groups)})" for letter, groups in by_first_letter.items())
+        self.pattern = re.compile(rf"\b(?:{'|'.join(branches)})")
+
+    def _sorted(self, labels: set) -> tuple:
+        return tuple(sorted(labels, key=LABEL_ORDER.__getitem__))
+
+    def classify(self, title: str) -> tuple:
+        """Labels of a title, in ESPILabel order."""
+        labels = set()
+        for match in self.pattern.finditer(title.lower()):
+            labels.update(self.group_labels[match.lastgroup])
+        return self._sorted(labels)
+
+    def classify_many(self, titles: list) -> list:
+        """Labels of every title, the whole batch scanned at once."""
+        starts = []
+        position = 0
+        for title in titles:
+            starts.append(position)
+            position += len(title) + 1
+        found = [set() for _ in titles]
+        for match in self.pattern.finditer("\n".join(titles).lower()):
+            found[bisect_right(starts, match.start()) - 1].update(self.group_labels[match.lastgroup])
+        return [self._sorted(labels) for labels in found]
+
+
+CLASSIFIER = ESPIClassifier()
+
+
+def espi_type_for(labels) -> ESPIType:
+    """Handling type of an announcement with these labels (ESPILabels or their values)."""
+    labels = {ESPILabel(label) for label in labels}
+    if ESPILabel.PERIODIC_REPORT in labels:
+        return ESPIType.RESULTS
+    if ESPILabel.MAR_NOTIFICATION in labels or ESPILabel.SHARE_DISPOSAL in labels:
+        return ESPIType.SHARES
+    return ESPIType.GENERAL
 
-import requests
-from bs4 import BeautifulSoup
 
+def classify_espi_type(title: str) -> ESPIType:
+    return espi_type_for(CLASSIFIER.classify(title))
 
-class ESPIType(Enum):
-    RESULTS = "📊 Wyniki finansowe"
-    SHARES = "📈 Operacja na akcjach"
-    GENERAL = "ℹ️ Informacja"
 
-def classify_espi_type(title: str) -> ESPIType:
-    if "raport okresowy" in title:
-        return ESPIType.RESULTS
+def label_announcements(announcements: list) -> list:
+    """Stores the label values with every announcement that has none yet, classified as one batch."""
+    unlabeled = [announcement for announcement in announcements if announcement.get("labels") is None]
+    if unlabeled:
+        for announcement, labels in zip(unlabeled, CLASSIFIER.classify_many([a.get("title", "") for a in unlabeled])):
+            announcement["labels"] = [label.value for label in labels]
+    return announcements
 
-    if ("Zawiadomienia w trybie art. 19 ust. 1 rozporządzenia MAR".lower() in title) or ("Zbycie akcji".lower() in title):
-        return ESPIType.SHARES
 
-    return ESPIType.GENERAL
+def announcement_labels(announcement) -> list:
+    """Label values of an announcement, classifying it if it was stored before labels existed."""
+    labels = announcement.get("labels")
+    if labels is None:
+        labels = [label.value for label in CLASSIFIER.classify(announcement.get("title", ""))]
+    return labels
+
+
+def espi_type_of(announcement) -> ESPIType:
+    return espi_type_for(announcement_labels(announcement))
 
 def handle_new_espi(espi:dict):
-    espi_type = classify_espi_type(espi["title"].lower())
-    espi_url = f"https://biznes.pap.pl{espi['url']}"
+    espi_type = espi_type_of(espi)
+    espi_url = f"{PAP_BASE_URL}{espi['url']}"
     if espi_type == ESPIType.RESULTS:
         return handle_results_espi(espi_url)
 
     if espi_type == ESPIType.SHARES:
-        return f"https://biznes.pap.pl/{espi['url']}\n"+handle_general_espi(espi_url)
+        return format_shares_espi(espi_url, handle_general_espi(espi_url))
 
     if espi_type == ESPIType.GENERAL:
         return handle_general_espi(espi_url)
 
 
-
+def format_shares_espi(url, text):
+    return f"{url}\n" + (text or "")
 
 
 def handle_results_espi(url):
-    headers = {"User-Agent": "Mozilla/5.0"}
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
+    html = fetch_page(url, ARTICLE_TTL)
+    if html is None:
         return None
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    table = soup.find("table")
-    rows = table.find_all("tr")
+    return parse_results_espi(html)
 
-    results = []
-    for row in rows:
-        cols = [td.get_text(strip=True) for td in row.find_all("td")]
 
-        results.append(cols)
+def parse_results_espi(html):
+    results = extract_table_rows(html)
 
     r = ""
     for t in results:
@@ -61,16 +158,17 @@ def handle_shares_espi(url):
     raise NotImplementedError
 
 def handle_general_espi(url):
-    headers = {"User-Agent": "Mozilla/5.0"}
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
+    html = fetch_page(url, ARTICLE_TTL)
+    if html is None:
         return None
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    article = soup.find("article")
-    paragraphs = article.find_all("p")[:-3]
+    return parse_general_espi(html)
+
+
+def parse_general_espi(html):
+    paragraphs = extract_article_paragraphs(html)[:-3]
 
-    text = "\n\n".join(p.get_text(strip=True) for p in paragraphs)
+    text = "\n\n".join(paragraphs)
 
     return text
 
@@ -0,0 +1,115 @@
+"""Targeted extraction of the few elements the bot reads from PAP pages.
+
+Instead of building a full BeautifulSoup tree of the whole page, the HTML is cut down to the
+single <table> or <article> we need and only that fragment is parsed with lxml.
+"""
+import lxml.html
+
+
+def _fragment(html: str, tag: str, last_close: bool = False):
+    """Parses the first <tag> element of a page, or returns None if there is none."""
+    start = html.find(f"<{tag}")
+    if start == -1:
+        return None
+    close = f"</{tag}>"
+    end = html.rfind(close) if last_close else html.find(close, start)
+    if end == -1:
+        # Unclosed element, let lxml find it in the whole page
+        element = lxml.html.fromstring(html).find(f".//{tag}")
+        return element
+    return lxml.html.fromstring(html[start:end + len(close)])
+
+
+def _text(element) -> str:
+    """Same as BeautifulSoup's .text.strip()."""
+    return element.text_content().strip()
+
+
+def _stripped_text(element) -> str:
+    """Same as BeautifulSoup's .get_text(strip=True)."""
+    return "".join(piece.strip() for piece in element.itertext())
+
+
+def _body_rows(html: str) -> list:
+    table = _fragment(html, "table")
+    if table is None:
+        return []
+    tbody = table.find(".//tbody")
+    if tbody is None:
+        return []
+    return tbody.findall(".//tr")
+
+
+def _announcement_row(row):
+    """(announcement, company link, company name) of a listing <tr>, None if it isn't an announcement."""
+    cols = row.findall(".//td")
+    if len(cols) < 4:
+        return None
+    company = _text(cols[2])
+    company_link = cols[2].find(".//a")
+    return ({
+        "date": _text(cols[0]),
+        "time": _text(cols[1]),
+        "company": company,
+        "title": _text(cols[3]),
+        "url": cols[3].find(".//a").get("href"),
+    }, company_link.get("href", "") if company_link is not None else "", company)
+
+
+def extract_announcement_rows(html: str) -> list:
+    """Rows of an ESPI listing table as (announcement, company link, company name) tuples."""
+    return [data for data in map(_announcement_row, _body_rows(html)) if data is not None]
+
+
+def iter_announcement_rows(html: str):
+    """Lazy extract_announcement_rows: every <tr> is cut out and parsed on its own when it's reached.
+
+    Callers that stop early, like the incremental diff, never parse the rest of the table.
+    """
+    start = html.find("<table")
+    body = html.find("<tbody", start) if start != -1 else -1
+    body_end = html.find("</tbody>", body) if body != -1 else -1
+    if body_end == -1:
+        # Not the usual markup, parse the whole table instead
+        yield from extract_announcement_rows(html)
+        return
+    position = body
+    while True:
+        row_start = html.find("<tr", position, body_end)
+        if row_start == -1:
+            return
+        row_end = html.find("</tr>", row_start, body_end)
+        row_end = body_end if row_end == -1 else row_end + len("</tr>")
+        position = row_end
+        row = lxml.html.fromstring(f"<table>{html[row_start:row_end]}</table>").find(".//tr")
+        data = _announcement_row(row) if row is not None else None
+        if data is not None:
+            yield data
+
+
+def extract_company_name(html: str) -> str | None:
+    """Company name from the second row of an ESPI listing table."""
+    rows = _body_rows(html)
+    if len(rows) < 2:
+        return None
+    cols = rows[1].findall(".//td")
+    if len(cols) < 4:
+        return None
+    a_tag = cols[2].find(".//a")
+    return _text(a_tag) if a_tag is not None else None
+
+
+def extract_table_rows(html: str) -> list:
+    """Cell texts of every row of the first table on a page."""
+    table = _fragment(html, "table")
+    if table is None:
+        return []
+    return [[_stripped_text(td) for td in row.findall(".//td")] for row in table.iter("tr")]
+
+
+def extract_article_paragraphs(html: str) -> list:
+    """Texts of all paragraphs of the <article> element."""
+    article = _fragment(html, "article", last_close=True)
+    if article is None:
+        return []
+    return [_stripped_text(p) for p in article.iter("p")]
@@ -0,0 +1,300 @@
+import asyncio
+import hashlib
+import time
+
+import aiohttp
+from decouple import config
+
+from utils.espi_classifier import ESPIType, espi_type_of, format_shares_espi, parse_general_espi, parse_results_espi
+from utils.history import Watermark, history_keys
+from utils.http_cache import MISSING, RESPONSE_CACHE, ResponseCache
+from utils.metrics import METRICS, Metrics
+from utils.results import parse_results_page
+from utils.scheduler import RateLimiter
+from utils.utils import (ARTICLE_TTL, ESPI_FEED_PATH, HEADERS, PAP_BASE_URL, diff_listing, filter_new_espies, parse_company_name, parse_espi_announcements,
+                         parse_espi_feed, parse_pdf_links)
+
+MAX_CONCURRENCY = 10
+REQUEST_TIMEOUT = 20
+# Listings are diffed incrementally from their watermark, with a full scan this often (0 always scans)
+FULL_SCAN_INTERVAL = config("ESPI_FULL_SCAN_INTERVAL", default=60 * 60, cast=float)
+# A listing not polled for this long is scanned in full, e.g. after the loop stalled
+MAX_POLL_GAP = 2 * 60 * 60
+
+
+def table_digest(html: str) -> str:
+    """Hashes the first <table> of a page, ignoring the rest of the markup."""
+    start = html.find("<table")
+    end = html.find("</table>", start)
+    fragment = html[start:end] if start != -1 and end != -1 else html
+    return hashlib.sha1(fragment.encode("utf-8")).hexdigest()
+
+
+def timed(function, *args):
+    """Runs function(*args), returns its result and how long it took."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+class ESPIFetcher:
+    """Async Biznes PAP client sharing one keep-alive session and a concurrency limit.
+
+    Pages and their parsed results go through a ResponseCache, and concurrent requests
+    for the same page share a single download and parse. An optional RateLimiter caps the
+    requests per second of everything sent to PAP. Request latencies, parse times and
+    response outcomes are recorded in `metrics`. Article and feed URLs are built from
+    `base_url`, so the fetcher can be pointed at a stand-in of the site.
+
+    `inform_new_espies` reads a changed listing only down to the first known announcement,
+    with a full scan every `full_scan_interval` seconds, after a gap in polling and after
+    `invalidate`.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, timeout: float = REQUEST_TIMEOUT,
+                 cache: ResponseCache = RESPONSE_CACHE, rate_limiter: RateLimiter | None = None,
+                 metrics: Metrics = METRICS, base_url: str = PAP_BASE_URL,
+                 full_scan_interval: float = FULL_SCAN_INTERVAL):
+        self.max_concurrency = max_concurrency
+        self.base_url = base_url
+        self.feed_url = f"{base_url}{ESPI_FEED_PATH}"
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        # (url, parser name or None) -> task
+        self._in_flight = {}
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+        # url -> (ETag, Last-Modified, hash of the announcements table)
+        self._validators = {}
+        self.full_scan_interval = full_scan_interval
+        # url -> (Watermark of the newest row, last full scan, last poll) on the monotonic clock
+        self._watermarks = {}
+        self.stats = {"conditional_requests": 0, "not_modified": 0, "unchanged": 0, "changed": 0}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _throttle(self):
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+
+    async def _parse(self, parser, *args):
+        """Runs a CPU bound parser off the event loop and records how long it took."""
+        result, seconds = await asyncio.to_thread(timed, parser, *args)
+        self.metrics.observe("parse_seconds", seconds, parser=parser.__name__)
+        return result
+
+    def _error(self, endpoint: str, url: str, reason):
+        self.metrics.inc("fetch_errors_total", endpoint=endpoint)
+        print(f"Error during request {url}: {reason}")
+
+    def _shared(self, key, factory):
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._in_flight[key] = asyncio.ensure_future(factory())
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return asyncio.shield(task)
+
+    async def fetch(self, url: str, ttl: float | None = None) -> str | None:
+        """Returns a page from the cache or downloads it, None on errors and non-200 responses."""
+        cached = self.cache.get(url, ttl)
+        if cached is not None:
+            return cached
+        return await self._shared((url, None), lambda: self._download(url))
+
+    async def _fetch_parsed(self, url: str, parser, ttl: float | None = None):
+        """Returns parser(page), parsing each cached page at most once."""
+        parsed = self.cache.get_parsed(url, parser.__name__, ttl)
+        if parsed is not MISSING:
+            return parsed
+
+        async def fetch_and_parse():
+            # get_parsed already counted this lookup as a miss
+            html = self.cache.peek(url, ttl)
+            if html is None:
+                html = await self._shared((url, None), lambda: self._download(url))
+            if html is None:
+                return None
+            # Parsing is CPU bound, keep it off the event loop
+            result = await self._parse(parser, html)
+            self.cache.set_parsed(url, parser.__name__, result)
+            return result
+
+        return await self._shared((url, parser.__name__), fetch_and_parse)
+
+    async def _download(self, url: str) -> str | None:
+        session = self._get_session()
+        async with self._semaphore:
+            await self._throttle()
+            start = time.perf_counter()
+            try:
+                async with session.get(url) as response:
+                    if response.status != 200:
+                        self._error("page", url, f"HTTP {response.status}")
+                        return None
+                    html = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._error("page", url, repr(e))
+                return None
+            finally:
+                self.metrics.observe("fetch_seconds", time.perf_counter() - start, endpoint="page")
+        self.cache.set(url, html)
+        return html
+
+    async def fetch_bytes(self, url: str) -> bytes | None:
+        """Downloads a binary attachment (not cached), returns None on errors."""
+        session = self._get_session()
+        async with self._semaphore:
+            await self._throttle()
+            start = time.perf_counter()
+            try:
+                async with session.get(url) as response:
+                    if response.status != 200:
+                        self._error("attachment", url, f"HTTP {response.status}")
+                        return None
+                    return await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._error("attachment", url, repr(e))
+                return None
+            finally:
+                self.metrics.observe("fetch_seconds", time.perf_counter() - start, endpoint="attachment")
+
+    async def fetch_if_changed(self, url: str) -> tuple[bool, str | None]:
+        """Conditional fetch of a listing page.
+
+        Returns (False, None) when the server answered 304 or the announcements table
+        hashes the same as last time, so callers can skip parsing and diffing.
+        """
+        etag, last_modified, digest = self._validators.get(url, (None, None, None))
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        endpoint = "feed" if url == self.feed_url else "listing"
+        session = self._get_session()
+        async with self._semaphore:
+            await self._throttle()
+            start = time.perf_counter()
+            try:
+                async with session.get(url, headers=headers) as response:
+                    self.stats["conditional_requests"] += 1
+                    if response.status == 304:
+                        self._count_listing("not_modified")
+                        return False, None
+                    if response.status != 200:
+                        self._error(endpoint, url, f"HTTP {response.status}")
+                        return True, None
+                    html = await response.text()
+                    etag = response.headers.get("ETag")
+                    last_modified = response.headers.get("Last-Modified")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._error(endpoint, url, repr(e))
+                return True, None
+            finally:
+                self.metrics.observe("fetch_seconds", time.perf_counter() - start, endpoint=endpoint)
+
+        new_digest = table_digest(html)
+        self._validators[url] = (etag, last_modified, new_digest)
+        if new_digest == digest:
+            self._count_listing("unchanged")
+            return False, None
+        self._count_listing("changed")
+        self.cache.set(url, html)
+        return True, html
+
+    def _count_listing(self, outcome: str):
+        self.stats[outcome] += 1
+        self.metrics.inc("listing_responses_total", outcome=outcome)
+
+    def invalidate(self, url: str):
+        """Forgets the validators of a page so the next conditional fetch parses it again, in full."""
+        self._validators.pop(url, None)
+        self._watermarks.pop(url, None)
+
+    async def get_espi_announcements(self, url: str) -> list:
+        announcements = await self._fetch_parsed(url, parse_espi_announcements)
+        return [] if announcements is None else announcements
+
+    async def get_espi_feed(self, url: str, name_to_id: dict) -> list | None:
+        """Fetches the all-companies listing.
+
+        Returns None if it couldn't be downloaded and an empty list if it didn't change.
+        """
+        changed, html = await self.fetch_if_changed(url)
+        if not changed:
+            return []
+        if html is None:
+            return None
+        return await self._parse(parse_espi_feed, html, name_to_id)
+
+    def _needs_full_scan(self, url: str, now: float) -> bool:
+        state = self._watermarks.get(url)
+        if self.full_scan_interval <= 0 or state is None:
+            return True
+        _, full_scan_at, polled_at = state
+        return now - full_scan_at > self.full_scan_interval or now - polled_at > MAX_POLL_GAP
+
+    async def inform_new_espies(self, url: str, company_espi_history: list, seen: set | None = None, cutoff=None) -> list:
+        now = time.monotonic()
+        full_scan = self._needs_full_scan(url, now)
+        changed, html = await self.fetch_if_changed(url)
+        if not changed and url in self._watermarks:
+            watermark, full_scan_at, _ = self._watermarks[url]
+            self._watermarks[url] = (watermark, full_scan_at, now)
+        if html is None:
+            return []
+
+        seen = history_keys(company_espi_history) if seen is None else seen
+        if full_scan:
+            announcements = await self._parse(parse_espi_announcements, html)
+            self.cache.set_parsed(url, parse_espi_announcements.__name__, announcements)
+            watermark = Watermark.of(announcements[0]) if announcements else None
+            full_scan_at = now
+        else:
+            watermark, full_scan_at, _ = self._watermarks[url]
+            announcements, newest = await self._parse(diff_listing, html, seen, watermark)
+            watermark = newest or watermark
+        self.metrics.inc("listing_scans_total", mode="full" if full_scan else "incremental")
+        self._watermarks[url] = (watermark, full_scan_at, now)
+        return filter_new_espies(announcements, company_espi_history, seen, cutoff)
+
+    async def get_company_name(self, url: str) -> str | None:
+        return await self._fetch_parsed(url, parse_company_name)
+
+    async def handle_results_espi(self, url: str) -> str | None:
+        return await self._fetch_parsed(url, parse_results_espi, ARTICLE_TTL)
+
+    async def get_results(self, url: str) -> list:
+        """Normalized financial data of a periodic report, see utils.results."""
+        rows = await self._fetch_parsed(url, parse_results_page, ARTICLE_TTL)
+        return [] if rows is None else rows
+
+    async def handle_general_espi(self, url: str) -> str | None:
+        return await self._fetch_parsed(url, parse_general_espi, ARTICLE_TTL)
+
+    async def get_pdf_links(self, url: str) -> list:
+        links = await self._fetch_parsed(url, parse_pdf_links, ARTICLE_TTL)
+        return [] if links is None else links
+
+    async def handle_new_espi(self, espi: dict) -> str | None:
+        """Async counterpart of espi_classifier.handle_new_espi."""
+        espi_type = espi_type_of(espi)
+        espi_url = f"{self.base_url}{espi['url']}"
+        if espi_type == ESPIType.RESULTS:
+            return await self.handle_results_espi(espi_url)
+
+        if espi_type == ESPIType.SHARES:
+            return format_shares_espi(espi_url, await self.handle_general_espi(espi_url))
+
+        return await self.handle_general_espi(espi_url)
@@ -0,0 +1,180 @@
+import hashlib
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+DATE_FORMATS = ("%Y-%m-%d %H:%M", "%d.%m.%Y %H:%M", "%Y-%m-%d", "%d.%m.%Y")
+# A few dozen label combinations cover every row, each is kept once
+LABEL_TUPLES = {}
+
+
+class ESPIRecord:
+    """Compact, slotted copy of an announcement kept in the in-memory history.
+
+    Company names, dates and times repeat across thousands of rows, so they are interned.
+    """
+
+    __slots__ = ("date", "time", "company", "title", "url", "labels")
+
+    def __init__(self, date="", time="", company="", title="", url="", labels=None):
+        self.date = sys.intern(date)
+        self.time = sys.intern(time)
+        self.company = sys.intern(company)
+        self.title = title
+        self.url = url
+        # Label values from utils.espi_classifier, None for rows stored before labels existed
+        self.labels = None if labels is None else _intern_labels(labels)
+
+    @classmethod
+    def from_dict(cls, announcement):
+        if isinstance(announcement, ESPIRecord):
+            return announcement
+        return cls(
+            announcement.get("date", ""),
+            announcement.get("time", ""),
+            announcement.get("company", ""),
+            announcement.get("title", ""),
+            announcement.get("url", ""),
+            announcement.get("labels"),
+        )
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def to_dict(self) -> dict:
+        data = {"date": self.date, "time": self.time, "company": self.company, "title": self.title, "url": self.url}
+        if self.labels is not None:
+            data["labels"] = list(self.labels)
+        return data
+
+    def __eq__(self, other):
+        if isinstance(other, ESPIRecord):
+            return self.to_dict() == other.to_dict()
+        return NotImplemented
+
+    def __repr__(self):
+        return f"ESPIRecord({self.date} {self.time} {self.title!r})"
+
+
+def _intern_labels(labels) -> tuple:
+    key = tuple(labels)
+    return LABEL_TUPLES.setdefault(key, tuple(sys.intern(label) for label in key))
+
+
+@dataclass
+class RetentionPolicy:
+    """How much history is kept per company for dedupe; 0 disables a limit."""
+    max_entries: int = 0
+    max_days: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.max_days > 0
+
+
+def announcement_key(announcement) -> str:
+    """Stable identity of an announcement: its article url, or a hash of date, time and title."""
+    url = announcement.get("url")
+    if url:
+        return url
+    raw = f"{announcement.get('date')}|{announcement.get('time')}|{announcement.get('title')}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def announcement_timestamp(announcement) -> datetime | None:
+    """Publication time of an announcement, None if the date can't be parsed."""
+    date = announcement.get("date") or ""
+    time = announcement.get("time") or ""
+    for value in (f"{date} {time}", date):
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(value.strip(), date_format)
+            except ValueError:
+                continue
+    return None
+
+
+@dataclass(frozen=True)
+class Watermark:
+    """Newest announcement seen on a company listing: its identity and publication time."""
+    key: str
+    published: datetime | None
+
+    @classmethod
+    def of(cls, announcement) -> "Watermark":
+        return cls(announcement_key(announcement), announcement_timestamp(announcement))
+
+
+def history_keys(company_espi_history: list) -> set:
+    """Builds the dedupe index of a single company history."""
+    return {announcement_key(announcement) for announcement in company_espi_history}
+
+
+def build_history_index(espi_history: dict) -> dict:
+    """Builds the dedupe index for every company, e.g. after loading the history from disk."""
+    return {number: history_keys(history) for number, history in espi_history.items()}
+
+
+def compact_history(espi_history: dict) -> dict:
+    """Replaces announcement dicts with ESPIRecords in place."""
+    for number, history in espi_history.items():
+        espi_history[number] = [ESPIRecord.from_dict(announcement) for announcement in history]
+    return espi_history
+
+
+def compact_messages(pinned_stocks: dict) -> dict:
+    """Keeps only the ids (and channels) of pinned messages, the only ones the tracker needs later (to unpin)."""
+    for company_data in pinned_stocks.values():
+        company_data["messages"] = [
+            {"id": msg["id"], "channel": msg["channel"], "pinned": True} if "channel" in msg else {"id": msg["id"], "pinned": True}
+            for msg in company_data.get("messages", [])
+            if msg.get("pinned") and "id" in msg
+        ]
+    return pinned_stocks
+
+
+def apply_retention(company_espi_history: list, policy: RetentionPolicy, now: datetime | None = None) -> list:
+    """Returns the part of a company history kept by the retention policy, in the original order."""
+    if not policy.enabled:
+        return company_espi_history
+
+    timestamps = [announcement_timestamp(announcement) or datetime.min for announcement in company_espi_history]
+    keep = set(range(len(company_espi_history)))
+
+    if policy.max_days > 0:
+        oldest = (now or datetime.now()) - timedelta(days=policy.max_days)
+        keep = {i for i in keep if timestamps[i] >= oldest}
+        if not keep and company_espi_history:
+            # The newest entry always stays, it is what history_cutoff is computed from
+            keep = {max(range(len(timestamps)), key=lambda i: timestamps[i])}
+
+    if policy.max_entries > 0 and len(keep) > policy.max_entries:
+        newest = sorted(keep, key=lambda i: timestamps[i], reverse=True)
+        # Rows published in the same minute as the oldest kept one stay too: history_cutoff
+        # can't tell them apart, so a dropped one would be announced again
+        oldest = timestamps[newest[policy.max_entries - 1]]
+        keep = {i for i in newest if timestamps[i] >= oldest}
+
+    if len(keep) == len(company_espi_history):
+        return company_espi_history
+    return [announcement for i, announcement in enumerate(company_espi_history) if i in keep]
+
+
+def newest_announcement(company_espi_history: list):
+    """Latest published entry of a history, None for an empty one.
+
+    Histories hold each fetched page newest first, one after another, so neither end is the newest.
+    """
+    if not company_espi_history:
+        return None
+    return max(company_espi_history, key=lambda announcement: announcement_timestamp(announcement) or datetime.min)
+
+
+def history_cutoff(company_espi_history: list) -> datetime | None:
+    """Oldest publication time still in a history.
+
+    Once older entries are dropped by retention, listing rows older than this are
+    treated as already seen instead of being announced again.
+    """
+    timestamps = [ts for ts in map(announcement_timestamp, company_espi_history) if ts is not None]
+    return min(timestamps) if timestamps else None
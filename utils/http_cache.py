@@ -0,0 +1,108 @@
+import hashlib
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from decouple import config
+
+MISSING = object()
+
+
+class ResponseCache:
+    """In-memory LRU of page bodies keyed by URL, bounded by entry count, total size and age.
+
+    Parsed results can be stored next to a body, so a page is parsed at most once while it
+    is fresh. With `cache_dir` bodies are also written to disk and survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024, ttl: float = 30,
+                 cache_dir=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        # url -> [stored_at, text, {parser name: parsed result}]
+        self._entries = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_path(self, url: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.html"
+
+    def _entry(self, url: str, ttl: float | None):
+        ttl = self.ttl if ttl is None else ttl
+        entry = self._entries.get(url)
+        if entry is not None and time.monotonic() - entry[0] <= ttl:
+            self._entries.move_to_end(url)
+            return entry
+
+        if self.cache_dir is not None:
+            path = self._disk_path(url)
+            if path.exists():
+                age = time.time() - path.stat().st_mtime
+                if age <= ttl:
+                    # A body larger than the memory bound is evicted right away but still returned
+                    return self._store(url, path.read_text(encoding="utf-8"), stored_at=time.monotonic() - age)
+        return None
+
+    def peek(self, url: str, ttl: float | None = None) -> str | None:
+        """Like `get`, without counting the lookup, e.g. after a counted `get_parsed` miss."""
+        entry = self._entry(url, ttl)
+        return None if entry is None else entry[1]
+
+    def get(self, url: str, ttl: float | None = None) -> str | None:
+        """Returns the cached body if it is younger than `ttl` (the cache default if None)."""
+        text = self.peek(url, ttl)
+        if text is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return text
+
+    def get_parsed(self, url: str, parser: str, ttl: float | None = None):
+        """Returns a parsed result stored with a fresh body, or MISSING."""
+        entry = self._entry(url, ttl)
+        if entry is None or parser not in entry[2]:
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        return entry[2][parser]
+
+    def set_parsed(self, url: str, parser: str, result):
+        entry = self._entries.get(url)
+        if entry is not None:
+            entry[2][parser] = result
+
+    def set(self, url: str, text: str):
+        self._store(url, text)
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_path(url).write_text(text, encoding="utf-8")
+
+    def _store(self, url: str, text: str, stored_at: float | None = None) -> list:
+        self.invalidate(url, disk=False)
+        entry = self._entries[url] = [time.monotonic() if stored_at is None else stored_at, text, {}]
+        self._size += len(text)
+        while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+        return entry
+
+    def invalidate(self, url: str, disk: bool = True):
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+        if disk and self.cache_dir is not None:
+            self._disk_path(url).unlink(missing_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared by the async fetcher and the blocking helpers in utils.utils
+RESPONSE_CACHE = ResponseCache(
+    max_entries=config("ESPI_CACHE_ENTRIES", default=512, cast=int),
+    ttl=config("ESPI_CACHE_TTL", default=30, cast=float),
+    cache_dir=config("ESPI_CACHE_DIR", default="") or None,
+)
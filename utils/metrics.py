@@ -0,0 +1,217 @@
+"""In-process metrics of the polling loop: counters, latency histograms and gauges.
+
+Recording is a dict lookup and a bisect, cheap enough for the hot path. The numbers are
+shown by the !stats command and, with ESPI_METRICS_PORT set, served in the Prometheus
+text format on http://127.0.0.1:<port>/metrics.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from aiohttp import web
+
+# Upper bounds in seconds, from a fast parse to a slow PAP response
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PREFIX = "espi_"
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    """Counts observations in fixed buckets, Prometheus style."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation (the largest bucket if it's in +Inf)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+class Metrics:
+    """Registry of counters, histograms and gauges, each keyed by a name and optional labels."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        # name -> callable returning the current value, read when the metrics are shown
+        self.gauges = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def gauge(self, name: str, read):
+        """Registers (or replaces) a gauge read from `read()`."""
+        self.gauges[name] = read
+
+    def counter(self, name: str, **labels) -> float:
+        return self.counters.get(_key(name, labels), 0)
+
+    def histogram(self, name: str, **labels) -> Histogram | None:
+        return self.histograms.get(_key(name, labels))
+
+    def series(self, name: str, label: str) -> dict:
+        """Label value -> counter value or histogram, for every series of a metric."""
+        source = self.histograms if name.endswith("_seconds") else self.counters
+        return {dict(labels).get(label): value for (metric, labels), value in source.items() if metric == name}
+
+    def read_gauges(self) -> dict:
+        values = {}
+        for name, read in self.gauges.items():
+            try:
+                values[name] = read()
+            except Exception as e:
+                print(f"Error reading gauge {name}: {e!r}")
+        return values
+
+    def reset(self):
+        self.counters.clear()
+        self.histograms.clear()
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), value in sorted(self.counters.items()):
+            declare(name, "counter")
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}")
+            lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {histogram.count}")
+
+        for name, value in sorted(self.read_gauges().items()):
+            declare(name, "gauge")
+            lines.append(f"{PREFIX}{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def format_seconds(seconds: float) -> str:
+    return f"{seconds * 1000:.0f} ms" if seconds < 1 else f"{seconds:.1f} s"
+
+
+def format_histogram(histogram: Histogram) -> str:
+    return (f"n={histogram.count} mean={format_seconds(histogram.mean)} "
+            f"p50≤{format_seconds(histogram.quantile(0.5))} p95≤{format_seconds(histogram.quantile(0.95))}")
+
+
+def format_stats(metrics: "Metrics", names: dict | None = None, top_errors: int = 5) -> str:
+    """Plain-text summary for the !stats command, `names` maps company ids to display names."""
+    lines = []
+    tick = metrics.histogram("tick_seconds")
+    if tick is not None:
+        lines.append(f"Tick: {format_histogram(tick)}")
+
+    for title, name, label in (("Fetch", "fetch_seconds", "endpoint"), ("Parse", "parse_seconds", "parser")):
+        for value, histogram in sorted(metrics.series(name, label).items()):
+            lines.append(f"{title} {value}: {format_histogram(histogram)}")
+
+    for title, name in (("Classify", "classify_seconds"), ("Discord send", "send_seconds")):
+        histogram = metrics.histogram(name)
+        if histogram is not None:
+            lines.append(f"{title}: {format_histogram(histogram)}")
+
+    gauges = metrics.read_gauges()
+    if gauges:
+        lines.append(", ".join(f"{name}: {value:g}" for name, value in sorted(gauges.items())))
+
+    errors = metrics.series("company_errors_total", "company")
+    if errors:
+        worst = sorted(errors.items(), key=lambda item: -item[1])[:top_errors]
+        lines.append(f"Errors ({sum(errors.values()):g}): " + ", ".join(f"{(names or {}).get(company, company)} {count:g}"
+                                                                    for company, count in worst))
+    return "\n".join(lines) or "No metrics recorded yet."
+
+
+class MetricsServer:
+    """Serves the registry on GET /metrics for a local Prometheus scraper."""
+
+    def __init__(self, metrics: "Metrics", host: str = "127.0.0.1", port: int = 9108):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def _handle(self, request):
+        return web.Response(text=self.metrics.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self):
+        """Binds the server to the running loop, so it's started from the loop the bot runs on."""
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Port 0 picks a free port
+        self.port = site._server.sockets[0].getsockname()[1]
+        print(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+METRICS = Metrics()
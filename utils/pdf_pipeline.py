@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import math
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import urljoin
+
+from utils.storage import load_json, save_json
+from utils.utils import read_pdf_and_parse
+
+PDF_DIR = Path("pdf_cache")
+PDF_RESULTS_FILE = "pdf_results.json"
+PDF_WORKERS = 2
+PDF_QUEUE_SIZE = 32
+PDF_TIMEOUT = 60
+
+
+def format_transaction_data(data: dict) -> str:
+    """One-line summary of the data parsed from a MAR art. 19 notification."""
+    def known(value):
+        return value is not None and not (isinstance(value, float) and math.isnan(value))
+
+    parts = []
+    if known(data.get("position")):
+        parts.append(str(data["position"]))
+    if data.get("transaction_mode") == "purchase":
+        parts.append("🟢 nabycie" + (" (program motywacyjny)" if data.get("incentive") is True else ""))
+    elif data.get("transaction_mode") == "disposal":
+        parts.append("🔴 zbycie")
+    return "🧾 " + " · ".join(parts) if parts else ""
+
+
+class PDFPipeline:
+    """Downloads PDF attachments of announcements and parses them with camelot in worker processes.
+
+    Jobs go through a bounded queue and each parse has a timeout, so slow documents never block
+    the message path. Results are cached by the SHA-256 of the PDF content.
+    """
+
+    def __init__(self, fetcher, workers: int = PDF_WORKERS, queue_size: int = PDF_QUEUE_SIZE,
+                 timeout: float = PDF_TIMEOUT, pdf_dir=PDF_DIR, results_file=PDF_RESULTS_FILE,
+                 parse=read_pdf_and_parse):
+        self.fetcher = fetcher
+        self.workers = workers
+        self.timeout = timeout
+        self.pdf_dir = Path(pdf_dir)
+        self.results_file = results_file
+        self.parse = parse
+        self.results = load_json(results_file)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        # article url -> contexts of a queued job, so an article posted to many channels is processed once
+        self._waiting = {}
+        self._executor = None
+        self._tasks = []
+        self._on_result = None
+
+    def start(self, on_result):
+        """Starts the consumers; `on_result(context, results)` is awaited for every finished job."""
+        self._on_result = on_result
+        # Consumers that ended, e.g. cancelled with the loop they ran on, are started again
+        if not self._tasks or all(task.done() for task in self._tasks):
+            self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, article_url: str, context) -> bool:
+        """Queues the attachments of an article, returns False if the queue is full."""
+        if article_url in self._waiting:
+            self._waiting[article_url].append(context)
+            return True
+        try:
+            self.queue.put_nowait(article_url)
+        except asyncio.QueueFull:
+            print(f"PDF queue full, skipping {article_url}")
+            return False
+        self._waiting[article_url] = [context]
+        return True
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _reset_executor(self):
+        # A timed out camelot job can't be cancelled, so its worker processes are killed instead
+        if self._executor is not None:
+            for process in list(getattr(self._executor, "_processes", {}).values()):
+                process.terminate()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _consume(self):
+        while True:
+            article_url = await self.queue.get()
+            try:
+                results = await self.process_article(article_url)
+                # Contexts submitted while the job ran are answered too
+                contexts = self._waiting.pop(article_url, [])
+                if results and self._on_result is not None:
+                    for context in contexts:
+                        await self._on_result(context, results)
+            except Exception as e:
+                self._waiting.pop(article_url, None)
+                print(f"Error while processing PDFs of {article_url}: {e!r}")
+            finally:
+                self.queue.task_done()
+
+    async def process_article(self, article_url: str) -> list:
+        """Parses every PDF attached to an article, returns the parsed dicts."""
+        results = []
+        for href, _ in await self.fetcher.get_pdf_links(article_url):
+            data = await self.process_pdf(urljoin(article_url, href))
+            if data is not None:
+                results.append(data)
+        return results
+
+    async def process_pdf(self, pdf_url: str) -> dict | None:
+        content = await self.fetcher.fetch_bytes(pdf_url)
+        if content is None:
+            return None
+
+        digest = hashlib.sha256(content).hexdigest()
+        if digest in self.results:
+            return self.results[digest]
+
+        self.pdf_dir.mkdir(parents=True, exist_ok=True)
+        pdf_file = self.pdf_dir / f"{digest}.pdf"
+        pdf_file.write_bytes(content)
+
+        loop = asyncio.get_running_loop()
+        try:
+            data = await asyncio.wait_for(loop.run_in_executor(self._get_executor(), self.parse, str(pdf_file)),
+                                          self.timeout)
+        except asyncio.TimeoutError:
+            print(f"Parsing {pdf_url} timed out after {self.timeout}s")
+            self._reset_executor()
+            return None
+        except Exception as e:
+            print(f"Error while parsing {pdf_url}: {e!r}")
+            return None
+        finally:
+            pdf_file.unlink(missing_ok=True)
+
+        self.results[digest] = data
+        save_json(self.results_file, self.results)
+        return data
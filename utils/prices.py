@@ -0,0 +1,174 @@
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from decouple import config
+
+from utils.metrics import METRICS, Metrics
+
+# "yfinance", "off", or the path of a JSON file of {ticker: [price, previous close]}
+PRICE_SOURCE = config("ESPI_PRICE_SOURCE", default="yfinance")
+# One batched request for every tracked ticker per interval
+PRICE_INTERVAL = config("ESPI_PRICE_INTERVAL", default=60, cast=float)
+# Quotes older than this aren't shown, e.g. after the source stopped answering
+PRICE_TTL = config("ESPI_PRICE_TTL", default=3 * 60, cast=float)
+# GPW tickers are listed on Yahoo Finance with this suffix
+YAHOO_SUFFIX = ".WA"
+
+
+@dataclass(frozen=True)
+class Quote:
+    price: float
+    previous_close: float | None = None
+    fetched_at: float = 0.0
+
+    @property
+    def change(self) -> float | None:
+        """Change since the previous session's close, in percent."""
+        if not self.previous_close:
+            return None
+        return (self.price / self.previous_close - 1) * 100
+
+
+def ticker_map(ticker_to_id: dict) -> dict:
+    """Company id -> GPW ticker, the inverse of decoders/ticker_to_id.json."""
+    return {number: ticker for ticker, number in ticker_to_id.items()}
+
+
+def format_price(quote: Quote | None) -> str:
+    """'45.20 zł ▲ 1.32%', or an empty string without a quote."""
+    if quote is None:
+        return ""
+    text = f"{quote.price:,.2f} zł".replace(",", " ")
+    change = quote.change
+    if change is None:
+        return text
+    arrow = "▲" if change > 0.005 else "▼" if change < -0.005 else "■"
+    return f"{text} {arrow} {abs(change):.2f}%"
+
+
+class YFinanceSource:
+    """Daily bars of the last few sessions from Yahoo Finance, for all tickers in one `yf.download` call.
+
+    During a session the last bar's close is the latest (delayed) price.
+    """
+
+    def __init__(self, suffix: str = YAHOO_SUFFIX):
+        self.suffix = suffix
+
+    def fetch(self, tickers: list) -> dict:
+        # yfinance imports pandas, so it's loaded with the first refresh
+        import yfinance as yf
+
+        symbols = {f"{ticker}{self.suffix}": ticker for ticker in tickers}
+        data = yf.download(list(symbols), period="5d", interval="1d", group_by="ticker",
+                           auto_adjust=False, progress=False)
+        quotes = {}
+        for symbol, ticker in symbols.items():
+            try:
+                closes = data[symbol]["Close"].dropna()
+            except KeyError:
+                continue
+            if closes.empty:
+                continue
+            previous = float(closes.iloc[-2]) if len(closes) > 1 else None
+            quotes[ticker] = (float(closes.iloc[-1]), previous)
+        return quotes
+
+
+class StaticPriceSource:
+    """Local stand-in for tests, benchmarks and offline runs.
+
+    Serves `quotes` ({ticker: (price, previous close)}) or, with `path`, the JSON file read on every
+    fetch, so the prices can be changed while the bot runs.
+    """
+
+    def __init__(self, quotes: dict | None = None, path=None):
+        self.quotes = quotes or {}
+        self.path = Path(path) if path is not None else None
+        self.requests = 0
+
+    def fetch(self, tickers: list) -> dict:
+        self.requests += 1
+        quotes = self.quotes
+        if self.path is not None:
+            with open(self.path, encoding="utf-8") as f:
+                quotes = json.load(f)
+        return {ticker: tuple(quotes[ticker]) for ticker in tickers if ticker in quotes}
+
+
+def create_price_source(name: str = PRICE_SOURCE):
+    """The source named by ESPI_PRICE_SOURCE, None if prices are turned off."""
+    if not name or name.lower() in ("off", "none"):
+        return None
+    if name.lower() == "yfinance":
+        return YFinanceSource()
+    return StaticPriceSource(path=name)
+
+
+class PriceService:
+    """Price snapshots of the tracked companies, refreshed in the background.
+
+    Every refresh asks the source for all tickers at once, and messages read the cached
+    quotes, so announcements never wait on a price request. `source` is anything with a
+    blocking `fetch(tickers)` returning {ticker: (price, previous close)}; it runs in a thread.
+    """
+
+    def __init__(self, source, ticker_to_id: dict | None = None, interval: float = PRICE_INTERVAL,
+                 ttl: float = PRICE_TTL, metrics: Metrics = METRICS, clock=time.monotonic):
+        self.source = source
+        self.tickers = ticker_map(ticker_to_id or {})
+        self.interval = interval
+        self.ttl = ttl
+        self.metrics = metrics
+        self.clock = clock
+        # ticker -> Quote
+        self.quotes = {}
+        self._task = None
+
+    def quote(self, number: str) -> Quote | None:
+        """The cached quote of a company, None if there's none or it's older than the TTL."""
+        quote = self.quotes.get(self.tickers.get(number))
+        if quote is None or self.clock() - quote.fetched_at > self.ttl:
+            return None
+        return quote
+
+    def price_line(self, number: str) -> str:
+        return format_price(self.quote(number))
+
+    async def refresh(self, numbers) -> int:
+        """Fetches the quotes of the given companies in one request, returns how many came back."""
+        tickers = sorted({self.tickers[number] for number in numbers if number in self.tickers})
+        if self.source is None or not tickers:
+            return 0
+        self.metrics.inc("price_requests_total")
+        with self.metrics.timer("price_refresh_seconds"):
+            fetched = await asyncio.to_thread(self.source.fetch, tickers)
+        now = self.clock()
+        for ticker, (price, previous_close) in fetched.items():
+            self.quotes[ticker] = Quote(price, previous_close, now)
+        return len(fetched)
+
+    def start(self, numbers):
+        """Refreshes the quotes of `numbers()` every interval until closed."""
+        # A task that ended, e.g. cancelled with the loop it ran on, is started again
+        if self.source is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run(numbers))
+
+    async def _run(self, numbers):
+        while True:
+            try:
+                await self.refresh(list(numbers()))
+            except Exception as e:
+                # Messages go out without prices until the source answers again
+                print(f"Price refresh failed: {e!r}")
+                self.metrics.inc("price_errors_total")
+            await asyncio.sleep(self.interval)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
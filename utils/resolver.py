@@ -0,0 +1,175 @@
+import bisect
+import json
+import re
+import unicodedata
+from functools import cached_property
+from pathlib import Path
+
+from rapidfuzz import fuzz, process
+
+DECODERS_DIR = Path("decoders")
+LEGAL_SUFFIXES = {"sa", "se", "plc", "asi", "nv", "ab", "as", "spa", "ag", "ltd"}
+FUZZY_CUTOFF = 90
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, fold diacritics and punctuation and drop legal-form suffixes like SA or plc."""
+    name = name.lower().replace("ł", "l")
+    name = "".join(c for c in unicodedata.normalize("NFKD", name) if not unicodedata.combining(c))
+    words = re.sub(r"[^\w]+", " ", name).split()
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+class CompanyResolver:
+    """Resolves user input (id, ticker, symbol or company name) to a PAP company id.
+
+    All indexes are built once, so a lookup is a few dict hits and at most one fuzzy
+    search over pre-processed choices. `suggest` is cheap enough for slash-command
+    autocomplete on every keystroke.
+    """
+
+    def __init__(self, stock_id: dict, ticker_to_id: dict, symbol_to_id: dict,
+                 ticker_to_symbol: dict | None = None, sets: dict | None = None):
+        self.stock_id = stock_id
+        self.symbol_index = {symbol.upper(): number for symbol, number in symbol_to_id.items()}
+        self.ticker_index = {ticker.upper(): number for ticker, number in ticker_to_id.items()}
+
+        # Tickers without their own id mapping can still be resolved through their symbol
+        known_tickers = set(ticker_to_symbol or {}) | set((sets or {}).get("tickers", []))
+        for ticker in known_tickers:
+            symbol = (ticker_to_symbol or {}).get(ticker, "").upper()
+            if ticker.upper() not in self.ticker_index and symbol in self.symbol_index:
+                self.ticker_index[ticker.upper()] = self.symbol_index[symbol]
+
+        self.tickers_by_id = {}
+        for ticker, number in sorted(self.ticker_index.items()):
+            self.tickers_by_id.setdefault(number, ticker)
+
+        self.name_to_id = {name.lower(): number for number, name in stock_id.items()}
+
+        self.choice_ids = list(stock_id.keys())
+        self.choices = [stock_id[number].lower() for number in self.choice_ids]
+
+    # Indexes below are only needed past the exact lookups, so they are built on first use
+
+    @cached_property
+    def normalized_choices(self) -> list:
+        return [normalize_name(self.stock_id[number]) for number in self.choice_ids]
+
+    @cached_property
+    def normalized_index(self) -> dict:
+        normalized = {}
+        for key, number in zip(self.normalized_choices, self.choice_ids):
+            normalized.setdefault(key, []).append(number)
+        # Only unambiguous normalized names are used as exact matches
+        return {key: numbers[0] for key, numbers in normalized.items() if len(numbers) == 1}
+
+    @cached_property
+    def prefix_entries(self) -> list:
+        """Sorted (key, id) pairs of names, word starts, tickers and symbols."""
+        prefix_entries = set()
+        for key, number in zip(self.normalized_choices, self.choice_ids):
+            prefix_entries.add((key, number))
+            for i, char in enumerate(key):
+                # Every word start, so "bit" finds "11 bit studios"
+                if char != " " and i > 0 and key[i - 1] == " ":
+                    prefix_entries.add((key[i:], number))
+        for ticker, number in self.ticker_index.items():
+            prefix_entries.add((ticker.lower(), number))
+        for symbol, number in self.symbol_index.items():
+            prefix_entries.add((symbol.lower(), number))
+        return sorted(prefix_entries)
+
+    @cached_property
+    def prefix_keys(self) -> list:
+        return [key for key, _ in self.prefix_entries]
+
+    @classmethod
+    def from_files(cls, decoders_dir=DECODERS_DIR):
+        def load(name):
+            path = Path(decoders_dir) / name
+            if not path.exists():
+                return {}
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        return cls(load("stock_id.json"), load("ticker_to_id.json"), load("symbol_to_id.json"),
+                   load("ticker_to_symbol.json"), load("sets.json"))
+
+    def label(self, number: str) -> str:
+        ticker = self.tickers_by_id.get(number)
+        name = self.stock_id.get(number, number)
+        return f"{name} ({ticker})" if ticker else name
+
+    def resolve(self, input_str: str) -> str:
+        """Returns the company id, raises ValueError if the input is ambiguous or unknown."""
+        # 1. Direct number
+        if input_str.isdigit() and input_str in self.stock_id:
+            return input_str
+
+        # 2. Ticker
+        key = input_str.upper()
+        if key in self.ticker_index:
+            return self.ticker_index[key]
+
+        # 3. Short name
+        if key in self.symbol_index:
+            return self.symbol_index[key]
+
+        # 4. Full name, exact and then fuzzy
+        if input_str.lower() in self.name_to_id:
+            return self.name_to_id[input_str.lower()]
+
+        normalized = normalize_name(input_str)
+        if normalized in self.normalized_index:
+            return self.normalized_index[normalized]
+
+        matches = process.extract(input_str.lower(), self.choices, scorer=fuzz.ratio, score_cutoff=FUZZY_CUTOFF)
+        if not matches:
+            # Typos are easier to catch without the legal form and diacritics
+            matches = [(self.choices[index], score, index) for _, score, index in
+                       process.extract(normalized, self.normalized_choices, scorer=fuzz.ratio, score_cutoff=FUZZY_CUTOFF)]
+
+        if len(matches) == 1:
+            return self.choice_ids[matches[0][2]]
+
+        if len(matches) > 1:
+            options = [match[0] for match in matches]
+            raise ValueError(f"Ambiguous company name. Did you mean: {', '.join(options)}?")
+
+        raise ValueError("Unrecognized company identifier.")
+
+    def suggest(self, text: str, limit: int = 10) -> list:
+        """Top `limit` (company id, label) suggestions for a partial input."""
+        query = normalize_name(text)
+        if not query:
+            return []
+
+        found = []
+        seen = set()
+
+        def add(number):
+            if number not in seen and number in self.stock_id:
+                seen.add(number)
+                found.append(number)
+
+        for exact in (self.ticker_index.get(text.upper()), self.symbol_index.get(text.upper()),
+                      text if text in self.stock_id else None):
+            if exact is not None:
+                add(exact)
+
+        start = bisect.bisect_left(self.prefix_keys, query)
+        end = bisect.bisect_right(self.prefix_keys, query + "\uffff")
+        for _, number in sorted(self.prefix_entries[start:end], key=lambda entry: len(entry[0])):
+            add(number)
+            if len(found) >= limit:
+                break
+
+        if len(found) < limit:
+            for _, _, index in process.extract(query, self.normalized_choices, scorer=fuzz.WRatio,
+                                               limit=limit, score_cutoff=60):
+                add(self.choice_ids[index])
+
+        return [(number, self.label(number)) for number in found[:limit]]
@@ -0,0 +1,367 @@
+import importlib.util
+import math
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from decouple import config
+
+from utils.extract import extract_table_rows
+from utils.history import announcement_timestamp
+
+# Saved as Parquet when pyarrow or fastparquet is installed, as a pickle next to it otherwise
+RESULTS_FILE = config("ESPI_RESULTS_FILE", default="espi_results.parquet")
+COLUMNS = ["company", "published", "url", "metric", "label", "period", "period_end", "value", "currency"]
+# Discord messages are capped at 2000 characters
+MESSAGE_LIMIT = 1900
+COMPARE_LIMIT = 20
+
+# Row label fragment -> metric, the more specific fragments first
+METRICS = [
+    ("wartość księgowa na jedną akcję", "book_value_per_share"),
+    ("na jedną akcję", "eps"),
+    ("na akcję", "eps"),
+    ("liczba akcji", "shares"),
+    ("przychody", "revenue"),
+    ("z działalności operacyjnej", "operating_profit"),
+    ("zysk (strata) brutto", "gross_profit"),
+    ("zysk (strata) netto", "net_profit"),
+    ("aktywa razem", "total_assets"),
+    ("aktywa obrotowe", "current_assets"),
+    ("aktywa trwałe", "fixed_assets"),
+    ("zobowiązania długoterminowe", "long_term_liabilities"),
+    ("zobowiązania krótkoterminowe", "short_term_liabilities"),
+    ("zobowiązania", "liabilities"),
+    ("kapitał własny", "equity"),
+    ("kapitał zakładowy", "share_capital"),
+]
+# Cash flow rows are told apart by the activity
+CASH_FLOWS = [
+    ("operacyjnej", "operating_cash_flow"),
+    ("inwestycyjnej", "investing_cash_flow"),
+    ("finansowej", "financing_cash_flow"),
+]
+METRIC_NAMES = {
+    "revenue": "Przychody",
+    "operating_profit": "Zysk operacyjny",
+    "gross_profit": "Zysk brutto",
+    "net_profit": "Zysk netto",
+    "operating_cash_flow": "CF operacyjny",
+    "investing_cash_flow": "CF inwestycyjny",
+    "financing_cash_flow": "CF finansowy",
+    "cash_flow": "CF razem",
+    "total_assets": "Aktywa",
+    "current_assets": "Aktywa obrotowe",
+    "fixed_assets": "Aktywa trwałe",
+    "liabilities": "Zobowiązania",
+    "long_term_liabilities": "Zob. długoterminowe",
+    "short_term_liabilities": "Zob. krótkoterminowe",
+    "equity": "Kapitał własny",
+    "share_capital": "Kapitał zakładowy",
+    "shares": "Liczba akcji",
+    "eps": "EPS",
+    "book_value_per_share": "BVPS",
+}
+# Metrics that are not amounts of money, so the table's "w tys." doesn't apply
+PER_SHARE = {"eps", "book_value_per_share"}
+COUNTS = {"shares"}
+
+UNIT_PATTERN = re.compile(r"\b(tys|mln|mld)\.?\s*(zł|pln|eur|usd)|\b(zł|pln|eur|usd)\b", re.IGNORECASE)
+SCALES = {"tys": 1e3, "mln": 1e6, "mld": 1e9}
+CURRENCIES = {"zł": "PLN", "pln": "PLN", "eur": "EUR", "usd": "USD"}
+YEAR_PATTERN = re.compile(r"\b(19|20)\d{2}\b")
+LETTER_PATTERN = re.compile(r"[^\W\d_]")
+# Period kind -> (suffix, month the period ends in)
+PERIODS = [
+    ("3 kwartały", "Q1-3", 9),
+    ("półrocze", "H1", 6),
+    ("iv kwartał", "Q4", 12),
+    ("iii kwartał", "Q3", 9),
+    ("ii kwartał", "Q2", 6),
+    ("i kwartał", "Q1", 3),
+    ("4 kwartał", "Q4", 12),
+    ("3 kwartał", "Q3", 9),
+    ("2 kwartał", "Q2", 6),
+    ("1 kwartał", "Q1", 3),
+    ("rok", "", 12),
+]
+# Reports often show a quarter next to the year to date ending in the same month, the quarter is listed first
+KIND_ORDER = {"Q1": 0, "Q2": 0, "Q3": 0, "Q4": 0, "H1": 1, "": 2, "Q1-3": 3}
+
+
+def normalize_metric(label: str) -> str:
+    """Metric of a results table row, e.g. 'Zysk (strata) netto' -> 'net_profit'.
+
+    Rows that aren't recognised keep their label, lowercased.
+    """
+    text = " ".join(label.lower().split())
+    if text.startswith("przepływy pieniężne"):
+        return next((metric for fragment, metric in CASH_FLOWS if fragment in text), "cash_flow")
+    return next((metric for fragment, metric in METRICS if fragment in text), text)
+
+
+def normalize_period(text: str):
+    """'półrocze / 2024' -> ('2024H1', 202406). Periods without a year are (None, None)."""
+    match = YEAR_PATTERN.search(text)
+    if match is None:
+        return None, None
+    year = match.group(0)
+    lowered = text.lower()
+    suffix, month = next(((suffix, month) for fragment, suffix, month in PERIODS if fragment in lowered), ("", 12))
+    return f"{year}{suffix}", int(year) * 100 + month
+
+
+def parse_unit(text: str):
+    """'w tys. zł' -> (1000.0, 'PLN'), (None, None) if the cell names no currency."""
+    match = UNIT_PATTERN.search(text)
+    if match is None:
+        return None, None
+    scale, currency = (match.group(1), match.group(2)) if match.group(2) else (None, match.group(3))
+    return SCALES.get((scale or "").lower(), 1.0), CURRENCIES[currency.lower()]
+
+
+def parse_number(text: str) -> float | None:
+    """'1 234,5' -> 1234.5, '(12)' -> -12.0, None for empty cells and dashes."""
+    text = text.replace("\xa0", "").replace(" ", "").replace(",", ".")
+    negative = text.startswith("(") and text.endswith(")")
+    text = text.strip("()").replace("−", "-").replace("–", "-")
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def parse_results_table(rows: list) -> list:
+    """Normalized rows of a "selected financial data" table, see utils.extract.extract_table_rows.
+
+    The unit row ('w tys. zł', 'w tys. EUR') and the period row ('półrocze / 2024') are read
+    for their columns, every other row becomes one dict per numeric cell:
+    metric, label, period, period_end, value (in units, not thousands) and currency.
+    """
+    units = {}
+    periods = {}
+    parsed = []
+    for cells in rows:
+        if len(cells) < 2:
+            continue
+        column_units = [parse_unit(cell) for cell in cells[1:]]
+        if any(currency for _, currency in column_units):
+            unit = (None, None)
+            for column, cell_unit in enumerate(column_units, start=1):
+                # A unit spans the columns up to the next one
+                unit = cell_unit if cell_unit[1] else unit
+                units[column] = unit
+            continue
+        values = [cell for cell in cells[1:] if cell]
+        # A bare year is only taken for a period before the first period row
+        if values and all(YEAR_PATTERN.search(cell) and (LETTER_PATTERN.search(cell) or not periods) for cell in values):
+            periods = {column: normalize_period(cell) for column, cell in enumerate(cells[1:], start=1)}
+            continue
+
+        label = " ".join(cells[0].split())
+        if not label:
+            continue
+        metric = normalize_metric(label)
+        for column, cell in enumerate(cells[1:], start=1):
+            value = parse_number(cell)
+            period, period_end = periods.get(column, (None, None))
+            if value is None or period is None:
+                continue
+            scale, currency = units.get(column, (1.0, None))
+            if metric in COUNTS:
+                scale, currency = 1.0, None
+            elif metric in PER_SHARE:
+                scale = 1.0
+            parsed.append({"metric": metric, "label": label, "period": period, "period_end": period_end,
+                           "value": value * (scale or 1.0), "currency": currency})
+    return parsed
+
+
+def parse_results_page(html: str) -> list:
+    """Normalized rows of the results table of a periodic report page."""
+    return parse_results_table(extract_table_rows(html))
+
+
+def resolve_metric(text: str) -> str:
+    """Metric named by a user: its key, its display name or a row label ('zysk (strata) netto')."""
+    text = " ".join(text.lower().split())
+    for metric, name in METRIC_NAMES.items():
+        if text in (metric, name.lower()):
+            return metric
+    return normalize_metric(text)
+
+
+def parquet_available() -> bool:
+    return any(importlib.util.find_spec(engine) is not None for engine in ("pyarrow", "fastparquet"))
+
+
+class ResultsStore:
+    """Normalized financial results of periodic reports, one row per company, report, metric and period.
+
+    Rows live in a single pandas DataFrame saved as Parquet (a pickle when no Parquet engine
+    is installed). Summaries for `!results` and `!compare` are recomputed when reports are
+    added, which happens a few times a day, so the commands only look them up.
+
+    pandas is imported and the file read on first use, keeping both out of the bot's startup.
+    Methods may run in worker threads (see asyncio.to_thread), a lock keeps them in turn.
+    """
+
+    def __init__(self, path=RESULTS_FILE):
+        self.path = Path(path)
+        if not parquet_available():
+            self.path = self.path.with_suffix(".pkl")
+        self.dirty = False
+        self.latest = {}
+        self.by_metric = {}
+        self._frame = None
+        self._lock = threading.RLock()
+
+    @property
+    def frame(self):
+        return self.load()
+
+    def load(self):
+        """Reads the store and computes its summaries, done on first use. Returns the DataFrame."""
+        with self._lock:
+            if self._frame is None:
+                self._frame = self._read()
+                self._aggregate()
+        return self._frame
+
+    def _read(self):
+        import pandas as pd
+
+        if not self.path.exists():
+            return pd.DataFrame(columns=COLUMNS)
+        try:
+            if self.path.suffix == ".pkl":
+                return pd.read_pickle(self.path)
+            return pd.read_parquet(self.path)
+        except Exception as e:
+            print(f"Failed to read {self.path}: {e}")
+            return pd.DataFrame(columns=COLUMNS)
+
+    def save(self):
+        """Writes the store if reports were added since the last save."""
+        with self._lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            if self.path.suffix == ".pkl":
+                self.frame.to_pickle(tmp)
+            else:
+                self.frame.to_parquet(tmp, index=False)
+            tmp.replace(self.path)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def add(self, number: str, announcement: dict, rows: list) -> int:
+        """Stores the rows of a report, replacing the ones stored for it before. Returns the row count."""
+        import pandas as pd
+
+        if not rows:
+            return 0
+        report = pd.DataFrame(rows)
+        report.insert(0, "company", number)
+        report.insert(1, "published", pd.Timestamp(announcement_timestamp(announcement) or datetime.now()))
+        report.insert(2, "url", announcement["url"])
+        report["value"] = report["value"].astype("float64")
+        report["period_end"] = report["period_end"].astype("int64")
+
+        with self._lock:
+            frame = self.frame[self.frame["url"] != announcement["url"]]
+            self._frame = pd.concat([frame, report[COLUMNS]], ignore_index=True) if len(frame) else report[COLUMNS]
+            self.dirty = True
+            self._aggregate()
+        return len(report)
+
+    def _aggregate(self):
+        """Precomputes the latest values of every company metric with their year-ago values.
+
+        A quarter and the year to date ending with it ('III kwartał 2025', '3 kwartały 2025') are
+        kept apart, each compared with the same kind of period a year earlier.
+        """
+        frame = self._frame
+        if frame.empty:
+            self.latest, self.by_metric = {}, {}
+            return
+        # NaN currencies would never match in the merge
+        frame = frame.fillna({"currency": ""}).sort_values(["published", "period_end"])
+        frame = frame.drop_duplicates(["company", "metric", "currency", "period"], keep="last")
+        # Periods are the year followed by the kind, e.g. '2025Q1-3'
+        frame = frame.assign(kind=frame["period"].str[4:])
+        # Newest period of each company metric, one row per kind of period ending then
+        newest = frame.groupby(["company", "metric", "currency"])["period_end"].transform("max")
+        current = frame[frame["period_end"] == newest]
+        current = current.assign(previous_period=(current["period"].str[:4].astype(int) - 1).astype(str) + current["kind"])
+        previous = frame[["company", "metric", "currency", "period", "value"]].rename(
+            columns={"value": "previous", "period": "previous_period"})
+        summary = current.merge(previous, on=["company", "metric", "currency", "previous_period"], how="left")
+        summary["change"] = (summary["value"] - summary["previous"]) / summary["previous"].abs()
+        summary = summary.assign(order=summary["kind"].map(KIND_ORDER).fillna(len(KIND_ORDER)))
+        summary = summary.sort_values("order", kind="stable")
+        summary = summary[["company", "metric", "label", "period", "value", "previous", "change", "currency", "published"]]
+
+        self.latest = {number: rows.reset_index(drop=True) for number, rows in summary.groupby("company", sort=False)}
+        # Companies are ranked by one period each, the quarter when the report has one
+        ranked = summary.drop_duplicates(["company", "metric", "currency"])
+        self.by_metric = {metric: rows.sort_values("value", ascending=False).reset_index(drop=True)
+                          for metric, rows in ranked.groupby("metric", sort=False)}
+
+    def company(self, number: str, currency: str = "PLN"):
+        """Latest results of a company as a DataFrame, amounts in `currency` (counts have no currency)."""
+        self.load()
+        rows = self.latest.get(number)
+        if rows is None:
+            return None
+        return rows[rows["currency"].isin([currency, ""])]
+
+    def compare(self, metric: str, numbers=None, currency: str = "PLN"):
+        """Latest value of a metric for every company (or `numbers`) as a DataFrame, largest first."""
+        self.load()
+        rows = self.by_metric.get(metric)
+        if rows is None:
+            return None
+        rows = rows[rows["currency"].isin([currency, ""])]
+        if numbers is not None:
+            rows = rows[rows["company"].isin(list(numbers))]
+        return rows
+
+
+def format_value(value: float, metric: str) -> str:
+    if math.isnan(value):
+        return "-"
+    if metric in PER_SHARE:
+        return f"{value:,.2f}".replace(",", " ")
+    if metric in COUNTS or abs(value) < 1e6:
+        return f"{value:,.0f}".replace(",", " ")
+    return f"{value / 1e6:,.1f} mln".replace(",", " ")
+
+
+def format_change(change: float) -> str:
+    return "" if math.isnan(change) else f"{change * 100:+.0f}%"
+
+
+def format_results(name: str, rows) -> str:
+    """Fixed-width summary of a company's latest results for a Discord code block."""
+    lines = [f"{name}, {rows['period'].iloc[0]} ({rows['published'].iloc[0]:%Y-%m-%d})"]
+    # A quarter shown with the year to date gets a period column
+    periods = rows["period"].nunique() > 1
+    for row in rows.itertuples():
+        label = METRIC_NAMES.get(row.metric, row.label)[:24]
+        period = f"{row.period:>9}" if periods else ""
+        lines.append(f"{label:<24}{period}{format_value(row.value, row.metric):>16}{format_change(row.change):>8}")
+    return "\n".join(lines)[:MESSAGE_LIMIT]
+
+
+def format_compare(metric: str, rows, names: dict) -> str:
+    """Fixed-width ranking of companies by a metric for a Discord code block."""
+    lines = [f"{METRIC_NAMES.get(metric, metric)} ({rows['currency'].iloc[0] or 'szt.'})"]
+    for rank, row in enumerate(rows.head(COMPARE_LIMIT).itertuples(), start=1):
+        name = names.get(row.company, row.company)[:22]
+        lines.append(f"{rank:>3}. {name:<22}{row.period:>8}{format_value(row.value, metric):>14}{format_change(row.change):>8}")
+    return "\n".join(lines)[:MESSAGE_LIMIT]
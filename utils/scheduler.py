@@ -0,0 +1,191 @@
+"""Per-company polling schedule driven by the Warsaw market calendar and publication history."""
+import asyncio
+import heapq
+import random
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from utils.history import announcement_timestamp
+
+WARSAW = ZoneInfo("Europe/Warsaw")
+MIN_INTERVAL = 15
+MAX_INTERVAL = 60 * 60
+JITTER = 0.1
+# Annual reports are due by April, Q1 in May, H1 in August/September and Q3 in November
+REPORTING_MONTHS = {3, 4, 5, 8, 9, 11}
+REPORTING_SEASON_FACTOR = 0.75
+ACTIVITY_WINDOW = timedelta(days=30)
+ACTIVE_COMPANY_REPORTS = 8
+# Dormant companies are polled at the base interval during the session, any of them may publish
+SESSION_HOURS = (9, 17)
+DORMANT_FACTOR = 3.0
+
+# (from hour, to hour, interval in seconds) on trading days. Most ESPI reports are published
+# before the session and right after it closes at 17:00, during the session it's never above
+# the 60 s every company used to be polled at
+TRADING_DAY_INTERVALS = [
+    (0, 6, 1800),
+    (6, 9, 60),
+    (9, 16, 60),
+    (16, 19, 30),
+    (19, 22, 300),
+    (22, 24, 1800),
+]
+# Same for weekends and exchange holidays
+CLOSED_DAY_INTERVALS = [
+    (0, 6, 3600),
+    (6, 22, 1800),
+    (22, 24, 3600),
+]
+
+
+def easter_sunday(year: int) -> date:
+    """Gregorian Easter date (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def gpw_holidays(year: int) -> set:
+    """Weekdays the Warsaw Stock Exchange is closed on."""
+    easter = easter_sunday(year)
+    fixed = [(1, 1), (1, 6), (5, 1), (5, 3), (8, 15), (11, 1), (11, 11), (12, 24), (12, 25), (12, 26), (12, 31)]
+    return {date(year, month, day) for month, day in fixed} | {
+        easter - timedelta(days=2),  # Good Friday
+        easter + timedelta(days=1),  # Easter Monday
+        easter + timedelta(days=60),  # Corpus Christi
+    }
+
+
+def is_trading_day(day: date) -> bool:
+    return day.weekday() < 5 and day not in gpw_holidays(day.year)
+
+
+def warsaw_now() -> datetime:
+    """Current Warsaw wall-clock time as a naive datetime, like PAP announcement dates."""
+    return datetime.now(WARSAW).replace(tzinfo=None)
+
+
+def market_interval(now: datetime) -> float:
+    """Base polling interval in seconds for a Warsaw wall-clock time."""
+    trading_day = is_trading_day(now.date())
+    intervals = TRADING_DAY_INTERVALS if trading_day else CLOSED_DAY_INTERVALS
+    interval = next(seconds for start, end, seconds in intervals if start <= now.hour < end)
+    if trading_day and now.month in REPORTING_MONTHS and 6 <= now.hour < 22:
+        interval *= REPORTING_SEASON_FACTOR
+    return interval
+
+
+def activity_factor(company_espi_history: list, now: datetime) -> float:
+    """Polls companies that publish often twice as often and dormant ones three times less.
+
+    During the session on trading days dormant companies keep the base interval.
+    """
+    # Each batch of new rows is appended newest first, so the history isn't sorted by time
+    timestamps = map(announcement_timestamp, company_espi_history)
+    recent = sum(1 for published in timestamps if published is not None and now - published <= ACTIVITY_WINDOW)
+    if recent >= ACTIVE_COMPANY_REPORTS:
+        return 0.5
+    if recent == 0:
+        in_session = is_trading_day(now.date()) and SESSION_HOURS[0] <= now.hour < SESSION_HOURS[1]
+        return 1.0 if in_session else DORMANT_FACTOR
+    return 1.0
+
+
+def poll_interval(company_espi_history: list | None = None, now: datetime | None = None, rng=random) -> float:
+    """Seconds until the next poll of a company (or of the feed, without a history)."""
+    now = now or warsaw_now()
+    interval = market_interval(now)
+    if company_espi_history is not None:
+        interval *= activity_factor(company_espi_history, now)
+    interval = min(max(interval, MIN_INTERVAL), MAX_INTERVAL)
+    # Jitter keeps companies with the same interval from being polled in one burst
+    return interval * rng.uniform(1 - JITTER, 1 + JITTER)
+
+
+class PollScheduler:
+    """Priority queue of keys (company ids) ordered by their next due time on the monotonic clock.
+
+    Rescheduling or removing a key leaves its old heap entry behind, stale entries are skipped
+    when they come up. Both clocks can be replaced, e.g. to replay a day faster than real time.
+    """
+
+    def __init__(self, clock=time.monotonic, wall_clock=warsaw_now):
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self._heap = []
+        self._due = {}
+
+    def __contains__(self, key) -> bool:
+        return key in self._due
+
+    def __len__(self):
+        return len(self._due)
+
+    def schedule(self, key, delay: float, now: float | None = None):
+        due = (self.clock() if now is None else now) + delay
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, key))
+
+    def reschedule(self, key, company_espi_history: list | None = None):
+        """Schedules the next poll of a key after its adaptive interval, see poll_interval."""
+        self.schedule(key, poll_interval(company_espi_history, self.wall_clock()))
+
+    def add_missing(self, keys, now: float | None = None):
+        """Schedules keys that aren't scheduled yet as due immediately."""
+        for key in keys:
+            if key not in self._due:
+                self.schedule(key, 0, now)
+
+    def remove(self, key):
+        self._due.pop(key, None)
+
+    def next_due(self) -> float | None:
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float | None = None) -> list:
+        """Removes and returns every key that is due, most overdue first."""
+        now = self.clock() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, key = heapq.heappop(self._heap)
+            if self._due.get(key) == due_at:
+                del self._due[key]
+                due.append(key)
+        return due
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` requests a second on average and bursts of up to `burst`.
+
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
@@ -0,0 +1,204 @@
+import heapq
+import json
+import math
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+from decouple import config
+
+from utils.history import announcement_timestamp
+
+# Every indexed announcement is one JSON line, appended as it's indexed
+SEARCH_INDEX_FILE = config("ESPI_SEARCH_INDEX_FILE", default="espi_search.jsonl")
+SEARCH_LIMIT = 10
+# Title words count this many times over words of the article body
+TITLE_WEIGHT = 3
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Polish letters are folded by table, NFKD is only needed for the rare other ones (and doesn't decompose ł)
+FOLD = str.maketrans({**dict(zip("ąćęłńóśźż", "acelnoszz")), "đ": "d", "ß": "ss"})
+STOPWORDS = {
+    "a", "aby", "ale", "do", "i", "ich", "jak", "jako", "jest", "jej", "jego", "lub", "na", "nie", "o", "od",
+    "oraz", "po", "pod", "przez", "przy", "sa", "sie", "tak", "te", "ten", "to", "tym", "w", "we", "z", "za",
+    "ze", "zl", "nr", "r", "spolka", "spolki",
+}
+# Inflection endings, longest first, cut once if the stem keeps at least MIN_STEM letters
+SUFFIXES = sorted([
+    "owie", "ami", "ach", "owi", "ego", "emu", "ymi", "imi", "ych", "ich", "iem", "iej", "ow",
+    "om", "em", "ej", "ie", "ia", "iu", "a", "e", "i", "o", "u", "y",
+], key=len, reverse=True)
+MIN_STEM = 4
+SINCE_PATTERN = re.compile(r"^(\d+)\s*([dwmy])$")
+SINCE_DAYS = {"d": 1, "w": 7, "m": 30, "y": 365}
+
+
+def fold(text: str) -> str:
+    """Lowercase text without Polish diacritics: 'Zbycie AKCJI przez Członka' -> 'zbycie akcji przez czlonka'."""
+    text = text.lower().translate(FOLD)
+    if text.isascii():
+        return text
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+# The vocabulary of announcements is small, most words were stemmed before
+@lru_cache(maxsize=1 << 16)
+def stem(token: str) -> str:
+    """Cuts one inflection ending: 'akcji', 'akcja', 'akcje' -> 'akcj'. Numbers are kept."""
+    if token.isdigit():
+        return token
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> list:
+    """Search terms of a text: folded, stemmed, without stopwords."""
+    return [stem(token) for token in TOKEN_PATTERN.findall(fold(text)) if token not in STOPWORDS]
+
+
+def parse_since(text: str) -> datetime:
+    """'2025-01-31' or a relative '30d' / '2w' / '6m' / '1y', raises ValueError otherwise."""
+    match = SINCE_PATTERN.match(text.strip().lower())
+    if match:
+        return datetime.now() - timedelta(days=int(match.group(1)) * SINCE_DAYS[match.group(2)])
+    try:
+        return datetime.strptime(text.strip(), "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"Can't read the date '{text}', use YYYY-MM-DD or e.g. 30d.") from None
+
+
+class SearchIndex:
+    """Inverted index over announcement titles and article texts, ranked with BM25.
+
+    Adding an announcement touches only the postings of its own terms and appends one line
+    to the index file on `flush`, so indexing costs scale with the new announcements. The
+    postings are rebuilt from the file on startup.
+    """
+
+    def __init__(self, path=SEARCH_INDEX_FILE):
+        self.path = Path(path)
+        # term -> {document id: weighted term frequency}
+        self.postings = {}
+        # document id -> (company, url, title, published), ids are positions in these lists
+        self.documents = []
+        self.lengths = []
+        self.ids = {}
+        self.total_length = 0
+        # BM25 length normalization per document, recomputed on the first search after an add
+        self._norms = None
+        self._pending = []
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash, the announcement is indexed again when seen
+                    continue
+                self._index(entry["company"], entry["url"], entry["title"], entry["published"], entry["terms"])
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, url):
+        return url in self.ids
+
+    def _index(self, company, url, title, published, terms: dict):
+        doc_id = len(self.documents)
+        self.ids[url] = doc_id
+        self.documents.append((company, url, title, published))
+        length = sum(terms.values())
+        self.lengths.append(length)
+        self.total_length += length
+        self._norms = None
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+
+    def add(self, number: str, announcement, text: str | None = None) -> bool:
+        """Indexes an announcement with its article text, returns False if it's already indexed."""
+        url = announcement.get("url", "")
+        if not url or url in self.ids:
+            return False
+        title = announcement.get("title", "")
+        terms = {}
+        for term in tokenize(title):
+            terms[term] = terms.get(term, 0) + TITLE_WEIGHT
+        for term in tokenize(text or ""):
+            terms[term] = terms.get(term, 0) + 1
+        published = announcement_timestamp(announcement)
+        published = published.isoformat() if published else ""
+        self._index(number, url, title, published, terms)
+        self._pending.append({"company": number, "url": url, "title": title, "published": published, "terms": terms})
+        return True
+
+    def add_history(self, espi_history: dict) -> int:
+        """Indexes the titles of history entries that aren't indexed yet, e.g. on the first start."""
+        added = 0
+        for number, history in espi_history.items():
+            for announcement in history:
+                added += self.add(number, announcement)
+        return added
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending)
+
+    def flush(self):
+        """Appends the announcements indexed since the last flush to the index file."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in pending)
+
+    def search(self, query: str, numbers=None, since: datetime | None = None, limit: int = SEARCH_LIMIT) -> list:
+        """Best matches as (score, company, url, title, published) tuples, best first.
+
+        `numbers` limits the results to these companies and `since` to announcements published since then.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.documents:
+            return []
+        numbers = set(numbers) if numbers is not None else None
+        since = since.isoformat() if since is not None else None
+        count = len(self.documents)
+        if self._norms is None:
+            average = self.total_length / count or 1
+            self._norms = [K1 * (1 - B + B * length / average) for length in self.lengths]
+        norms = self._norms
+
+        scores = {}
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            weight = idf * (K1 + 1)
+            for doc_id, frequency in postings.items():
+                scores[doc_id] = scores.get(doc_id, 0) + weight * frequency / (frequency + norms[doc_id])
+
+        documents = self.documents
+        matches = ((score, *documents[doc_id]) for doc_id, score in scores.items()
+                   if (numbers is None or documents[doc_id][0] in numbers)
+                   and (since is None or documents[doc_id][3] >= since))
+        return heapq.nlargest(limit, matches, key=lambda match: match[0])
+
+
+def format_search_results(results: list, names: dict, base_url: str) -> str:
+    """Numbered result list, links wrapped in <> so Discord doesn't unfurl them."""
+    lines = []
+    for rank, (_, company, url, title, published) in enumerate(results, start=1):
+        lines.append(f"{rank}. {published[:10]} **{names.get(company, company)}** {title}\n<{base_url}{url}>")
+    return "\n".join(lines)
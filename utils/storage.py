@@ -0,0 +1,282 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+from peewee import BigIntegerField, BooleanField, CharField, Model, SqliteDatabase, TextField, chunked
+
+from utils.history import ESPIRecord, announcement_key
+
+ESPI_HISTORY_FILE = "espi_history.json"
+PINNED_STOCKS_FILE = "pinned_stocks.json"
+SUBSCRIPTIONS_FILE = "subscriptions.json"
+ESPI_DB_FILE = "espi.db"
+
+
+def load_json(file):
+    """Load JSON data from a file."""
+    if Path(file).exists():
+        with open(file, "r") as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                print(f"Warning: {file} is corrupted or empty. Resetting data.")
+                return {}  # Return an empty dictionary if JSON is invalid
+    return {}
+
+
+def save_json(file, data):
+    """Save JSON data to a file, replacing it atomically so a crash can't leave it half written."""
+    tmp_file = f"{file}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(data, f, indent=4, default=_to_json)
+    os.replace(tmp_file, file)
+
+
+def _to_json(obj):
+    # History entries are kept in memory as ESPIRecords
+    if isinstance(obj, ESPIRecord):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONStorage:
+    """Keeps pinned stocks, ESPI history and channel subscriptions in JSON files.
+
+    The files are rewritten as a whole on flush, which is fine for a handful of companies.
+    """
+
+    def __init__(self, pinned_stocks_file=PINNED_STOCKS_FILE, espi_history_file=ESPI_HISTORY_FILE,
+                 subscriptions_file=SUBSCRIPTIONS_FILE):
+        self.pinned_stocks_file = pinned_stocks_file
+        self.espi_history_file = espi_history_file
+        self.subscriptions_file = subscriptions_file
+        self.pinned_stocks = {}
+        self.espi_history = {}
+        # Not written unless loaded, so it can't be overwritten with an empty dict
+        self.subscriptions = None
+        self.dirty = False
+
+    def load(self) -> tuple[dict, dict]:
+        self.pinned_stocks = load_json(self.pinned_stocks_file)
+        self.espi_history = load_json(self.espi_history_file)
+        return self.pinned_stocks, self.espi_history
+
+    def load_subscriptions(self) -> dict:
+        # JSON object keys are strings, channel ids are ints
+        self.subscriptions = {int(channel_id): data for channel_id, data in load_json(self.subscriptions_file).items()}
+        return self.subscriptions
+
+    # The tracker mutates the loaded dicts itself, so updates only need to mark them as dirty
+    def add_company(self, number: str, company_data: dict, announcements: list):
+        self.dirty = True
+
+    def update_company(self, number: str, company_data: dict):
+        self.dirty = True
+
+    def remove_company(self, number: str):
+        self.dirty = True
+
+    def append_announcement(self, number: str, announcement: dict):
+        self.dirty = True
+
+    def prune_history(self, number: str, retained: list):
+        self.dirty = True
+
+    def append_message(self, number: str, record: dict):
+        self.dirty = True
+
+    def add_subscription(self, channel_id: int, guild_id: int | None, number: str):
+        self.dirty = True
+
+    def remove_subscription(self, channel_id: int, number: str):
+        self.dirty = True
+
+    def flush(self):
+        if not self.dirty:
+            return
+        save_json(self.pinned_stocks_file, self.pinned_stocks)
+        save_json(self.espi_history_file, self.espi_history)
+        if self.subscriptions is not None:
+            save_json(self.subscriptions_file, self.subscriptions)
+        self.dirty = False
+
+
+class Company(Model):
+    number = CharField(primary_key=True)
+    name = CharField()
+    emoji = CharField()
+    url = TextField()
+
+
+class Announcement(Model):
+    company = CharField(index=True)
+    key = CharField()
+    date = CharField()
+    time = CharField()
+    company_name = CharField()
+    title = TextField()
+    url = TextField()
+    # Comma separated label values, NULL for rows stored before labels existed
+    labels = TextField(null=True)
+
+    class Meta:
+        indexes = ((("company", "key"), True),)
+
+
+class Message(Model):
+    company = CharField(index=True)
+    message_id = BigIntegerField()
+    channel = BigIntegerField(null=True)
+    content = TextField(null=True)
+    pinned = BooleanField(default=False)
+
+
+class Subscription(Model):
+    channel = BigIntegerField()
+    guild = BigIntegerField(null=True)
+    company = CharField(index=True)
+
+    class Meta:
+        indexes = ((("channel", "company"), True),)
+
+
+class SQLiteStorage:
+    """Keeps pinned stocks, ESPI history and channel subscriptions in SQLite (WAL mode).
+
+    Every update is a small transaction touching only the affected rows, so nothing is
+    rewritten as the history grows and a crash can't corrupt what was already stored.
+    """
+
+    models = [Company, Announcement, Message, Subscription]
+
+    def __init__(self, db_file=ESPI_DB_FILE):
+        self.db = SqliteDatabase(db_file, pragmas={"journal_mode": "wal", "synchronous": "normal"})
+        self.db.bind(self.models)
+        self.db.connect(reuse_if_open=True)
+        self.db.create_tables(self.models)
+        # Databases created before messages remembered their channel
+        if "channel" not in {column.name for column in self.db.get_columns("message")}:
+            self.db.execute_sql("ALTER TABLE message ADD COLUMN channel INTEGER")
+        if "labels" not in {column.name for column in self.db.get_columns("announcement")}:
+            self.db.execute_sql("ALTER TABLE announcement ADD COLUMN labels TEXT")
+
+    def load(self) -> tuple[dict, dict]:
+        pinned_stocks = {}
+        espi_history = {}
+        for company in Company.select():
+            pinned_stocks[company.number] = {"name": company.name, "emoji": company.emoji, "url": company.url, "messages": []}
+            espi_history[company.number] = []
+
+        for message in Message.select().order_by(Message.id):
+            if message.company in pinned_stocks:
+                record = {"content": message.content, "id": message.message_id, "pinned": message.pinned}
+                if message.channel is not None:
+                    record["channel"] = message.channel
+                pinned_stocks[message.company]["messages"].append(record)
+
+        for row in Announcement.select().order_by(Announcement.id):
+            announcement = {"date": row.date, "time": row.time, "company": row.company_name, "title": row.title, "url": row.url}
+            if row.labels is not None:
+                announcement["labels"] = row.labels.split(",") if row.labels else []
+            espi_history.setdefault(row.company, []).append(announcement)
+        return pinned_stocks, espi_history
+
+    def load_subscriptions(self) -> dict:
+        subscriptions = {}
+        for row in Subscription.select().order_by(Subscription.id):
+            subscriptions.setdefault(row.channel, {"guild": row.guild, "companies": []})["companies"].append(row.company)
+        return subscriptions
+
+    def add_company(self, number: str, company_data: dict, announcements: list):
+        with self.db.atomic():
+            Company.replace(number=number, name=company_data["name"], emoji=company_data["emoji"],
+                            url=company_data["url"]).execute()
+            for announcement in announcements:
+                self.append_announcement(number, announcement)
+            for record in company_data.get("messages", []):
+                self.append_message(number, record)
+
+    def update_company(self, number: str, company_data: dict):
+        Company.update(name=company_data["name"], emoji=company_data["emoji"], url=company_data["url"]).where(
+            Company.number == number).execute()
+
+    def remove_company(self, number: str):
+        with self.db.atomic():
+            Company.delete().where(Company.number == number).execute()
+            Announcement.delete().where(Announcement.company == number).execute()
+            Message.delete().where(Message.company == number).execute()
+
+    def append_announcement(self, number: str, announcement: dict):
+        Announcement.insert(
+            company=number,
+            key=announcement_key(announcement),
+            date=announcement.get("date", ""),
+            time=announcement.get("time", ""),
+            company_name=announcement.get("company", ""),
+            title=announcement.get("title", ""),
+            url=announcement.get("url", ""),
+            labels=None if announcement.get("labels") is None else ",".join(announcement.get("labels")),
+        ).on_conflict_ignore().execute()
+
+    def prune_history(self, number: str, retained: list):
+        """Deletes the announcements of a company that retention dropped from `retained`."""
+        keep = {announcement_key(announcement) for announcement in retained}
+        query = Announcement.select(Announcement.id, Announcement.key).where(Announcement.company == number)
+        stale = [row.id for row in query if row.key not in keep]
+        with self.db.atomic():
+            # Batched to stay under SQLite's limit on query parameters
+            for ids in chunked(stale, 500):
+                Announcement.delete().where(Announcement.id.in_(ids)).execute()
+
+    def append_message(self, number: str, record: dict):
+        Message.insert(company=number, message_id=record["id"], channel=record.get("channel"),
+                       content=record.get("content"), pinned=record.get("pinned", False)).execute()
+
+    def add_subscription(self, channel_id: int, guild_id: int | None, number: str):
+        Subscription.insert(channel=channel_id, guild=guild_id, company=number).on_conflict_ignore().execute()
+
+    def remove_subscription(self, channel_id: int, number: str):
+        Subscription.delete().where((Subscription.channel == channel_id) & (Subscription.company == number)).execute()
+
+    def flush(self):
+        # Every update is committed on its own
+        pass
+
+    def close(self):
+        self.db.close()
+
+
+def create_storage(backend: str):
+    """Creates the storage backend selected by name ("json" or "sqlite")."""
+    if backend == "json":
+        return JSONStorage()
+    if backend == "sqlite":
+        return SQLiteStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def migrate_json_to_sqlite(pinned_stocks_file=PINNED_STOCKS_FILE, espi_history_file=ESPI_HISTORY_FILE,
+                           db_file=ESPI_DB_FILE, subscriptions_file=SUBSCRIPTIONS_FILE) -> SQLiteStorage:
+    """One-shot copy of the JSON files into a SQLite database."""
+    json_storage = JSONStorage(pinned_stocks_file, espi_history_file, subscriptions_file)
+    pinned_stocks, espi_history = json_storage.load()
+    subscriptions = json_storage.load_subscriptions()
+
+    storage = SQLiteStorage(db_file)
+    with storage.db.atomic():
+        for number, company_data in pinned_stocks.items():
+            storage.add_company(number, company_data, espi_history.get(number, []))
+        for channel_id, data in subscriptions.items():
+            for number in data["companies"]:
+                storage.add_subscription(channel_id, data["guild"], number)
+    print(f"Migrated {len(pinned_stocks)} companies to {db_file}")
+    return storage
+
+
+if __name__ == "__main__":
+    # python -m utils.storage migrate [pinned_stocks.json] [espi_history.json] [espi.db] [subscriptions.json]
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("usage: python -m utils.storage migrate [pinned_stocks.json] [espi_history.json] [espi.db] [subscriptions.json]")
+        sys.exit(1)
+    migrate_json_to_sqlite(*sys.argv[2:6]).close()
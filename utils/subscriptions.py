@@ -0,0 +1,86 @@
+class SubscriptionRegistry:
+    """Which channels watch which companies, with cached channel handles.
+
+    `channels` maps a channel id to {"guild": guild id, "companies": [company ids]}, the shape
+    the storage backends load and save. A reverse index makes finding the subscribers of a
+    company a dict lookup, so every company is fetched once per tick however many channels
+    watch it.
+    """
+
+    def __init__(self, channels: dict | None = None):
+        self.channels = channels if channels is not None else {}
+        # company id -> {channel id}
+        self._subscribers = {}
+        for channel_id, data in self.channels.items():
+            for number in data["companies"]:
+                self._subscribers.setdefault(number, set()).add(channel_id)
+        # channel id -> discord channel
+        self._handles = {}
+
+    def companies(self) -> set:
+        """Companies with at least one subscriber."""
+        return set(self._subscribers)
+
+    def subscribers(self, number: str) -> set:
+        return self._subscribers.get(number, set())
+
+    def channel_companies(self, channel_id) -> list:
+        return self.channels.get(channel_id, {}).get("companies", [])
+
+    def guild_channels(self, guild_id) -> list:
+        return [channel_id for channel_id, data in self.channels.items() if data["guild"] == guild_id]
+
+    def is_subscribed(self, channel_id, number: str) -> bool:
+        return channel_id in self.subscribers(number)
+
+    def subscribe(self, channel, number: str) -> bool:
+        """Subscribes a discord channel to a company, returns False if it already was."""
+        self.cache_channel(channel)
+        if self.is_subscribed(channel.id, number):
+            return False
+        guild = getattr(channel, "guild", None)
+        data = self.channels.setdefault(channel.id, {"guild": guild.id if guild else None, "companies": []})
+        data["companies"].append(number)
+        self._subscribers.setdefault(number, set()).add(channel.id)
+        return True
+
+    def unsubscribe(self, channel_id, number: str) -> bool:
+        """Returns False if the channel wasn't subscribed to the company."""
+        if not self.is_subscribed(channel_id, number):
+            return False
+        self._subscribers[number].discard(channel_id)
+        if not self._subscribers[number]:
+            del self._subscribers[number]
+        data = self.channels[channel_id]
+        data["companies"].remove(number)
+        if not data["companies"]:
+            del self.channels[channel_id]
+            self._handles.pop(channel_id, None)
+        return True
+
+    def remove_channel(self, channel_id) -> list:
+        """Drops every subscription of a channel, returns the companies it watched."""
+        numbers = list(self.channel_companies(channel_id))
+        for number in numbers:
+            self.unsubscribe(channel_id, number)
+        self._handles.pop(channel_id, None)
+        return numbers
+
+    def cache_channel(self, channel):
+        self._handles[channel.id] = channel
+
+    def channel(self, bot, channel_id):
+        """Discord channel of a subscription, looked up by id once and then cached."""
+        channel = self._handles.get(channel_id)
+        if channel is None:
+            channel = bot.get_channel(channel_id)
+            if channel is not None:
+                self._handles[channel_id] = channel
+        return channel
+
+    def invalidate(self, channel_id=None):
+        """Forgets one cached channel handle, or all of them."""
+        if channel_id is None:
+            self._handles.clear()
+        else:
+            self._handles.pop(channel_id, None)
@@ -1,90 +1,148 @@
-import numpy as np
+import math
+import re
+
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from decouple import config
+
+from utils.extract import extract_announcement_rows, extract_company_name, iter_announcement_rows
+from utils.http_cache import RESPONSE_CACHE
+from utils.history import Watermark, announcement_key, announcement_timestamp, history_keys
+from utils.resolver import CompanyResolver
+
+# Overridden to point the bot at a local stand-in, see benchmarks/pap_server.py
+PAP_BASE_URL = config("PAP_BASE_URL", default="https://biznes.pap.pl")
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+ESPI_FEED_PATH = "/espi"
+ESPI_FEED_URL = f"{PAP_BASE_URL}{ESPI_FEED_PATH}"
+# Published reports don't change, so article pages can be reused for much longer than listings
+ARTICLE_TTL = 24 * 60 * 60
+
+COMPANY_ID_PATTERN = re.compile(r"company=(\d+)")
+
 
-import camelot.io as camelot
-from rapidfuzz import fuzz, process
+def fetch_page(url, ttl=None):
+    """Downloads a page through the shared response cache, returns None on non-200 responses."""
+    cached = RESPONSE_CACHE.get(url, ttl)
+    if cached is not None:
+        return cached
+
+    response = requests.get(url, headers=HEADERS)
+    if response.status_code != 200:
+        return None
+
+    RESPONSE_CACHE.set(url, response.text)
+    return response.text
 
 
 def get_espi_announcements(url):
     """Fetches all ESPI announcements for a company from Biznes PAP."""
-    headers = {"User-Agent": "Mozilla/5.0"}
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
+    html = fetch_page(url)
+    if html is None:
         print("Error during request")
         return []
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    table = soup.find("table")
-
-    announcements = []
-
-    if table:
-        tbody = table.find("tbody")
-        if tbody:
-            rows = tbody.find_all("tr")
-            for row in rows:
-                cols = row.find_all("td")
-                if len(cols) >= 4:
-                    date = cols[0].text.strip()
-                    time = cols[1].text.strip()
-                    company = cols[2].text.strip()
-                    title = cols[3].text.strip()
-
-                    next_url = cols[3].find('a')["href"]
-                    announcements.append({
-                        "date": date,
-                        "time": time,
-                        "company": company,
-                        "title": title,
-                        "url": next_url
-                    })
-    return announcements
-
-
-def inform_new_espies(url, company_espi_history):
+    return parse_espi_announcements(html)
+
+
+def parse_espi_announcements(html):
+    """Parses the announcements table of an ESPI listing page."""
+    return [announcement for announcement, _, _ in extract_announcement_rows(html)]
+
+
+def diff_listing(html, seen, watermark: Watermark | None = None):
+    """Incremental diff of a listing page, which PAP sorts newest first.
+
+    Rows are parsed one at a time and reading stops at the first one in `seen` (after the
+    rest of its minute, which PAP doesn't order) or at the first one older than the
+    watermark. Returns the unseen rows and the watermark of the page, None if it's empty.
+    """
+    new = []
+    newest = None
+    boundary = None
+    for announcement, _, _ in iter_announcement_rows(html):
+        published = announcement_timestamp(announcement)
+        if newest is None:
+            newest = Watermark(announcement_key(announcement), published)
+        if boundary is not None and (published is None or published < boundary):
+            break
+        if announcement_key(announcement) in seen:
+            if boundary is None:
+                if published is None:
+                    break
+                boundary = published
+            continue
+        if watermark is not None and watermark.published and published and published < watermark.published:
+            # Older than anything new can be, e.g. the watermark row itself was taken down
+            break
+        new.append(announcement)
+    return new, newest
+
+
+def parse_espi_feed(html, name_to_id):
+    """Parses the all-companies ESPI listing into (company id, announcement) pairs.
+
+    Rows of companies that can't be mapped to an id are skipped.
+    """
+    feed = []
+    for announcement, company_link, company_name in extract_announcement_rows(html):
+        number = get_company_id(company_link, company_name, name_to_id)
+        if number is not None:
+            feed.append((number, announcement))
+    return feed
+
+
+def get_company_id(company_link, company_name, name_to_id):
+    """Reads the company id from the company link, falling back to the company name."""
+    match = COMPANY_ID_PATTERN.search(company_link)
+    if match:
+        return match.group(1)
+    return name_to_id.get(company_name.lower())
+
+
+def inform_new_espies(url, company_espi_history, seen=None, cutoff=None):
     """Checks for new ESPIs and informs only about new ones."""
-    new_announcements = get_espi_announcements(url)
+    return filter_new_espies(get_espi_announcements(url), company_espi_history, seen, cutoff)
 
-    new_espies = []
 
-    for announcement in new_announcements:
-        if announcement not in company_espi_history:  # Check if it's new
-            new_espies.append(announcement)
+def filter_new_espies(new_announcements, company_espi_history, seen=None, cutoff=None):
+    """Returns the announcements that are not in the company history yet.
 
+    `seen` is the company's dedupe index (see utils.history), it is built from the
+    history when not given. Announcements published before `cutoff` were dropped from
+    the history by the retention policy and count as seen.
+    """
+    if seen is None:
+        seen = history_keys(company_espi_history)
+
+    new_espies = [announcement for announcement in new_announcements if announcement_key(announcement) not in seen]
+    if cutoff is not None:
+        new_espies = [announcement for announcement in new_espies
+                      if (announcement_timestamp(announcement) or cutoff) >= cutoff]
     return new_espies
 
 
 
 def get_company_name(url):
     """Extracts the company name from the ESPI page."""
-    headers = {"User-Agent": "Mozilla/5.0"}
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
+    html = fetch_page(url)
+    if html is None:
         return None
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    table = soup.find("table")
+    return parse_company_name(html)
 
-    if table:
-        tbody = table.find("tbody")
-        if tbody:
-            second_row = tbody.find_all("tr")[1]
-            if second_row:
-                cols = second_row.find_all("td")
-                if len(cols) >= 4:
-                    company_name_col = cols[2]
-                    a_tag = company_name_col.find("a")
-                    return a_tag.text.strip()  # Extract company name
-    return None
+
+def parse_company_name(html):
+    """Reads the company name from the announcements table of an ESPI page."""
+    return extract_company_name(html)
 
 def get_espi_article(url):
-    headers = {"User-Agent": "Mozilla/5.0"}
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
+    html = fetch_page(url, ARTICLE_TTL)
+    if html is None:
         return None
 
-    soup = BeautifulSoup(response.text, "html.parser")
+    # Only the <article> subtree is built
+    soup = BeautifulSoup(html, "lxml", parse_only=SoupStrainer("article"))
     article = soup.find("article")
     title = article.find_all("p", class_="field--name-field-lead")[0].text.strip()
     print(title)
@@ -150,61 +208,69 @@ def espi_message(company_data,espi,url,data):
     return message
 
 
+# Keyword -> what it tells about a row of the MAR notification table
+TRANSACTION_KEYWORDS = {
+    "Stanowisko/status": "position_row",
+    "Rodzaj transakcji": "transaction_row",
+    "Członek Zarządu": "Członek Zarządu",
+    "Wiceprezes": "Wiceprezes",
+    "Prezes": "Prezes",
+    "Nabycie": "purchase",
+    "purchase": "purchase",
+    "Kupno": "purchase",
+    "objęcie": "purchase",
+    "motywacyjnego": "incentive",
+}
+TRANSACTION_PATTERN = re.compile("|".join(re.escape(keyword) for keyword in TRANSACTION_KEYWORDS))
+POSITIONS = ["Członek Zarządu", "Prezes", "Wiceprezes"]
+
+
+def classify_transaction_row(row) -> set:
+    """Labels of all keywords found in the cells of a table row."""
+    # Cells are joined with a separator no keyword contains, so matches can't span two cells
+    return {TRANSACTION_KEYWORDS[match] for match in TRANSACTION_PATTERN.findall("\x00".join(row))}
+
+
 def parse_transaction_info2(pdf):
-    row_keys = ["Stanowisko/status", "Rodzaj transakcji"]
     raw_data = pdf._tables[0].data
-    data = {"position": np.nan, "incentive": np.nan, "transaction_mode": np.nan}
+    data = {"position": math.nan, "incentive": math.nan, "transaction_mode": math.nan}
     if len(raw_data)<13:
-        print("shorter file")
         return {"position": "shorter", "incentive": "shorter", "transaction_mode": "shorter"}
-    for key in row_keys:
-        print(key)
-        for idx, row in enumerate(raw_data):
-            print(row)
-            if key == "Stanowisko/status":
-                if np.any(np.array([key in e for e in row])):
-                    if np.any(np.array(["Członek Zarządu" in e for e in row])):
-                        data["position"] = "Członek Zarządu"
-                    elif np.any(np.array(["Prezes" in e for e in row])):
-                        data["position"] = "Prezes"
-                    elif np.any(np.array(["Wiceprezes" in e for e in row])):
-                        data["position"] = "Wiceprezes"
-                    else:
-                        data["position"] = "Unknown"
-
-            if key == "Rodzaj transakcji":
-                incentive = None
-                if np.any(np.array([key in e for e in row])):
-                    if np.any(np.array(["Nabycie" in e for e in row])) or np.any(np.array(["purchase" in e for e in row])) or np.any(np.array(["Kupno" in e for e in row])) or np.any(np.array(["objęcie" in e for e in row])):
-                        transaction_mode = "purchase"
-                        if np.any(np.array(["motywacyjnego" in e for e in row])):
-                            print("Nabycie w ramach programu motywacyjnego")
-                            incentive = True
-                        else:
-                            print("Nabycie")
-                            incentive = False
-                    else:
-                        transaction_mode = "disposal"
-                        print("zbycie")
-
-                    data["incentive"] = incentive
-                    data["transaction_mode"] = transaction_mode
+    # One scan per row, the last matching row wins like before
+    for row in raw_data:
+        labels = classify_transaction_row(row)
+        if "position_row" in labels:
+            data["position"] = next((position for position in POSITIONS if position in labels), "Unknown")
+
+        if "transaction_row" in labels:
+            if "purchase" in labels:
+                data["transaction_mode"] = "purchase"
+                data["incentive"] = "incentive" in labels
+            else:
+                data["transaction_mode"] = "disposal"
+                data["incentive"] = None
     return data
 
 def read_pdf_and_parse(pdf_file):
+    # camelot pulls in pandas, matplotlib and the PDF stack, so it's only imported by PDF workers
+    import camelot.io as camelot
+
     abc = camelot.read_pdf(pdf_file, pages="all", flavor='lattice')  # address of pdf file
     if len(abc) == 0:
-        return {"position": np.nan, "incentive": np.nan, "transaction_mode": np.nan}
+        return {"position": math.nan, "incentive": math.nan, "transaction_mode": math.nan}
     data = parse_transaction_info2(abc)
     return data
 
 def get_article_and_return_pdf(url):
-    headers = {"User-Agent": "Mozilla/5.0"}
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
+    html = fetch_page(url, ARTICLE_TTL)
+    if html is None:
         return None
 
-    soup = BeautifulSoup(response.text, "html.parser")
+    return parse_pdf_links(html)
+
+def parse_pdf_links(html):
+    """Returns [href, link text] of every PDF attachment linked from an article page."""
+    soup = BeautifulSoup(html, "lxml", parse_only=SoupStrainer("a", href=True))
 
     data = []
 
@@ -216,44 +282,8 @@ def get_article_and_return_pdf(url):
     return data
 
 def decode_to_number(input_str: str, ticker_to_number: dict, symbol_to_number: dict, stock_id: dict) -> str:
-    # 1. Direct number
-    if input_str.isdigit() and input_str in stock_id:
-        return input_str
+    """Resolves a company id from plain decoder dicts.
 
-    # 2. Ticker
-    if input_str.upper() in ticker_to_number:
-        return ticker_to_number[input_str.upper()]
-
-    # 3. Short name
-    if input_str.upper() in symbol_to_number:
-        return symbol_to_number[input_str.upper()]
-
-    # 4. Full name fuzzy match
-    reversed_map = {v: k for k, v in stock_id.items()}
-
-    for name in reversed_map:
-        if input_str.lower() == name.lower():
-            return reversed_map[name]
-
-    matches = process.extract(
-        input_str.lower(),
-        [name.lower() for name in reversed_map.keys()],
-        scorer=fuzz.ratio,
-        score_cutoff=90
-    )
-
-    if len(matches) == 1:
-        match_name = matches[0][0]
-        print(match_name)
-        for key in reversed_map:
-            if key.lower() == match_name:
-                return reversed_map[key]
-
-
-    elif len(matches) > 1:
-        options = [match[0] for match in matches]
-        print(options)
-        raise ValueError(f"Ambiguous company name. Did you mean: {', '.join(options)}?")
-
-    else:
-        raise ValueError("Unrecognized company identifier.")
+    Builds the indexes on every call, long-lived code should keep a CompanyResolver instead.
+    """
+    return CompanyResolver(stock_id, ticker_to_number, symbol_to_number).resolve(input_str)
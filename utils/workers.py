@@ -0,0 +1,262 @@
+"""Optional worker mode: company polling partitioned over several local processes.
+
+The Discord-connected process publishes the tracked companies to a SQLite coordinator.
+Worker processes lease a fair share of them, poll their listing pages and push the rows
+they haven't seen yet to an outbox, which the Discord process drains and dedupes
+against its history as usual. Leases expire when a worker stops renewing them, so the
+companies of a dead worker are picked up by the others.
+
+    python -m utils.workers --db espi_workers.db --name worker-1
+"""
+import argparse
+import asyncio
+import json
+import math
+import subprocess
+import sys
+import time
+
+from peewee import CharField, FloatField, Model, SqliteDatabase, TextField
+
+from utils.fetcher import ESPIFetcher
+from utils.history import announcement_key
+from utils.scheduler import PollScheduler, RateLimiter
+from utils.utils import parse_espi_announcements
+
+WORKERS_DB_FILE = "espi_workers.db"
+LEASE_TTL = 30
+WORKER_TICK = 2
+OUTBOX_BATCH = 500
+
+
+class WorkerInfo(Model):
+    name = CharField(primary_key=True)
+    heartbeat = FloatField()
+
+    class Meta:
+        table_name = "worker"
+
+
+class Lease(Model):
+    company = CharField(primary_key=True)
+    url = TextField()
+    worker = CharField(null=True, index=True)
+    expires = FloatField(default=0)
+    # Key of the newest announcement the Discord process has of the company
+    watermark = TextField(null=True)
+
+
+class OutboxEntry(Model):
+    company = CharField()
+    announcement = TextField()
+
+    class Meta:
+        table_name = "outbox"
+
+
+class Coordinator:
+    """Leases, worker heartbeats and the announcement outbox in one SQLite file (WAL mode).
+
+    Every process opens its own Coordinator on the same file. Claims run in IMMEDIATE
+    transactions, so two workers can never take the same company.
+    """
+
+    models = [WorkerInfo, Lease, OutboxEntry]
+
+    def __init__(self, db_file=WORKERS_DB_FILE, lease_ttl: float = LEASE_TTL):
+        self.lease_ttl = lease_ttl
+        self.db = SqliteDatabase(db_file, timeout=10, pragmas={"journal_mode": "wal", "synchronous": "normal"})
+        self.db.bind(self.models)
+        self.db.connect(reuse_if_open=True)
+        self.db.create_tables(self.models)
+        # Coordinator files created before leases carried a watermark
+        if "watermark" not in {column.name for column in self.db.get_columns("lease")}:
+            self.db.execute_sql("ALTER TABLE lease ADD COLUMN watermark TEXT")
+
+    def close(self):
+        self.db.close()
+
+    # Discord process side
+
+    def publish(self, companies: dict, watermarks: dict | None = None):
+        """Makes {company id: listing url} the set of companies to poll.
+
+        `watermarks` ({company id: announcement key}) tells a worker taking over a company where
+        the rows the Discord process already has start.
+        """
+        watermarks = watermarks or {}
+        with self.db.atomic("IMMEDIATE"):
+            Lease.delete().where(Lease.company.not_in(list(companies))).execute()
+            for number, url in companies.items():
+                watermark = watermarks.get(number)
+                Lease.insert(company=number, url=url, watermark=watermark).on_conflict(
+                    conflict_target=[Lease.company], update={Lease.url: url, Lease.watermark: watermark}).execute()
+
+    def pop_outbox(self, limit: int = OUTBOX_BATCH) -> list:
+        """Oldest (entry id, company id, announcement) rows; remove them with `ack` once handled."""
+        return [(entry.id, entry.company, json.loads(entry.announcement))
+                for entry in OutboxEntry.select().order_by(OutboxEntry.id).limit(limit)]
+
+    def ack(self, entry_ids: list):
+        if entry_ids:
+            OutboxEntry.delete().where(OutboxEntry.id.in_(entry_ids)).execute()
+
+    def watermarks(self, numbers) -> dict:
+        """Company id -> published watermark of the given companies."""
+        return {lease.company: lease.watermark
+                for lease in Lease.select().where(Lease.company.in_(list(numbers)) & Lease.watermark.is_null(False))}
+
+    def leases(self) -> dict:
+        """Company id -> worker currently holding its lease (None if free or expired)."""
+        now = time.time()
+        return {lease.company: lease.worker if lease.expires >= now else None for lease in Lease.select()}
+
+    # Worker side
+
+    def claim(self, worker: str, now: float | None = None) -> dict:
+        """Heartbeats and renews, takes or gives back leases so every live worker gets a fair share.
+
+        Returns {company id: listing url} of the companies the worker now owns.
+        """
+        now = time.time() if now is None else now
+        with self.db.atomic("IMMEDIATE"):
+            WorkerInfo.replace(name=worker, heartbeat=now).execute()
+            live = WorkerInfo.select().where(WorkerInfo.heartbeat >= now - self.lease_ttl).count()
+            share = math.ceil(Lease.select().count() / max(live, 1))
+
+            owned = list(Lease.select().where((Lease.worker == worker) & (Lease.expires >= now)).order_by(Lease.company))
+            if len(owned) > share:
+                # A worker joined, hand the surplus back
+                surplus = [lease.company for lease in owned[share:]]
+                Lease.update(worker=None, expires=0).where(Lease.company.in_(surplus)).execute()
+                owned = owned[:share]
+            elif len(owned) < share:
+                free = Lease.select().where(Lease.worker.is_null() | (Lease.expires < now)).order_by(Lease.company)
+                owned += list(free.limit(share - len(owned)))
+
+            Lease.update(worker=worker, expires=now + self.lease_ttl).where(
+                Lease.company.in_([lease.company for lease in owned])).execute()
+        return {lease.company: lease.url for lease in owned}
+
+    def release(self, worker: str):
+        """Gives back every lease of a worker that shuts down cleanly."""
+        with self.db.atomic("IMMEDIATE"):
+            Lease.update(worker=None, expires=0).where(Lease.worker == worker).execute()
+            WorkerInfo.delete().where(WorkerInfo.name == worker).execute()
+
+    def push(self, number: str, announcements: list):
+        with self.db.atomic():
+            for announcement in announcements:
+                OutboxEntry.insert(company=number, announcement=json.dumps(announcement)).execute()
+
+
+def rows_above(listing: list, watermark: str | None) -> list:
+    """Rows of a newest-first listing above the one with the watermark key.
+
+    Without the watermark on the page every row is returned, the Discord process dedupes them.
+    """
+    for index, announcement in enumerate(listing):
+        if announcement_key(announcement) == watermark:
+            return listing[:index]
+    return listing
+
+
+class PollingWorker:
+    """Polls the companies leased to it on their adaptive schedule and reports unseen rows."""
+
+    def __init__(self, coordinator: Coordinator, name: str, fetcher: ESPIFetcher | None = None):
+        self.coordinator = coordinator
+        self.name = name
+        self.fetcher = fetcher or ESPIFetcher()
+        self.scheduler = PollScheduler()
+        self.owned = {}
+        # company id -> announcement keys already pushed, and the last listing (for the poll interval)
+        self.seen = {}
+        self.listings = {}
+        # company id -> watermark of a newly leased company, used by its first poll
+        self.watermarks = {}
+
+    def sync_leases(self):
+        owned = self.coordinator.claim(self.name)
+        for number in set(self.owned) - set(owned):
+            self.scheduler.remove(number)
+            self.seen.pop(number, None)
+            self.listings.pop(number, None)
+            self.watermarks.pop(number, None)
+        leased = set(owned) - set(self.owned)
+        if leased:
+            self.watermarks.update(self.coordinator.watermarks(leased))
+        # A company held before, and lost since, is read in full, not answered by a stale 304
+        for number in leased:
+            self.fetcher.invalidate(owned[number])
+        self.owned = owned
+        # Newly leased companies are polled right away
+        self.scheduler.add_missing(owned)
+
+    async def poll(self, number: str):
+        url = self.owned[number]
+        changed, html = await self.fetcher.fetch_if_changed(url)
+        if html is not None:
+            listing = await asyncio.to_thread(parse_espi_announcements, html)
+            seen = self.seen.get(number)
+            if seen is None:
+                # The first poll after taking a lease reports only the rows above the watermark
+                new = rows_above(listing, self.watermarks.pop(number, None))
+                seen = self.seen[number] = set()
+            else:
+                new = [announcement for announcement in listing if announcement_key(announcement) not in seen]
+            seen.update(announcement_key(announcement) for announcement in listing)
+            self.listings[number] = listing
+            if new:
+                self.coordinator.push(number, new)
+        if number in self.owned:
+            self.scheduler.reschedule(number, self.listings.get(number, []))
+
+    async def run_once(self):
+        self.sync_leases()
+        due = [number for number in self.scheduler.pop_due() if number in self.owned]
+        results = await asyncio.gather(*(self.poll(number) for number in due), return_exceptions=True)
+        for number, result in zip(due, results):
+            if isinstance(result, Exception):
+                print(f"{self.name}: error while polling {number}: {result!r}")
+                self.fetcher.invalidate(self.owned.get(number, ""))
+
+    async def run(self, stop: asyncio.Event | None = None):
+        stop = stop or asyncio.Event()
+        try:
+            while not stop.is_set():
+                try:
+                    await self.run_once()
+                except Exception as e:
+                    # e.g. the coordinator database stayed locked, the leases are renewed next tick
+                    print(f"{self.name}: {e!r}")
+                try:
+                    await asyncio.wait_for(stop.wait(), WORKER_TICK)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.coordinator.release(self.name)
+            await self.fetcher.close()
+
+
+def spawn_workers(count: int, db_file=WORKERS_DB_FILE, requests_per_second: float = 0,
+                  lease_ttl: float = LEASE_TTL) -> list:
+    """Starts `count` worker processes sharing the requests-per-second budget, returns their Popen handles."""
+    rate = requests_per_second / count if count else 0
+    return [subprocess.Popen([sys.executable, "-m", "utils.workers", "--db", str(db_file), "--name", f"worker-{i + 1}",
+                              "--rate", str(rate), "--lease-ttl", str(lease_ttl)])
+            for i in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=WORKERS_DB_FILE)
+    parser.add_argument("--name", required=True)
+    parser.add_argument("--rate", type=float, default=0, help="requests per second, 0 for no limit")
+    parser.add_argument("--lease-ttl", type=float, default=LEASE_TTL)
+    args = parser.parse_args()
+
+    worker = PollingWorker(Coordinator(args.db, args.lease_ttl), args.name,
+                           ESPIFetcher(rate_limiter=RateLimiter(args.rate)))
+    print(f"{args.name} polling for {args.db}")
+    asyncio.run(worker.run())